@@ -1,21 +1,51 @@
 import asyncio
+from datetime import datetime
 
-from app.bookings.repository import BookingRepository
+from app.bookings.repository import BookingRepository, EXPIRY_MAX_SLEEP_SECONDS, HOLD_PENDING_GRACE_SECONDS
 from app.database.engine import AsyncSessionLocal
 
 
-async def expire_holds_worker(poll_interval_seconds: int = 30) -> None:
-    """Periodically expire stale holds so inventory is released."""
+async def expire_holds_worker(max_sleep_seconds: float = EXPIRY_MAX_SLEEP_SECONDS) -> None:
+    """Expire holds as they fall due so inventory is released.
+
+    Drains due holds in batches, then sleeps until the nearest ttl_expires_at
+    (at most max_sleep_seconds, since other instances create holds too).
+    """
     while True:
         try:
             async with AsyncSessionLocal() as session:
                 repo = BookingRepository(session)
                 expired_ids = await repo.expire_old_holds()
                 if expired_ids:
-                    print(f"[expire_holds_worker] expired holds: {expired_ids}")
+                    print(f"[expire_holds_worker] expired {len(expired_ids)} holds")
+                backlog, next_expires_at = await repo.expiry_status()
         except Exception as exc:
             print(f"[expire_holds_worker] error: {exc}")
             await asyncio.sleep(10)
             continue
 
+        if backlog and expired_ids:
+            continue
+        delay = max_sleep_seconds
+        if next_expires_at is not None:
+            delay = min(delay, max(0.0, (next_expires_at - datetime.utcnow()).total_seconds()))
+        if backlog:
+            # Просроченные холды есть, но взять их не удалось (заняты другим экземпляром) — не крутимся вхолостую.
+            delay = max(delay, 1.0)
+        await asyncio.sleep(delay)
+
+
+async def settle_in_flight_bookings_worker(poll_interval_seconds: int = HOLD_PENDING_GRACE_SECONDS) -> None:
+    """Settle bookings stuck between two transactions after crashes or Inventory outages:
+    PENDING holds (saga mode) and interrupted CANCELLING/EXPIRING releases."""
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                repo = BookingRepository(session)
+                outcomes = {**await repo.settle_pending_holds(), **await repo.resume_releases()}
+                if any(outcomes.values()):
+                    print(f"[settle_in_flight_bookings_worker] settled bookings: {outcomes}")
+        except Exception as exc:
+            print(f"[settle_in_flight_bookings_worker] error: {exc}")
+
         await asyncio.sleep(poll_interval_seconds)
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, Date, DateTime, func, Index, Integer, JSON
+from sqlalchemy import Column, String, Date, DateTime, func, Index, Integer, JSON, literal_column
 from sqlalchemy.dialects.postgresql import UUID, JSONB 
 from app.database.engine import Base
 from sqlalchemy import Column, String, Date, DateTime, func, Index, Integer, JSON
@@ -20,7 +20,8 @@ class Booking(Base):
     check_in = Column(Date, nullable=False)
     check_out = Column(Date, nullable=False)
     
-    # Статус (HOLD, CONFIRMED, CANCELED, EXPIRED)
+    # Статус (PENDING, HOLD, FAILED, CONFIRMED, CANCELLING, CANCELED, EXPIRING, EXPIRED);
+    # PENDING и FAILED — только в режиме saga, CANCELLING и EXPIRING — пока идёт release в Inventory
     status = Column(String, default="HOLD", nullable=False) 
     
     # TTL (время истечения) для автоматического освобождения
@@ -41,4 +42,17 @@ class OutboxEvent(Base):
     event_type = Column(String, nullable=False)  # Например, "booking_confirmed"
     payload = Column(JSON, nullable=False)       # Сами данные (user_id, email, dates)
     status = Column(String, default="PENDING")   # PENDING, PROCESSED, FAILED
-    created_at = Column(DateTime, server_default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime, server_default=func.now())
+    # Когда relay забрал событие на публикацию; PROCESSED ставится только после ack брокера
+    claimed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Relay выбирает неотправленные события по порядку id
+        Index("idx_outbox_pending", id, postgresql_where=status == "PENDING"),
+        # Relay проверяет, нет ли у брони более раннего PENDING события
+        Index(
+            "idx_outbox_pending_booking",
+            payload.op("->>")(literal_column("'booking_id'")), id,
+            postgresql_where=status == "PENDING",
+        ),
+    )
\ No newline at end of file
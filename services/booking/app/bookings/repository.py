@@ -1,23 +1,47 @@
+import asyncio
 import os
 import uuid
-import httpx
 from datetime import datetime, timedelta, date
 
 from fastapi import Depends
 
 # SQLAlchemy импорты
-from sqlalchemy import select, update, insert
+from sqlalchemy import select, update, insert, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
 # Модели и база
 from app.bookings.models import Booking, OutboxEvent
 from app.database.engine import AsyncSessionLocal, get_async_session 
+from app.inventory.client import InventoryRefusedError, InventoryUnavailableError, inventory_client
+from app.metrics import metrics
 
-from dotenv import load_dotenv
+# transaction — запись HOLD и вызов Inventory в одной транзакции (держит соединение пула на время HTTP);
+# saga — PENDING фиксируется сразу, Inventory вызывается вне транзакции, итог пишется второй транзакцией.
+BOOKING_HOLD_MODE = os.getenv("BOOKING_HOLD_MODE", "transaction")
+# PENDING-холды старше этого считаются брошенными, и sweeper их разрешает.
+HOLD_PENDING_GRACE_SECONDS = int(os.getenv("HOLD_PENDING_GRACE_SECONDS", "30"))
+HOLD_SWEEP_BATCH = int(os.getenv("HOLD_SWEEP_BATCH", "100"))
+HOLD_SWEEP_CONCURRENCY = int(os.getenv("HOLD_SWEEP_CONCURRENCY", "10"))
+# Истечение холдов: сколько броней брать за проход, сколько освобождать одним /rooms/release/batch
+# и сколько таких вызовов держать одновременно. Воркер спит до ближайшего ttl_expires_at, но не дольше
+# EXPIRY_MAX_SLEEP_SECONDS: холды создают и другие экземпляры сервиса.
+EXPIRY_BATCH_SIZE = int(os.getenv("EXPIRY_BATCH_SIZE", "1000"))
+EXPIRY_RELEASE_CHUNK = int(os.getenv("EXPIRY_RELEASE_CHUNK", "200"))
+EXPIRY_CONCURRENCY = int(os.getenv("EXPIRY_CONCURRENCY", "4"))
+EXPIRY_MAX_SLEEP_SECONDS = float(os.getenv("EXPIRY_MAX_SLEEP_SECONDS", "30"))
 
-# Загружаем URL Inventory Service
-load_dotenv()
-INVENTORY_URL = os.getenv("INVENTORY_SERVICE_URL")
+holds_expired = metrics.counter("booking_holds_expired_total", "Holds moved to EXPIRED.")
+expiry_backlog = metrics.gauge("booking_expiry_backlog", "HOLD bookings past ttl_expires_at that are not claimed yet.")
+expiry_lag = metrics.gauge("booking_expiry_lag_seconds", "Age of the oldest HOLD past ttl_expires_at.")
+expiry_delay = metrics.histogram(
+    "booking_expiry_delay_seconds",
+    "Time from ttl_expires_at to EXPIRED for each expired hold.",
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 300, 900),
+)
+
+def release_op_uuid(inventory_op_uuid: uuid.UUID) -> uuid.UUID:
+    """uuid операции release для брони: детерминированный, чтобы release был идемпотентным."""
+    return uuid.uuid5(inventory_op_uuid, "release")
 
 class BookingRepository:
     def __init__(self, db: AsyncSession):
@@ -26,6 +50,9 @@ class BookingRepository:
         self.TTL_MINUTES = 1
 
     async def create_hold(self, user_id: str, room_type_id: str, check_in: date, check_out: date):
+        if BOOKING_HOLD_MODE == "saga":
+            return await self.create_hold_saga(user_id, room_type_id, check_in, check_out)
+
         inventory_op_uuid = uuid.uuid4()
         expires_at = datetime.utcnow() + timedelta(minutes=self.TTL_MINUTES)
         
@@ -42,43 +69,126 @@ class BookingRepository:
         self.db.add(new_booking)
         await self.db.flush() 
 
-        # 2. Запрос к Inventory Service
-        inventory_payload = {
-            "uuid": str(inventory_op_uuid),
-            "room_type_id": room_type_id,
-            "check_in": check_in.isoformat(),
-            "check_out": check_out.isoformat()
-        }
+        # 2. Запрос к Inventory Service через общий клиент (пул, повторы, circuit breaker)
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{INVENTORY_URL}/rooms/reserve", 
-                    json=inventory_payload,
-                    timeout=5.0
-                )
-                # Проверяем на 4xx и 5xx ошибки
-                response.raise_for_status()
-                
-                # Читаем JSON ответ от напарника
-                data = response.json()
-                
-                # Проверяем бизнес-логику напарника (статус 'failure')
-                if data.get("status") == "failure":
-                    # Используем его опечатку 'massage' из schemas.py
-                    error_msg = data.get("massage") or "No availability"
-                    raise ValueError(f"Inventory Service refused: {error_msg}")
-
-        except Exception as e:
-            # Если возникла любая ошибка (сеть или отказ инвентаря) — откатываем базу
+            await inventory_client.reserve(inventory_op_uuid, room_type_id, check_in, check_out)
+        except InventoryRefusedError as e:
+            # Отказ инвентаря (нет мест) — откатываем базу
             await self.db.rollback()
             # Пробрасываем ошибку дальше, чтобы FastAPI вернул её пользователю
-            raise ValueError(f"Booking failed: {str(e)}")
+            raise ValueError(f"Booking failed: Inventory Service refused: {str(e)}")
+        except Exception:
+            # Inventory недоступен — откатываем базу, роутер вернёт 503
+            await self.db.rollback()
+            raise
 
         # 3. Если всё успешно — фиксируем изменения в нашей БД
         await self.db.commit()
         await self.db.refresh(new_booking)
         return new_booking
     
+    async def create_hold_saga(self, user_id: str, room_type_id: str, check_in: date, check_out: date):
+        """Создание холда без транзакции на время HTTP-вызова.
+
+        Возвращает бронь в статусе HOLD, либо PENDING, если исход в Inventory
+        неизвестен (таймаут, обрыв) — такую бронь позже разрешит sweeper.
+        """
+        inventory_op_uuid = uuid.uuid4()
+        expires_at = datetime.utcnow() + timedelta(minutes=self.TTL_MINUTES)
+
+        # 1. Короткая транзакция: PENDING фиксируется, соединение возвращается в пул
+        new_booking = Booking(
+            inventory_op_uuid=inventory_op_uuid,
+            user_id=user_id,
+            room_type_id=room_type_id,
+            check_in=check_in,
+            check_out=check_out,
+            status="PENDING",
+            ttl_expires_at=expires_at
+        )
+        self.db.add(new_booking)
+        await self.db.commit()
+
+        # 2. Запрос к Inventory вне транзакции
+        try:
+            await inventory_client.reserve(inventory_op_uuid, room_type_id, check_in, check_out)
+        except InventoryRefusedError as e:
+            await self._finalize_pending([new_booking.id], "FAILED")
+            raise ValueError(f"Booking failed: Inventory Service refused: {str(e)}")
+        except InventoryUnavailableError:
+            # Circuit breaker открыт — запрос не отправлялся, резерва точно нет
+            await self._finalize_pending([new_booking.id], "FAILED")
+            raise
+        except Exception as e:
+            # Исход неизвестен: бронь остаётся PENDING до sweeper
+            print(f"[create_hold_saga] hold {new_booking.id} left PENDING: {e}")
+            return new_booking
+
+        # 3. Вторая короткая транзакция: итог
+        await self._finalize_pending([new_booking.id], "HOLD")
+        await self.db.refresh(new_booking)
+        return new_booking
+
+    async def _finalize_pending(self, booking_ids: list[uuid.UUID], status: str) -> int:
+        # Только из PENDING: обработчик запроса и sweeper могут прийти к итогу одновременно,
+        # оба итога совпадают, так как Inventory идемпотентен по inventory_op_uuid.
+        if not booking_ids:
+            return 0
+        result = await self.db.execute(
+            update(Booking)
+            .where(Booking.id.in_(booking_ids), Booking.status == "PENDING")
+            .values(status=status)
+        )
+        await self.db.commit()
+        return result.rowcount
+
+    async def settle_pending_holds(self, limit: int = HOLD_SWEEP_BATCH) -> dict[str, list[uuid.UUID]]:
+        """Технический сценарий: разрешение PENDING-холдов после падений и таймаутов.
+
+        Повторяет reserve с сохранённым inventory_op_uuid: Inventory либо
+        выполнит операцию, либо вернёт результат уже выполненной, поэтому
+        ответ окончательный. Успех — HOLD (с исходным TTL, дальше холд истекает
+        как обычно), отказ — FAILED; при недоступности Inventory строка ждёт
+        следующего прохода.
+        """
+        # Аренда: сдвигаем updated_at, чтобы другие экземпляры не взяли те же строки раньше grace
+        claimable = (
+            select(Booking.id)
+            .where(
+                Booking.status == "PENDING",
+                Booking.updated_at <= func.now() - timedelta(seconds=HOLD_PENDING_GRACE_SECONDS),
+            )
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self.db.execute(
+            update(Booking)
+            .where(Booking.id.in_(claimable.scalar_subquery()))
+            .values(updated_at=func.now())
+            .returning(Booking.id, Booking.inventory_op_uuid, Booking.room_type_id, Booking.check_in, Booking.check_out)
+        )
+        claimed = result.all()
+        await self.db.commit()
+
+        outcomes = {"HOLD": [], "FAILED": []}
+        semaphore = asyncio.Semaphore(HOLD_SWEEP_CONCURRENCY)
+
+        async def settle(row):
+            async with semaphore:
+                try:
+                    await inventory_client.reserve(row.inventory_op_uuid, row.room_type_id, row.check_in, row.check_out)
+                    outcomes["HOLD"].append(row.id)
+                except InventoryRefusedError:
+                    outcomes["FAILED"].append(row.id)
+                except Exception as e:
+                    print(f"[settle_pending_holds] hold {row.id} still unknown: {e}")
+
+        # HTTP-вызовы идут параллельно и вне транзакции
+        await asyncio.gather(*(settle(row) for row in claimed))
+        for status, booking_ids in outcomes.items():
+            await self._finalize_pending(booking_ids, status)
+        return outcomes
+
     async def get_all_holds(self, user_id: str = None):
         """Сценарий 4: Получение списка броней."""
         from sqlalchemy import select
@@ -122,71 +232,176 @@ class BookingRepository:
         return booking
 
     async def cancel_booking(self, booking_id: uuid.UUID):
-        """Сценарий 5: Отмена брони."""
-        query = select(Booking).where(Booking.id == booking_id).with_for_update()
-        result = await self.db.execute(query)
+        """Сценарий 5: Отмена брони.
+
+        Две короткие транзакции вокруг HTTP-вызова: сначала CANCELLING, затем
+        release вне транзакции и CANCELED. Блокировка строки не держится, пока
+        идёт запрос в Inventory. Если release не прошёл, бронь остаётся
+        CANCELLING, и её доводит до конца sweeper (или повторный /cancel).
+        """
+        # 1. Фиксируем CANCELLING; confirm и expire больше не трогают эту бронь
+        result = await self.db.execute(
+            update(Booking)
+            .where(Booking.id == booking_id, Booking.status.in_(["HOLD", "CONFIRMED", "CANCELLING"]))
+            .values(status="CANCELLING")
+            .returning(Booking)
+        )
         booking = result.scalar_one_or_none()
+        await self.db.commit()
+
+        # Нет брони или отменять нечего: уже CANCELED/EXPIRED, FAILED (инвентарь не резервировался),
+        # PENDING (исход ещё не известен), EXPIRING (освобождается по TTL)
+        if booking is None:
+            return await self.db.get(Booking, booking_id)
 
-        if not booking or booking.status in ["CANCELED", "EXPIRED"]:
+        # 2. Запрос в Inventory Service на освобождение (компенсирующее действие) вне транзакции
+        try:
+            await self._release(booking)
+        except Exception as e:
+            print(f"[cancel_booking] booking {booking.id} left CANCELLING: {e}")
             return booking
 
-        # 1. Запрос в Inventory Service на освобождение (компенсирующее действие)
-        # Мы используем сохраненный inventory_op_uuid, чтобы Inventory понял, что это за операция
-        release_uuid = uuid.uuid4()
-        release_body = {
-            "uuid": str(release_uuid),
-            "room_type_id": booking.room_type_id,
-            "check_in": booking.check_in.isoformat(),
-            "check_out": booking.check_out.isoformat()
-        }
+        # 3. Меняем статус и пишем в Outbox
+        await self._finish_release([booking.id], "CANCELLING", "CANCELED")
+        await self.db.refresh(booking)
+        return booking
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(f"{INVENTORY_URL}/rooms/release", json=release_body)
-                # Если 409 (уже отменено) — это ок, продолжаем. Остальные ошибки стопают процесс.
-                if response.status_code != 409:
-                    response.raise_for_status()
-            except Exception as e:
-                # Если инвентори недоступен, мы не можем гарантировать отмену. 
-                # В реальных системах тут нужна очередь на переповтор (Retry).
-                raise Exception(f"Failed to notify Inventory: {str(e)}")
-
-        # 2. Меняем статус и пишем в Outbox
-        booking.status = "CANCELED"
-        event = OutboxEvent(
-            event_type="booking_cancelled",
-            payload={"booking_id": str(booking.id), "user_id": booking.user_id}
+    async def _release(self, booking: Booking):
+        # uuid release выводится из inventory_op_uuid: повторы (клиента, /cancel, sweeper)
+        # попадают в ту же операцию Inventory и не освобождают номер дважды.
+        # 409 (уже отменено) клиент считает успехом.
+        await inventory_client.release(
+            release_op_uuid(booking.inventory_op_uuid), booking.room_type_id, booking.check_in, booking.check_out
         )
-        self.db.add(event)
-        
+
+    async def _finish_release(self, booking_ids: list[uuid.UUID], from_status: str, to_status: str) -> list[uuid.UUID]:
+        # Только из промежуточного статуса, поэтому событие в Outbox пишется ровно один раз.
+        if not booking_ids:
+            return []
+        result = await self.db.execute(
+            update(Booking)
+            .where(Booking.id.in_(booking_ids), Booking.status == from_status)
+            .values(status=to_status)
+            .returning(Booking.id, Booking.user_id)
+        )
+        finished = result.all()
+        event_type = "booking_cancelled" if to_status == "CANCELED" else "booking_expired"
+        for row in finished:
+            self.db.add(OutboxEvent(
+                event_type=event_type,
+                payload={"booking_id": str(row.id), "user_id": row.user_id}
+            ))
         await self.db.commit()
-        return booking
+        return [row.id for row in finished]
 
-    async def expire_old_holds(self):
+    async def expire_old_holds(self, limit: int = EXPIRY_BATCH_SIZE) -> list[uuid.UUID]:
         """Технический сценарий: безопасная очистка просроченных HOLD."""
         # Используем SKIP LOCKED: если другой экземпляр сервиса уже обрабатывает эти строки, 
         # мы их просто пропустим, а не будем ждать блокировки.
-        query = (
+        # Блокировки держатся только на время UPDATE в EXPIRING, не на время HTTP.
+        claimable = (
             select(Booking.id)
             .where(Booking.status == "HOLD", Booking.ttl_expires_at <= datetime.utcnow())
-            .with_for_update(skip_locked=True) 
-            .limit(10) # Обрабатываем пачками
+            .order_by(Booking.ttl_expires_at)
+            .limit(limit) # Обрабатываем пачками, самые старые первыми
+            .with_for_update(skip_locked=True)
         )
-        
-        result = await self.db.execute(query)
-        expired_ids = result.scalars().all()
-        
-        results = []
-        for b_id in expired_ids:
-            try:
-                # В ТР указано, что просроченные холды переходят в статус EXPIRED
-                # Мы вызываем cancel_booking, но внутри можно добавить логику EXPIRED
-                await self.cancel_booking(b_id)
-                results.append(b_id)
-            except Exception as e:
-                print(f"Error expiring hold {b_id}: {e}")
-        
-        return results
+        result = await self.db.execute(
+            update(Booking)
+            .where(Booking.id.in_(claimable.scalar_subquery()))
+            .values(status="EXPIRING")
+            .returning(Booking)
+        )
+        bookings = result.scalars().all()
+        await self.db.commit()
+
+        released = await self._release_batch(bookings)
+
+        # В ТР указано, что просроченные холды переходят в статус EXPIRED
+        expired = await self._finish_release(released, "EXPIRING", "EXPIRED")
+        now = datetime.utcnow()
+        expires_at = {booking.id: booking.ttl_expires_at for booking in bookings}
+        for booking_id in expired:
+            expiry_delay.observe((now - expires_at[booking_id]).total_seconds())
+        holds_expired.inc(len(expired))
+        return expired
+
+    async def _release_batch(self, bookings: list[Booking]) -> list[uuid.UUID]:
+        # Пачками через /rooms/release/batch, не больше EXPIRY_CONCURRENCY вызовов одновременно.
+        # Любой ответ по брони окончательный (failure — освобождать уже нечего); если вызов
+        # не прошёл, брони его пачки остаются EXPIRING, и их повторит sweeper.
+        semaphore = asyncio.Semaphore(EXPIRY_CONCURRENCY)
+        released = []
+
+        async def release_chunk(chunk):
+            async with semaphore:
+                try:
+                    await inventory_client.release_batch([
+                        (release_op_uuid(b.inventory_op_uuid), b.room_type_id, b.check_in, b.check_out)
+                        for b in chunk
+                    ])
+                    released.extend(b.id for b in chunk)
+                except Exception as e:
+                    print(f"Error expiring {len(chunk)} holds: {e}")
+
+        await asyncio.gather(*(
+            release_chunk(bookings[i:i + EXPIRY_RELEASE_CHUNK])
+            for i in range(0, len(bookings), EXPIRY_RELEASE_CHUNK)
+        ))
+        return released
+
+    async def expiry_status(self) -> tuple[int, datetime | None]:
+        """Сколько HOLD уже просрочены и когда истекает ближайший; обновляет метрики очереди."""
+        now = datetime.utcnow()
+        result = await self.db.execute(
+            select(
+                func.count().filter(Booking.ttl_expires_at <= now),
+                func.min(Booking.ttl_expires_at),
+            ).where(Booking.status == "HOLD")
+        )
+        backlog, next_expires_at = result.one()
+        await self.db.commit()
+        expiry_backlog.set(backlog)
+        expiry_lag.set(max(0.0, (now - next_expires_at).total_seconds()) if next_expires_at else 0)
+        return backlog, next_expires_at
+
+    async def resume_releases(self, limit: int = HOLD_SWEEP_BATCH) -> dict[str, list[uuid.UUID]]:
+        """Технический сценарий: довести до конца отмены и истечения, прерванные падением или недоступностью Inventory."""
+        # Аренда, как в settle_pending_holds
+        claimable = (
+            select(Booking.id)
+            .where(
+                Booking.status.in_(["CANCELLING", "EXPIRING"]),
+                Booking.updated_at <= func.now() - timedelta(seconds=HOLD_PENDING_GRACE_SECONDS),
+            )
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self.db.execute(
+            update(Booking)
+            .where(Booking.id.in_(claimable.scalar_subquery()))
+            .values(updated_at=func.now())
+            .returning(Booking)
+        )
+        claimed = result.scalars().all()
+        await self.db.commit()
+
+        released = {"CANCELLING": [], "EXPIRING": []}
+        semaphore = asyncio.Semaphore(HOLD_SWEEP_CONCURRENCY)
+
+        async def resume(booking):
+            async with semaphore:
+                try:
+                    await self._release(booking)
+                    released[booking.status].append(booking.id)
+                except Exception as e:
+                    print(f"[resume_releases] booking {booking.id} still {booking.status}: {e}")
+
+        await asyncio.gather(*(resume(booking) for booking in claimed))
+        return {
+            "CANCELED": await self._finish_release(released["CANCELLING"], "CANCELLING", "CANCELED"),
+            "EXPIRED": await self._finish_release(released["EXPIRING"], "EXPIRING", "EXPIRED"),
+        }
 
 async def get_booking_repository(db: AsyncSession = Depends(get_async_session)):
     return BookingRepository(db)
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
 import uuid
 # Импорт схем
 from app.bookings.schemas import HoldCreateSchema, HoldResponseSchema 
 from app.bookings.repository import BookingRepository, get_booking_repository
+from app.inventory.client import InventoryError
 
 # ИСПРАВЛЕНО: убраны лишние \ перед кавычками
 router = APIRouter(prefix="/holds", tags=["Holds and Bookings"])
@@ -11,11 +12,15 @@ router = APIRouter(prefix="/holds", tags=["Holds and Bookings"])
 @router.post("/", status_code=201)
 async def create_new_hold(
     data: HoldCreateSchema,
+    response: Response,
     repo: BookingRepository = Depends(get_booking_repository)
 ):
     """
     Создает временный резерв (HOLD) в Booking Service и атомарно 
     резервирует инвентарь в Inventory Service.
+
+    В режиме saga при неизвестном исходе в Inventory возвращает 202 и бронь
+    в статусе PENDING; итог (HOLD или FAILED) виден в GET /holds/.
     """
     try: 
         # repo.create_hold выполняет HTTP-запрос и запись в DB
@@ -26,6 +31,9 @@ async def create_new_hold(
             data.check_out
         )
         
+        if hold_data.status == "PENDING":
+            response.status_code = 202
+
         # Преобразование результата DB в схему ответа
         return {
             "id": hold_data.id, 
@@ -36,6 +44,9 @@ async def create_new_hold(
     except ValueError as e:
         # Возвращаем 409, если нет доступности (пришло от Inventory Service)
         raise HTTPException(status_code=409, detail=str(e))
+    except InventoryError as e:
+        # Inventory недоступен или circuit breaker открыт — клиент может повторить позже
+        raise HTTPException(status_code=503, detail=f"Inventory Service unavailable: {e}")
     except Exception as e:
         # Для других непредвиденных ошибок
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
@@ -62,12 +73,18 @@ async def confirm_hold(
 @router.post("/{hold_id}/cancel")
 async def cancel_hold(
     hold_id: uuid.UUID,
+    response: Response,
     repo: BookingRepository = Depends(get_booking_repository)
 ):
-    """Отмена брони (Сценарий 5 из ТР)."""
+    """Отмена брони (Сценарий 5 из ТР).
+
+    202 и статус CANCELLING, если Inventory не ответил: отмену завершит sweeper.
+    """
     cancelled = await repo.cancel_booking(hold_id)
     if not cancelled:
         raise HTTPException(status_code=404, detail="Booking not found or already cancelled")
+    if cancelled.status == "CANCELLING":
+        response.status_code = 202
     return {"id": cancelled.id, "status": cancelled.status}
 
 @router.post("/internal/expire")
@@ -0,0 +1,257 @@
+import asyncio
+import os
+import random
+import time
+import uuid
+from datetime import date
+
+import httpx
+from dotenv import load_dotenv
+
+from app.metrics import metrics
+
+load_dotenv()
+
+INVENTORY_URL = os.getenv("INVENTORY_SERVICE_URL")
+
+# Пул соединений к Inventory: общий на процесс, с keep-alive.
+INVENTORY_MAX_CONNECTIONS = int(os.getenv("INVENTORY_MAX_CONNECTIONS", "100"))
+INVENTORY_MAX_KEEPALIVE = int(os.getenv("INVENTORY_MAX_KEEPALIVE", "20"))
+INVENTORY_CONNECT_TIMEOUT_SECONDS = float(os.getenv("INVENTORY_CONNECT_TIMEOUT_SECONDS", "1.0"))
+INVENTORY_POOL_TIMEOUT_SECONDS = float(os.getenv("INVENTORY_POOL_TIMEOUT_SECONDS", "1.0"))
+
+# Дедлайн одного вызова вместе со всеми повторами.
+INVENTORY_DEADLINE_SECONDS = float(os.getenv("INVENTORY_DEADLINE_SECONDS", "5.0"))
+INVENTORY_RETRIES = int(os.getenv("INVENTORY_RETRIES", "2"))
+INVENTORY_RETRY_BASE_SECONDS = float(os.getenv("INVENTORY_RETRY_BASE_SECONDS", "0.1"))
+INVENTORY_RETRY_MAX_SECONDS = float(os.getenv("INVENTORY_RETRY_MAX_SECONDS", "1.0"))
+
+# Circuit breaker: после N ошибок подряд вызовы отклоняются сразу, пока не пройдёт пауза.
+INVENTORY_BREAKER_FAILURES = int(os.getenv("INVENTORY_BREAKER_FAILURES", "5"))
+INVENTORY_BREAKER_RESET_SECONDS = float(os.getenv("INVENTORY_BREAKER_RESET_SECONDS", "10"))
+
+
+inventory_requests = metrics.counter(
+    "inventory_requests_total", "Calls to Inventory by endpoint and outcome (success, refused, error, rejected)."
+)
+inventory_retries = metrics.counter("inventory_retries_total", "Attempts repeated after a transient Inventory error.")
+inventory_latency = metrics.histogram(
+    "inventory_request_duration_seconds",
+    "Duration of Inventory calls including retries.",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+inventory_circuit_state = metrics.gauge(
+    "inventory_circuit_state", "Inventory circuit breaker: 0 closed, 1 open, 2 half-open."
+)
+
+
+class InventoryError(Exception):
+    """Inventory не ответил вовремя или ответил ошибкой; исход операции неизвестен."""
+
+
+class InventoryUnavailableError(InventoryError):
+    """Circuit breaker открыт: вызов не отправлялся."""
+
+
+class InventoryRefusedError(Exception):
+    """Inventory отказал в операции (нет мест, неизвестный тип номера, неверные данные)."""
+
+
+class CircuitBreaker:
+    """Считает ошибки подряд; после ``failure_threshold`` размыкается на ``reset_seconds``.
+
+    После паузы пропускает один пробный вызов (half-open): успех замыкает цепь,
+    ошибка снова размыкает её.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self._probe_in_flight = False
+        self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                print(f"[inventory_client] circuit opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+    def end_probe(self):
+        self._probe_in_flight = False
+
+    def _set_state(self, state: int):
+        self.state = state
+        inventory_circuit_state.set(state)
+
+
+class InventoryClient:
+    """Общий HTTP-клиент Inventory Service.
+
+    Создаётся при старте приложения и закрывается при остановке. Повторы
+    безопасны: Inventory идемпотентен по ``uuid`` операции, и повтор уже
+    выполненной операции возвращает успех.
+    """
+
+    def __init__(self, base_url: str | None):
+        self.base_url = base_url
+        self.breaker = CircuitBreaker(INVENTORY_BREAKER_FAILURES, INVENTORY_BREAKER_RESET_SECONDS)
+        self._http: httpx.AsyncClient | None = None
+
+    async def start(self):
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url or "",
+                limits=httpx.Limits(
+                    max_connections=INVENTORY_MAX_CONNECTIONS,
+                    max_keepalive_connections=INVENTORY_MAX_KEEPALIVE,
+                ),
+                timeout=httpx.Timeout(
+                    INVENTORY_DEADLINE_SECONDS,
+                    connect=INVENTORY_CONNECT_TIMEOUT_SECONDS,
+                    pool=INVENTORY_POOL_TIMEOUT_SECONDS,
+                ),
+            )
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def reserve(self, op_uuid: uuid.UUID, room_type_id: str, check_in: date, check_out: date) -> dict:
+        return await self._operation("/rooms/reserve", op_uuid, room_type_id, check_in, check_out)
+
+    async def release(self, op_uuid: uuid.UUID, room_type_id: str, check_in: date, check_out: date) -> dict:
+        # 409 на release (нечего освобождать, уже освобождено) — это ок.
+        return await self._operation("/rooms/release", op_uuid, room_type_id, check_in, check_out, conflict_ok=True)
+
+    async def release_batch(self, operations: list[tuple[uuid.UUID, str, date, date]]) -> list[dict]:
+        """Освобождает несколько броней одним вызовом ``/rooms/release/batch`` в режиме best_effort.
+
+        Результаты идут в порядке ``operations``; ``status=failure`` (нечего освобождать) — это ок, как 409 на release.
+        """
+        response = await self.post(
+            "/rooms/release/batch?mode=best_effort",
+            [_operation_body(*operation) for operation in operations],
+        )
+        if response.status_code >= 400:
+            raise InventoryRefusedError(f"/rooms/release/batch returned {response.status_code}: {response.text[:200]}")
+        return response.json()
+
+    async def _operation(
+        self,
+        path: str,
+        op_uuid: uuid.UUID,
+        room_type_id: str,
+        check_in: date,
+        check_out: date,
+        conflict_ok: bool = False,
+    ) -> dict:
+        response = await self.post(path, _operation_body(op_uuid, room_type_id, check_in, check_out))
+        try:
+            data = response.json()
+        except ValueError:
+            raise InventoryRefusedError(f"{path} returned {response.status_code}: {response.text[:200]}")
+        if response.status_code == 409:
+            # 409 со status=success — повтор уже выполненной операции.
+            detail = data.get("detail") or {}
+            if detail.get("status") == "success" or conflict_ok:
+                return detail
+            raise InventoryRefusedError(detail.get("msg") or "Operation refused")
+        if response.status_code >= 400:
+            raise InventoryRefusedError(str(data.get("detail") or response.status_code))
+        if data.get("status") == "failure":
+            # Используем опечатку 'massage' из схем Inventory
+            raise InventoryRefusedError(data.get("massage") or "No availability")
+        return data
+
+    async def post(self, path: str, body) -> httpx.Response:
+        """POST с повторами при сетевых ошибках, 5xx и 429 в пределах дедлайна.
+
+        Возвращает ответ со статусом < 500 (кроме 429); вызывающий разбирает 4xx сам.
+        """
+        if not self.breaker.allow():
+            inventory_requests.inc(endpoint=path, outcome="rejected")
+            raise InventoryUnavailableError("Inventory circuit is open")
+        probing = self.breaker.state == CircuitBreaker.HALF_OPEN
+        if self._http is None:
+            await self.start()
+
+        started = time.monotonic()
+        deadline = started + INVENTORY_DEADLINE_SECONDS
+        attempt = 0
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                retry_after = None
+                try:
+                    response = await self._http.post(path, json=body, timeout=max(remaining, 0.001))
+                    if response.status_code == 429:
+                        retry_after = _retry_after(response)
+                        error = InventoryError(f"{path} overloaded (429)")
+                    elif response.status_code >= 500:
+                        error = InventoryError(f"{path} failed with {response.status_code}")
+                    else:
+                        self.breaker.record_success()
+                        inventory_requests.inc(endpoint=path, outcome="success" if response.status_code < 400 else "refused")
+                        return response
+                except httpx.TransportError as exc:
+                    error = InventoryError(f"{path} unreachable: {exc!r}")
+
+                # 429 значит, что Inventory жив и отбрасывает нагрузку, — это не отказ сервиса.
+                if retry_after is None:
+                    self.breaker.record_failure()
+                delay = retry_after if retry_after is not None else random.uniform(
+                    0, min(INVENTORY_RETRY_MAX_SECONDS, INVENTORY_RETRY_BASE_SECONDS * 2 ** attempt)
+                )
+                if attempt >= INVENTORY_RETRIES or time.monotonic() + delay >= deadline or not self.breaker.allow():
+                    inventory_requests.inc(endpoint=path, outcome="error")
+                    raise error
+                attempt += 1
+                inventory_retries.inc(endpoint=path)
+                await asyncio.sleep(delay)
+        finally:
+            if probing:
+                # Пробный вызов отменён до результата — следующий вызов станет пробным.
+                self.breaker.end_probe()
+            inventory_latency.observe(time.monotonic() - started, endpoint=path)
+
+
+def _operation_body(op_uuid: uuid.UUID, room_type_id: str, check_in: date, check_out: date) -> dict:
+    return {
+        "uuid": str(op_uuid),
+        "room_type_id": room_type_id,
+        "check_in": check_in.isoformat(),
+        "check_out": check_out.isoformat(),
+    }
+
+
+def _retry_after(response: httpx.Response) -> float:
+    try:
+        return max(0.0, float(response.headers.get("Retry-After", "0")))
+    except ValueError:
+        return 0.0
+
+
+inventory_client = InventoryClient(INVENTORY_URL)
@@ -1,10 +1,13 @@
 import asyncio
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
-from app.bookings.cleanup_worker import expire_holds_worker
+from app.bookings.cleanup_worker import expire_holds_worker, settle_in_flight_bookings_worker
 from app.bookings.publisher import publish_outbox_events
 from app.bookings.router import router as booking_router
+from app.inventory.client import inventory_client
+from app.metrics import metrics
 
 app = FastAPI(
     title="Booking Service",
@@ -18,11 +21,24 @@ def health_check():
     return {"status": "ok", "service": "booking"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    return metrics.render()
+
+
 @app.on_event("startup")
 async def startup_event():
+    # Общий пул соединений к Inventory на весь процесс
+    await inventory_client.start()
     # Запускаем фоновые задачи при старте приложения
     asyncio.create_task(publish_outbox_events())
     asyncio.create_task(expire_holds_worker())
+    asyncio.create_task(settle_in_flight_bookings_worker())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await inventory_client.close()
 
 
 # 1. Подключение основного роутера
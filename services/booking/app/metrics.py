@@ -0,0 +1,109 @@
+from typing import Callable
+
+
+def _format_labels(labels: tuple[tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: dict[tuple[tuple[str, str], ...], float] = {}
+
+    def samples(self) -> dict[tuple[tuple[str, str], ...], float]:
+        return self._values
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for labels, value in sorted((self.samples() or {(): 0}).items()):
+            lines.append(f"{self.name}{_format_labels(labels)} {value:g}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float] | None = None):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def set(self, value: float, **labels: str):
+        self._values[tuple(sorted(labels.items()))] = value
+
+    def samples(self) -> dict[tuple[tuple[str, str], ...], float]:
+        if self.callback is not None:
+            return {(): self.callback()}
+        return self._values
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: tuple[float, ...]):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple[tuple[str, str], ...], list[float]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        # Счётчики по бакетам, затем +Inf, сумма и количество.
+        series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 3))
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[index] += 1
+        series[-3] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for labels, series in sorted(self._series.items()):
+            for bound, count in zip((*(f"{bound:g}" for bound in self.buckets), "+Inf"), series):
+                lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', bound),))} {count:g}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {series[-2]:g}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {series[-1]:g}")
+        return lines
+
+
+class MetricsRegistry:
+    """Метрики процесса в текстовом формате Prometheus, отдаются через ``GET /metrics``."""
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._register(Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str, callback: Callable[[], float] | None = None) -> Gauge:
+        return self._register(Gauge(name, documentation, callback))
+
+    def histogram(self, name: str, documentation: str, buckets: tuple[float, ...]) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
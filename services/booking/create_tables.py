@@ -1,6 +1,7 @@
 import asyncio
 import sys
 import selectors
+from sqlalchemy import text
 from app.database.engine import engine, Base
 from app.bookings.models import Booking, OutboxEvent
 
@@ -8,6 +9,15 @@ async def main():
     print("Подключение к базе в Docker...")
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        # create_all не меняет уже существующие таблицы: добавляем колонки и индексы, появившиеся позже
+        await conn.execute(text("ALTER TABLE outbox_events ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP"))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox_events (id) WHERE status = 'PENDING'"
+        ))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_outbox_pending_booking ON outbox_events ((payload ->> 'booking_id'), id) "
+            "WHERE status = 'PENDING'"
+        ))
     print("Таблицы успешно созданы!")
 
 if __name__ == "__main__":
@@ -0,0 +1,39 @@
+import hmac
+
+from fastapi import APIRouter, Header, Query, Request
+from fastapi.params import Depends
+
+from app.config import settings
+from app.exceptions import ImportForbiddenException, ImportValidationException
+from app.rooms.importer import import_csv
+from app.rooms.schemas import SImportReport
+
+
+def require_admin_token(x_admin_token: str | None = Header(None)):
+    if not settings.ADMIN_TOKEN or not hmac.compare_digest(x_admin_token or "", settings.ADMIN_TOKEN):
+        raise ImportForbiddenException()
+
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin 🔧"],
+    dependencies=[Depends(require_admin_token)],
+)
+
+
+def _checked(report: SImportReport) -> SImportReport:
+    if report.errors:
+        raise ImportValidationException(report)
+    return report
+
+
+@router.post("/import/room-types")
+async def import_room_types(request: Request, hotel_id: str = Query(...)) -> SImportReport:
+    """CSV body with room_type_id,name,capacity_adults,price,total_quantity, streamed into COPY."""
+    return _checked(await import_csv(hotel_id, room_types=request.stream()))
+
+
+@router.post("/import/inventory")
+async def import_inventory(request: Request, hotel_id: str = Query(...)) -> SImportReport:
+    """CSV body with room_type_id,date,reserved_quantity[,blocked_quantity], streamed into COPY."""
+    return _checked(await import_csv(hotel_id, inventory=request.stream()))
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import root_validator, BaseSettings
 
 
@@ -8,9 +10,72 @@ class Settings(BaseSettings):
     DB_PASS: str
     DB_NAME: str
 
+    # Comma-separated postgresql:// DSNs of read replicas; empty reads from the primary only.
+    DB_REPLICA_DSNS: str = ""
+    REPLICA_MAX_LAG_SECONDS: float = 5.0
+    REPLICA_CHECK_INTERVAL_SECONDS: float = 1.0
+
+    # Extra shards as comma-separated name=postgresql://... pairs, and hotels
+    # pinned to them as hotel_id=shard pairs. The DB_* database is shard
+    # "default" and holds every hotel not listed in HOTEL_SHARDS.
+    DB_SHARDS: str = ""
+    HOTEL_SHARDS: str = ""
+
+    RESERVATION_MODE: Literal["session", "function", "ledger"] = "session"
+
+    CALENDAR_HORIZON_DAYS: int = 540
+    CALENDAR_MATERIALIZE_ENABLED: bool = False
+    CALENDAR_MATERIALIZE_INTERVAL_SECONDS: int = 3600
+
+    PARTITION_MAINTENANCE_ENABLED: bool = False
+    PARTITION_MAINTENANCE_INTERVAL_SECONDS: int = 86400
+    PARTITION_ARCHIVE_SCHEMA: str = "archive"
+    INVENTORY_DAILY_RETENTION_MONTHS: int = 12
+    OPERATIONS_RETENTION_MONTHS: int = 6
+    OPERATIONS_PARTITION_MONTHS_AHEAD: int = 3
+
+    AVAILABILITY_INDEX_ENABLED: bool = False
+    AVAILABILITY_INDEX_HORIZON_DAYS: int = 365
+    AVAILABILITY_INDEX_RELOAD_SECONDS: int = 300
+
+    CATALOG_CACHE_TTL_SECONDS: int = 60
+
+    SEARCH_CACHE_SIZE: int = 0
+
+    RESERVE_COALESCE_WINDOW_MS: int = 0
+    RESERVE_COALESCE_MAX_BATCH: int = 200
+
+    LEDGER_STRIPES: int = 8
+    LEDGER_COMPACT_ENABLED: bool = True
+    LEDGER_COMPACT_INTERVAL_SECONDS: float = 1.0
+    LEDGER_COMPACT_BATCH_SIZE: int = 5000
+
+    ADMISSION_CONCURRENCY: int = 0
+    ADMISSION_MAX_QUEUE: int = 32
+    ADMISSION_MAX_WAIT_MS: int = 2000
+
+    # Shared secret for the /admin endpoints, sent as X-Admin-Token; empty disables them.
+    ADMIN_TOKEN: str = ""
+
     @root_validator
     def get_database_url(cls, v):
         v["DATABASE_URL"] = f"postgresql+asyncpg://{v['DB_USER']}:{v['DB_PASS']}@{v['DB_HOST']}:{v['DB_PORT']}/{v['DB_NAME']}"
+        v["REPLICA_DATABASE_URLS"] = [
+            f"postgresql+asyncpg://{dsn.strip().split('://', 1)[1]}"
+            for dsn in v.get("DB_REPLICA_DSNS", "").split(",") if dsn.strip()
+        ]
+        v["SHARD_DATABASE_URLS"] = {"default": v["DATABASE_URL"]}
+        for pair in v.get("DB_SHARDS", "").split(","):
+            if pair.strip():
+                name, dsn = pair.split("=", 1)
+                v["SHARD_DATABASE_URLS"][name.strip()] = f"postgresql+asyncpg://{dsn.strip().split('://', 1)[1]}"
+        v["HOTEL_SHARD_MAP"] = {}
+        for pair in v.get("HOTEL_SHARDS", "").split(","):
+            if pair.strip():
+                hotel_id, shard = pair.split("=", 1)
+                if shard.strip() not in v["SHARD_DATABASE_URLS"]:
+                    raise ValueError(f"HOTEL_SHARDS maps {hotel_id.strip()} to unknown shard {shard.strip()}")
+                v["HOTEL_SHARD_MAP"][hotel_id.strip()] = shard.strip()
         return v
 
     class Config:
@@ -24,6 +24,22 @@ class RoomsValidationDateException(RoomException):
     detail = "Fields 'check_in' and 'check_out' must be specified both or none."
 
 
+class RoomsValidationCalendarException(RoomException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    detail = "Field 'to' must be after 'from' and the range must not exceed 366 days."
+
+
+class RoomsValidationFlexibleDateException(RoomException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    detail = "Field 'nights' must be positive and fit into [date_from, date_to), which must not exceed 366 days."
+
+
+class RoomsValidationAlternativesException(RoomException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    detail = "Field 'check_out' must be after 'check_in' (at most 366 days), 'quantity' and 'limit' must be " \
+             "positive and 'max_shift_days' must be between 0 and 30."
+
+
 class OperationException(HTTPException):
     status_code = 500
     detail = {
@@ -56,4 +72,94 @@ class OperationDelFailedException(OperationException):
     detail = {
         "status": "fail",
         "msg": "Operation failed, no rooms to release."
-    }
\ No newline at end of file
+    }
+
+
+class OperationExpiredException(OperationException):
+    status_code = status.HTTP_409_CONFLICT
+    detail = {
+        "status": "fail",
+        "msg": "Operation is older than the idempotency horizon and its outcome is no longer known, "
+               "use a new uuid."
+    }
+
+
+class OperationOverloadedException(OperationException):
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    detail = {
+        "status": "fail",
+        "msg": "Too many concurrent operations on this room type, retry later."
+    }
+
+    def __init__(self, retry_after: int):
+        HTTPException.__init__(
+            self,
+            status_code=self.status_code,
+            detail=self.detail,
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class OperationBatchFailedException(OperationException):
+    status_code = status.HTTP_409_CONFLICT
+    detail = {
+        "status": "fail",
+        "msg": "Batch operation failed, no changes were applied."
+    }
+
+    def __init__(self, failed: list):
+        HTTPException.__init__(
+            self,
+            status_code=self.status_code,
+            detail={**self.detail, "failed": [str(uuid) for uuid in failed]},
+        )
+
+
+class OperationBatchCrossShardException(OperationException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    detail = {
+        "status": "fail",
+        "msg": "An all_or_nothing batch must only contain hotels stored in the same shard."
+    }
+
+
+class ImportException(HTTPException):
+    status_code = 500
+    detail = {
+        "status": "",
+        "msg": ""
+    }
+
+    def __init__(self):
+        super().__init__(status_code=self.status_code, detail=self.detail)
+
+
+class ImportForbiddenException(ImportException):
+    status_code = status.HTTP_403_FORBIDDEN
+    detail = {
+        "status": "fail",
+        "msg": "Admin API is disabled or the X-Admin-Token header is wrong."
+    }
+
+
+class ImportLedgerModeException(ImportException):
+    status_code = status.HTTP_409_CONFLICT
+    detail = {
+        "status": "fail",
+        "msg": "Imports are not supported with RESERVATION_MODE=ledger."
+    }
+
+
+class ImportValidationException(ImportException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    detail = {
+        "status": "fail",
+        "msg": "Import rejected, no changes were applied."
+    }
+
+    def __init__(self, report):
+        HTTPException.__init__(
+            self,
+            status_code=self.status_code,
+            detail={**self.detail, "errors": [error.dict() for error in report.errors]},
+        )
@@ -1,13 +1,80 @@
+import asyncio
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 import uvicorn
 
+from app.admin.router import router as router_admin
+from app.config import settings
+from app.metrics import metrics
+from app.notifications import INVENTORY_CHANNEL, ROOM_TYPES_CHANNEL, change_listener
+from app.replicas import replica_pool
+from app.rooms.availability import availability_index
+from app.rooms.catalog import room_catalog
+from app.rooms.ledger import ledger_compactor_worker
+from app.rooms.materializer import materialize_calendar_worker
+from app.rooms.partitions import partition_maintenance_worker
+from app.rooms.repository import RoomDAO
 from app.rooms.router import router as router_rooms
+from app.rooms.search_cache import search_cache
+from app.shards import shard_router
 
 
 app = FastAPI()
 
 app.include_router(router_rooms)
+app.include_router(router_admin)
+
+background_tasks: list[asyncio.Task] = []
+
+
+@app.on_event("startup")
+async def startup_event():
+    if shard_router.sharded:
+        # Caches, notifications and write routing key on room_type_id alone.
+        duplicates = await RoomDAO.find_duplicate_ids()
+        if duplicates:
+            raise RuntimeError(f"room_type_id present in more than one shard: {', '.join(duplicates[:20])}")
+    if replica_pool.replicas:
+        background_tasks.append(asyncio.create_task(replica_pool.run()))
+    if settings.PARTITION_MAINTENANCE_ENABLED:
+        background_tasks.append(asyncio.create_task(partition_maintenance_worker(
+            settings.PARTITION_MAINTENANCE_INTERVAL_SECONDS,
+        )))
+    if settings.CALENDAR_MATERIALIZE_ENABLED:
+        background_tasks.append(asyncio.create_task(materialize_calendar_worker(
+            settings.CALENDAR_HORIZON_DAYS,
+            settings.CALENDAR_MATERIALIZE_INTERVAL_SECONDS,
+        )))
+    if settings.RESERVATION_MODE == "ledger" and settings.LEDGER_COMPACT_ENABLED:
+        background_tasks.append(asyncio.create_task(ledger_compactor_worker(
+            settings.LEDGER_COMPACT_INTERVAL_SECONDS,
+            settings.LEDGER_COMPACT_BATCH_SIZE,
+        )))
+    if settings.CATALOG_CACHE_TTL_SECONDS > 0:
+        change_listener.subscribe(ROOM_TYPES_CHANNEL, room_catalog.invalidate)
+    if settings.AVAILABILITY_INDEX_ENABLED:
+        change_listener.subscribe(INVENTORY_CHANNEL, availability_index.invalidate)
+        change_listener.subscribe(ROOM_TYPES_CHANNEL, lambda payload: availability_index.invalidate(None))
+        background_tasks.append(asyncio.create_task(availability_index.run()))
+    if settings.SEARCH_CACHE_SIZE > 0:
+        change_listener.subscribe(INVENTORY_CHANNEL, search_cache.invalidate)
+        change_listener.subscribe(ROOM_TYPES_CHANNEL, search_cache.invalidate_all)
+    if settings.CATALOG_CACHE_TTL_SECONDS > 0 or settings.AVAILABILITY_INDEX_ENABLED or settings.SEARCH_CACHE_SIZE > 0:
+        background_tasks.append(asyncio.create_task(change_listener.run()))
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return metrics.render()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
 
 
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", reload=True)
\ No newline at end of file
+    uvicorn.run("app.main:app", reload=True)
@@ -0,0 +1,51 @@
+"""Add inventory ledger and counters
+
+Revision ID: 4549ed6bb4ce
+Revises: c8877d66641b
+Create Date: 2026-10-18 17:12:30.508114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4549ed6bb4ce'
+down_revision: Union[str, Sequence[str], None] = 'c8877d66641b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('inventory_ledger',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('room_type_id', sa.String(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('delta', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['room_type_id'], ['room_types.room_type_id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_inventory_ledger_room_type_id_date', 'inventory_ledger', ['room_type_id', 'date'],
+        postgresql_include=['delta'],
+    )
+    op.create_table('inventory_counters',
+    sa.Column('room_type_id', sa.String(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('stripe', sa.SmallInteger(), nullable=False),
+    sa.Column('capacity', sa.Integer(), nullable=False),
+    sa.Column('reserved', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['room_type_id'], ['room_types.room_type_id'], ),
+    sa.PrimaryKeyConstraint('room_type_id', 'date', 'stripe')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('inventory_counters')
+    op.drop_index('ix_inventory_ledger_room_type_id_date', table_name='inventory_ledger')
+    op.drop_table('inventory_ledger')
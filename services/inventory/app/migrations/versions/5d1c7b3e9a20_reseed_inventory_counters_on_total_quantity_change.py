@@ -0,0 +1,50 @@
+"""Reseed inventory counters on total_quantity change
+
+Revision ID: 5d1c7b3e9a20
+Revises: e2542a3b1e24
+Create Date: 2026-10-18 21:04:37.118502
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d1c7b3e9a20'
+down_revision: Union[str, Sequence[str], None] = 'e2542a3b1e24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Stripe capacities are split from total_quantity when a room type's counters
+# are seeded. Dropping them when it changes makes the next ledger write seed
+# them again from inventory_daily plus the pending deltas; the DELETE waits
+# for writers holding counter rows, so none of their deltas is lost.
+RESET_INVENTORY_COUNTERS = """
+CREATE OR REPLACE FUNCTION reset_inventory_counters() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM inventory_counters WHERE room_type_id = NEW.room_type_id;
+    RETURN NULL;
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(RESET_INVENTORY_COUNTERS)
+    op.execute(
+        "CREATE TRIGGER room_types_total_quantity_changed "
+        "AFTER UPDATE OF total_quantity ON room_types "
+        "FOR EACH ROW WHEN (OLD.total_quantity IS DISTINCT FROM NEW.total_quantity) "
+        "EXECUTE FUNCTION reset_inventory_counters()"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS room_types_total_quantity_changed ON room_types")
+    op.execute("DROP FUNCTION IF EXISTS reset_inventory_counters()")
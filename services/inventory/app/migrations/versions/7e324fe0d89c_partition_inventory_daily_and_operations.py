@@ -0,0 +1,151 @@
+"""Partition inventory_daily and operations
+
+Revision ID: 7e324fe0d89c
+Revises: 4549ed6bb4ce
+Create Date: 2026-10-18 17:41:26.118402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e324fe0d89c'
+down_revision: Union[str, Sequence[str], None] = '4549ed6bb4ce'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Monthly partitions covering the rows already in {parent}, the current month
+# and {months_ahead} months after it; app.rooms.partitions keeps them rolling.
+CREATE_MONTHLY_PARTITIONS = """
+DO $$
+DECLARE
+    v_month date;
+    v_last date;
+BEGIN
+    SELECT date_trunc('month', least(min({column}), now()))::date,
+           date_trunc('month', greatest(max({column}), now()))::date + interval '{months_ahead} months'
+    INTO v_month, v_last
+    FROM {source};
+
+    WHILE v_month <= v_last LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF {parent} FOR VALUES FROM (%L) TO (%L)',
+            '{parent}_p' || to_char(v_month, 'YYYYMM'), v_month, (v_month + interval '1 month')::date
+        );
+        v_month := (v_month + interval '1 month')::date;
+    END LOOP;
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # inventory_daily: the partition key has to be part of every unique index,
+    # so the surrogate primary key becomes (id, date). (room_type_id, date)
+    # already contains it and stays the ON CONFLICT arbiter.
+    op.execute("ALTER TABLE inventory_daily RENAME TO inventory_daily_unpartitioned")
+    op.execute("ALTER INDEX inventory_daily_pkey RENAME TO inventory_daily_unpartitioned_pkey")
+    op.execute("ALTER INDEX ix_inventory_daily_room_type_id_date RENAME TO ix_inventory_daily_unpartitioned_room_type_id_date")
+    op.execute("""
+        CREATE TABLE inventory_daily (
+            id integer NOT NULL DEFAULT nextval('inventory_daily_id_seq'),
+            room_type_id varchar REFERENCES room_types (room_type_id),
+            date date NOT NULL,
+            reserved_quantity integer NOT NULL,
+            updated_at timestamptz NOT NULL DEFAULT now(),
+            CONSTRAINT inventory_daily_pkey PRIMARY KEY (id, date)
+        ) PARTITION BY RANGE (date)
+    """)
+    op.create_index(
+        'ix_inventory_daily_room_type_id_date', 'inventory_daily', ['room_type_id', 'date'],
+        unique=True, postgresql_include=['reserved_quantity'],
+    )
+    op.execute("CREATE TABLE inventory_daily_default PARTITION OF inventory_daily DEFAULT")
+    op.execute(CREATE_MONTHLY_PARTITIONS.format(
+        parent='inventory_daily', source='inventory_daily_unpartitioned', column='date', months_ahead=19,
+    ))
+    op.execute("INSERT INTO inventory_daily SELECT id, room_type_id, date, reserved_quantity, updated_at FROM inventory_daily_unpartitioned")
+    op.execute("ALTER SEQUENCE inventory_daily_id_seq OWNED BY inventory_daily.id")
+    op.execute("DROP TABLE inventory_daily_unpartitioned")
+
+    # operations: uuid alone can no longer be unique across partitions.
+    # Writers already serialize on an advisory lock keyed by the uuid before
+    # looking it up, which is what keeps an operation from being applied twice.
+    op.execute("ALTER TABLE operations RENAME TO operations_unpartitioned")
+    op.execute("ALTER INDEX operations_pkey RENAME TO operations_unpartitioned_pkey")
+    op.execute("""
+        CREATE TABLE operations (
+            uuid uuid NOT NULL,
+            status varchar NOT NULL,
+            operation_type varchar NOT NULL,
+            room_type_id varchar REFERENCES room_types (room_type_id),
+            check_in date NOT NULL,
+            check_out date NOT NULL,
+            quantity integer NOT NULL DEFAULT 1,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            updated_at timestamptz NOT NULL DEFAULT now(),
+            CONSTRAINT operations_pkey PRIMARY KEY (uuid, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("CREATE TABLE operations_default PARTITION OF operations DEFAULT")
+    op.execute(CREATE_MONTHLY_PARTITIONS.format(
+        parent='operations', source='operations_unpartitioned', column='created_at', months_ahead=3,
+    ))
+    op.execute("""
+        INSERT INTO operations (uuid, status, operation_type, room_type_id, check_in, check_out, quantity, created_at, updated_at)
+        SELECT uuid, status, operation_type, room_type_id, check_in, check_out, quantity, created_at, updated_at
+        FROM operations_unpartitioned
+    """)
+    op.execute("DROP TABLE operations_unpartitioned")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE operations RENAME TO operations_partitioned")
+    op.execute("ALTER INDEX operations_pkey RENAME TO operations_partitioned_pkey")
+    op.execute("""
+        CREATE TABLE operations (
+            status varchar NOT NULL,
+            operation_type varchar NOT NULL,
+            room_type_id varchar REFERENCES room_types (room_type_id),
+            check_in date NOT NULL,
+            check_out date NOT NULL,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            updated_at timestamptz NOT NULL DEFAULT now(),
+            uuid uuid NOT NULL,
+            quantity integer NOT NULL DEFAULT 1,
+            CONSTRAINT operations_pkey PRIMARY KEY (uuid)
+        )
+    """)
+    op.execute("""
+        INSERT INTO operations (uuid, status, operation_type, room_type_id, check_in, check_out, quantity, created_at, updated_at)
+        SELECT uuid, status, operation_type, room_type_id, check_in, check_out, quantity, created_at, updated_at
+        FROM operations_partitioned
+    """)
+    op.execute("DROP TABLE operations_partitioned")
+
+    op.execute("ALTER TABLE inventory_daily RENAME TO inventory_daily_partitioned")
+    op.execute("ALTER INDEX inventory_daily_pkey RENAME TO inventory_daily_partitioned_pkey")
+    op.execute("ALTER INDEX ix_inventory_daily_room_type_id_date RENAME TO ix_inventory_daily_partitioned_room_type_id_date")
+    op.execute("""
+        CREATE TABLE inventory_daily (
+            id integer NOT NULL DEFAULT nextval('inventory_daily_id_seq'),
+            room_type_id varchar REFERENCES room_types (room_type_id),
+            date date NOT NULL,
+            reserved_quantity integer NOT NULL,
+            updated_at timestamptz NOT NULL DEFAULT now(),
+            CONSTRAINT inventory_daily_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.create_index(
+        'ix_inventory_daily_room_type_id_date', 'inventory_daily', ['room_type_id', 'date'],
+        unique=True, postgresql_include=['reserved_quantity'],
+    )
+    op.execute("INSERT INTO inventory_daily SELECT id, room_type_id, date, reserved_quantity, updated_at FROM inventory_daily_partitioned")
+    op.execute("ALTER SEQUENCE inventory_daily_id_seq OWNED BY inventory_daily.id")
+    op.execute("DROP TABLE inventory_daily_partitioned")
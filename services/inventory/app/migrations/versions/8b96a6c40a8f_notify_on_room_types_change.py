@@ -0,0 +1,45 @@
+"""Notify on room_types change
+
+Revision ID: 8b96a6c40a8f
+Revises: e664ae8b70f2
+Create Date: 2026-10-18 15:21:07.640219
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b96a6c40a8f'
+down_revision: Union[str, Sequence[str], None] = 'e664ae8b70f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+NOTIFY_ROOM_TYPES_CHANGED = """
+CREATE OR REPLACE FUNCTION notify_room_types_changed() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('room_types_changed', '');
+    RETURN NULL;
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(NOTIFY_ROOM_TYPES_CHANGED)
+    op.execute(
+        "CREATE TRIGGER room_types_changed "
+        "AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON room_types "
+        "FOR EACH STATEMENT EXECUTE FUNCTION notify_room_types_changed()"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS room_types_changed ON room_types")
+    op.execute("DROP FUNCTION IF EXISTS notify_room_types_changed()")
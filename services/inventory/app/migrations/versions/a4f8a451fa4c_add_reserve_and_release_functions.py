@@ -0,0 +1,147 @@
+"""Add reserve and release functions
+
+Revision ID: a4f8a451fa4c
+Revises: 886264e452fe
+Create Date: 2026-10-18 10:12:41.305118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4f8a451fa4c'
+down_revision: Union[str, Sequence[str], None] = '886264e452fe'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Return codes: SUCCESS, COMPLETED (idempotent replay), FAILED, NOT_FOUND (unknown room type).
+INVENTORY_RESERVE = """
+CREATE OR REPLACE FUNCTION inventory_reserve(
+    p_uuid uuid, p_room_type_id varchar, p_check_in date, p_check_out date
+) RETURNS text
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_status text;
+    v_total integer;
+    v_max_reserved integer;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtextextended(p_uuid::text, 0));
+
+    SELECT status INTO v_status FROM operations WHERE uuid = p_uuid;
+    IF v_status = 'SUCCESS' THEN
+        RETURN 'COMPLETED';
+    END IF;
+
+    SELECT total_quantity INTO v_total FROM room_types WHERE room_type_id = p_room_type_id;
+    IF v_total IS NULL THEN
+        RETURN 'NOT_FOUND';
+    END IF;
+
+    INSERT INTO inventory_daily (room_type_id, date, reserved_quantity)
+    SELECT p_room_type_id, d::date, 0
+    FROM generate_series(p_check_in, p_check_out - 1, interval '1 day') AS d
+    ON CONFLICT (room_type_id, date) DO NOTHING;
+
+    SELECT coalesce(max(reserved_quantity), 0) INTO v_max_reserved
+    FROM (
+        SELECT reserved_quantity FROM inventory_daily
+        WHERE room_type_id = p_room_type_id AND date >= p_check_in AND date < p_check_out
+        ORDER BY date
+        FOR UPDATE
+    ) AS locked;
+
+    IF v_total - v_max_reserved > 0 THEN
+        UPDATE inventory_daily
+        SET reserved_quantity = reserved_quantity + 1, updated_at = now()
+        WHERE room_type_id = p_room_type_id AND date >= p_check_in AND date < p_check_out;
+
+        IF v_status IS NULL THEN
+            INSERT INTO operations (uuid, status, operation_type, room_type_id, check_in, check_out)
+            VALUES (p_uuid, 'SUCCESS', 'RESERVE', p_room_type_id, p_check_in, p_check_out);
+        ELSE
+            UPDATE operations SET status = 'SUCCESS', updated_at = now() WHERE uuid = p_uuid;
+        END IF;
+
+        PERFORM pg_notify(
+            'inventory_changed',
+            p_room_type_id || '|' || to_char(p_check_in, 'YYYY-MM-DD') || '|' || to_char(p_check_out, 'YYYY-MM-DD')
+        );
+        RETURN 'SUCCESS';
+    END IF;
+
+    IF v_status IS NULL THEN
+        INSERT INTO operations (uuid, status, operation_type, room_type_id, check_in, check_out)
+        VALUES (p_uuid, 'FAILED', 'RESERVE', p_room_type_id, p_check_in, p_check_out);
+    END IF;
+    RETURN 'FAILED';
+END;
+$$;
+"""
+
+INVENTORY_RELEASE = """
+CREATE OR REPLACE FUNCTION inventory_release(
+    p_uuid uuid, p_room_type_id varchar, p_check_in date, p_check_out date
+) RETURNS text
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_status text;
+    v_min_reserved integer;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtextextended(p_uuid::text, 0));
+
+    SELECT status INTO v_status FROM operations WHERE uuid = p_uuid;
+    IF v_status = 'SUCCESS' THEN
+        RETURN 'COMPLETED';
+    END IF;
+
+    SELECT coalesce(min(reserved_quantity), 0) INTO v_min_reserved
+    FROM (
+        SELECT reserved_quantity FROM inventory_daily
+        WHERE room_type_id = p_room_type_id AND date >= p_check_in AND date < p_check_out
+        ORDER BY date
+        FOR UPDATE
+    ) AS locked;
+
+    IF v_min_reserved > 0 THEN
+        UPDATE inventory_daily
+        SET reserved_quantity = reserved_quantity - 1, updated_at = now()
+        WHERE room_type_id = p_room_type_id AND date >= p_check_in AND date < p_check_out;
+
+        IF v_status IS NULL THEN
+            INSERT INTO operations (uuid, status, operation_type, room_type_id, check_in, check_out)
+            VALUES (p_uuid, 'SUCCESS', 'RELEASE', p_room_type_id, p_check_in, p_check_out);
+        ELSE
+            UPDATE operations SET status = 'SUCCESS', updated_at = now() WHERE uuid = p_uuid;
+        END IF;
+
+        PERFORM pg_notify(
+            'inventory_changed',
+            p_room_type_id || '|' || to_char(p_check_in, 'YYYY-MM-DD') || '|' || to_char(p_check_out, 'YYYY-MM-DD')
+        );
+        RETURN 'SUCCESS';
+    END IF;
+
+    IF v_status IS NULL THEN
+        INSERT INTO operations (uuid, status, operation_type, room_type_id, check_in, check_out)
+        VALUES (p_uuid, 'FAILED', 'RELEASE', p_room_type_id, p_check_in, p_check_out);
+    END IF;
+    RETURN 'FAILED';
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(INVENTORY_RESERVE)
+    op.execute(INVENTORY_RELEASE)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP FUNCTION IF EXISTS inventory_release(uuid, varchar, date, date)")
+    op.execute("DROP FUNCTION IF EXISTS inventory_reserve(uuid, varchar, date, date)")
@@ -0,0 +1,243 @@
+"""Add operations_uuid idempotency keys
+
+Revision ID: b3e81f6c0d47
+Revises: 5d1c7b3e9a20
+Create Date: 2026-10-18 22:17:05.513284
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrations.versions.c0a6a6ad8fa5_add_quantity_to_operations import INVENTORY_RELEASE as INVENTORY_RELEASE_V2
+from app.migrations.versions.e664ae8b70f2_reserve_function_locks_calendar_rows_first import (
+    INVENTORY_RESERVE as INVENTORY_RESERVE_V3,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e81f6c0d47'
+down_revision: Union[str, Sequence[str], None] = '5d1c7b3e9a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# The partitioned operations table cannot keep uuid unique, so every inserted
+# operation also claims its uuid here. The key stays when its partition is
+# retired (DETACH and DROP fire no triggers), which is how a retry of an
+# expired operation is told apart from a new one.
+CLAIM_OPERATION_UUID = """
+CREATE OR REPLACE FUNCTION claim_operation_uuid() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO operations_uuid (uuid, created_at) VALUES (NEW.uuid, NEW.created_at);
+    RETURN NULL;
+END;
+$$;
+"""
+
+# The key records where the row lives; moving it would leave the key behind.
+KEEP_OPERATION_KEY = """
+CREATE OR REPLACE FUNCTION keep_operation_key() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    RAISE EXCEPTION 'operations.uuid and operations.created_at cannot be changed';
+END;
+$$;
+"""
+
+INVENTORY_RESERVE = """
+CREATE OR REPLACE FUNCTION inventory_reserve(
+    p_uuid uuid, p_room_type_id varchar, p_check_in date, p_check_out date, p_quantity integer,
+    OUT outcome text, OUT op_quantity integer
+)
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_status text;
+    v_created_at timestamptz;
+    v_total integer;
+    v_max_reserved integer;
+    v_nights integer;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtextextended(p_uuid::text, 0));
+
+    -- The key names the partition of the operation row; a key without a row
+    -- belongs to a retired partition and its outcome is no longer known.
+    SELECT created_at INTO v_created_at FROM operations_uuid WHERE uuid = p_uuid;
+    IF FOUND THEN
+        SELECT status, quantity INTO v_status, op_quantity
+        FROM operations WHERE uuid = p_uuid AND created_at = v_created_at;
+        IF NOT FOUND THEN
+            outcome := 'EXPIRED';
+            RETURN;
+        END IF;
+    END IF;
+    IF v_status = 'SUCCESS' THEN
+        outcome := 'COMPLETED';
+        RETURN;
+    END IF;
+    op_quantity := p_quantity;
+
+    SELECT total_quantity INTO v_total FROM room_types WHERE room_type_id = p_room_type_id;
+    IF v_total IS NULL THEN
+        outcome := 'NOT_FOUND';
+        RETURN;
+    END IF;
+
+    -- Calendar rows are normally pre-created by the materializer: lock first and
+    -- only upsert when some nights of the range are missing.
+    SELECT count(*), coalesce(max(reserved_quantity), 0) INTO v_nights, v_max_reserved
+    FROM (
+        SELECT reserved_quantity FROM inventory_daily
+        WHERE room_type_id = p_room_type_id AND date >= p_check_in AND date < p_check_out
+        ORDER BY date
+        FOR UPDATE
+    ) AS locked;
+
+    IF v_nights < p_check_out - p_check_in THEN
+        INSERT INTO inventory_daily (room_type_id, date, reserved_quantity)
+        SELECT p_room_type_id, d::date, 0
+        FROM generate_series(p_check_in, p_check_out - 1, interval '1 day') AS d
+        ON CONFLICT (room_type_id, date) DO NOTHING;
+
+        SELECT coalesce(max(reserved_quantity), 0) INTO v_max_reserved
+        FROM (
+            SELECT reserved_quantity FROM inventory_daily
+            WHERE room_type_id = p_room_type_id AND date >= p_check_in AND date < p_check_out
+            ORDER BY date
+            FOR UPDATE
+        ) AS locked;
+    END IF;
+
+    IF v_total - v_max_reserved >= p_quantity THEN
+        UPDATE inventory_daily
+        SET reserved_quantity = reserved_quantity + p_quantity, updated_at = now()
+        WHERE room_type_id = p_room_type_id AND date >= p_check_in AND date < p_check_out;
+
+        IF v_status IS NULL THEN
+            INSERT INTO operations (uuid, status, operation_type, room_type_id, check_in, check_out, quantity)
+            VALUES (p_uuid, 'SUCCESS', 'RESERVE', p_room_type_id, p_check_in, p_check_out, p_quantity);
+        ELSE
+            UPDATE operations SET status = 'SUCCESS', quantity = p_quantity, updated_at = now()
+            WHERE uuid = p_uuid AND created_at = v_created_at;
+        END IF;
+
+        PERFORM pg_notify(
+            'inventory_changed',
+            p_room_type_id || '|' || to_char(p_check_in, 'YYYY-MM-DD') || '|' || to_char(p_check_out, 'YYYY-MM-DD')
+        );
+        outcome := 'SUCCESS';
+        RETURN;
+    END IF;
+
+    IF v_status IS NULL THEN
+        INSERT INTO operations (uuid, status, operation_type, room_type_id, check_in, check_out, quantity)
+        VALUES (p_uuid, 'FAILED', 'RESERVE', p_room_type_id, p_check_in, p_check_out, p_quantity);
+    END IF;
+    outcome := 'FAILED';
+END;
+$$;
+"""
+
+INVENTORY_RELEASE = """
+CREATE OR REPLACE FUNCTION inventory_release(
+    p_uuid uuid, p_room_type_id varchar, p_check_in date, p_check_out date, p_quantity integer,
+    OUT outcome text, OUT op_quantity integer
+)
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_status text;
+    v_created_at timestamptz;
+    v_min_reserved integer;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtextextended(p_uuid::text, 0));
+
+    SELECT created_at INTO v_created_at FROM operations_uuid WHERE uuid = p_uuid;
+    IF FOUND THEN
+        SELECT status, quantity INTO v_status, op_quantity
+        FROM operations WHERE uuid = p_uuid AND created_at = v_created_at;
+        IF NOT FOUND THEN
+            outcome := 'EXPIRED';
+            RETURN;
+        END IF;
+    END IF;
+    IF v_status = 'SUCCESS' THEN
+        outcome := 'COMPLETED';
+        RETURN;
+    END IF;
+    op_quantity := p_quantity;
+
+    SELECT coalesce(min(reserved_quantity), 0) INTO v_min_reserved
+    FROM (
+        SELECT reserved_quantity FROM inventory_daily
+        WHERE room_type_id = p_room_type_id AND date >= p_check_in AND date < p_check_out
+        ORDER BY date
+        FOR UPDATE
+    ) AS locked;
+
+    IF v_min_reserved >= p_quantity THEN
+        UPDATE inventory_daily
+        SET reserved_quantity = reserved_quantity - p_quantity, updated_at = now()
+        WHERE room_type_id = p_room_type_id AND date >= p_check_in AND date < p_check_out;
+
+        IF v_status IS NULL THEN
+            INSERT INTO operations (uuid, status, operation_type, room_type_id, check_in, check_out, quantity)
+            VALUES (p_uuid, 'SUCCESS', 'RELEASE', p_room_type_id, p_check_in, p_check_out, p_quantity);
+        ELSE
+            UPDATE operations SET status = 'SUCCESS', quantity = p_quantity, updated_at = now()
+            WHERE uuid = p_uuid AND created_at = v_created_at;
+        END IF;
+
+        PERFORM pg_notify(
+            'inventory_changed',
+            p_room_type_id || '|' || to_char(p_check_in, 'YYYY-MM-DD') || '|' || to_char(p_check_out, 'YYYY-MM-DD')
+        );
+        outcome := 'SUCCESS';
+        RETURN;
+    END IF;
+
+    IF v_status IS NULL THEN
+        INSERT INTO operations (uuid, status, operation_type, room_type_id, check_in, check_out, quantity)
+        VALUES (p_uuid, 'FAILED', 'RELEASE', p_room_type_id, p_check_in, p_check_out, p_quantity);
+    END IF;
+    outcome := 'FAILED';
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('operations_uuid',
+        sa.Column('uuid', sa.UUID(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('uuid')
+    )
+    # Writers hold the per-uuid advisory lock, so existing rows have one
+    # operation per uuid; min() only picks a row should that ever be wrong.
+    op.execute("INSERT INTO operations_uuid (uuid, created_at) SELECT uuid, min(created_at) FROM operations GROUP BY uuid")
+    op.execute(CLAIM_OPERATION_UUID)
+    op.execute(KEEP_OPERATION_KEY)
+    op.execute(
+        "CREATE TRIGGER operations_claim_uuid AFTER INSERT ON operations "
+        "FOR EACH ROW EXECUTE FUNCTION claim_operation_uuid()"
+    )
+    op.execute(
+        "CREATE TRIGGER operations_keep_key BEFORE UPDATE OF uuid, created_at ON operations "
+        "FOR EACH ROW WHEN (OLD.uuid IS DISTINCT FROM NEW.uuid OR OLD.created_at IS DISTINCT FROM NEW.created_at) "
+        "EXECUTE FUNCTION keep_operation_key()"
+    )
+    op.execute(INVENTORY_RESERVE)
+    op.execute(INVENTORY_RELEASE)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(INVENTORY_RELEASE_V2)
+    op.execute(INVENTORY_RESERVE_V3)
+    op.execute("DROP TRIGGER IF EXISTS operations_keep_key ON operations")
+    op.execute("DROP TRIGGER IF EXISTS operations_claim_uuid ON operations")
+    op.execute("DROP FUNCTION IF EXISTS keep_operation_key()")
+    op.execute("DROP FUNCTION IF EXISTS claim_operation_uuid()")
+    op.drop_table('operations_uuid')
@@ -0,0 +1,166 @@
+"""Add quantity to operations
+
+Revision ID: c0a6a6ad8fa5
+Revises: a4f8a451fa4c
+Create Date: 2026-10-18 11:40:03.871954
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrations.versions.a4f8a451fa4c_add_reserve_and_release_functions import INVENTORY_RESERVE as INVENTORY_RESERVE_V1, \
+    INVENTORY_RELEASE as INVENTORY_RELEASE_V1
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c0a6a6ad8fa5'
+down_revision: Union[str, Sequence[str], None] = 'a4f8a451fa4c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# outcome: SUCCESS, COMPLETED (idempotent replay), FAILED, NOT_FOUND (unknown room type).
+# op_quantity: quantity recorded for the operation (the original one on replay).
+INVENTORY_RESERVE = """
+CREATE OR REPLACE FUNCTION inventory_reserve(
+    p_uuid uuid, p_room_type_id varchar, p_check_in date, p_check_out date, p_quantity integer,
+    OUT outcome text, OUT op_quantity integer
+)
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_status text;
+    v_total integer;
+    v_max_reserved integer;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtextextended(p_uuid::text, 0));
+
+    SELECT status, quantity INTO v_status, op_quantity FROM operations WHERE uuid = p_uuid;
+    IF v_status = 'SUCCESS' THEN
+        outcome := 'COMPLETED';
+        RETURN;
+    END IF;
+    op_quantity := p_quantity;
+
+    SELECT total_quantity INTO v_total FROM room_types WHERE room_type_id = p_room_type_id;
+    IF v_total IS NULL THEN
+        outcome := 'NOT_FOUND';
+        RETURN;
+    END IF;
+
+    INSERT INTO inventory_daily (room_type_id, date, reserved_quantity)
+    SELECT p_room_type_id, d::date, 0
+    FROM generate_series(p_check_in, p_check_out - 1, interval '1 day') AS d
+    ON CONFLICT (room_type_id, date) DO NOTHING;
+
+    SELECT coalesce(max(reserved_quantity), 0) INTO v_max_reserved
+    FROM (
+        SELECT reserved_quantity FROM inventory_daily
+        WHERE room_type_id = p_room_type_id AND date >= p_check_in AND date < p_check_out
+        ORDER BY date
+        FOR UPDATE
+    ) AS locked;
+
+    IF v_total - v_max_reserved >= p_quantity THEN
+        UPDATE inventory_daily
+        SET reserved_quantity = reserved_quantity + p_quantity, updated_at = now()
+        WHERE room_type_id = p_room_type_id AND date >= p_check_in AND date < p_check_out;
+
+        IF v_status IS NULL THEN
+            INSERT INTO operations (uuid, status, operation_type, room_type_id, check_in, check_out, quantity)
+            VALUES (p_uuid, 'SUCCESS', 'RESERVE', p_room_type_id, p_check_in, p_check_out, p_quantity);
+        ELSE
+            UPDATE operations SET status = 'SUCCESS', quantity = p_quantity, updated_at = now() WHERE uuid = p_uuid;
+        END IF;
+
+        PERFORM pg_notify(
+            'inventory_changed',
+            p_room_type_id || '|' || to_char(p_check_in, 'YYYY-MM-DD') || '|' || to_char(p_check_out, 'YYYY-MM-DD')
+        );
+        outcome := 'SUCCESS';
+        RETURN;
+    END IF;
+
+    IF v_status IS NULL THEN
+        INSERT INTO operations (uuid, status, operation_type, room_type_id, check_in, check_out, quantity)
+        VALUES (p_uuid, 'FAILED', 'RESERVE', p_room_type_id, p_check_in, p_check_out, p_quantity);
+    END IF;
+    outcome := 'FAILED';
+END;
+$$;
+"""
+
+INVENTORY_RELEASE = """
+CREATE OR REPLACE FUNCTION inventory_release(
+    p_uuid uuid, p_room_type_id varchar, p_check_in date, p_check_out date, p_quantity integer,
+    OUT outcome text, OUT op_quantity integer
+)
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_status text;
+    v_min_reserved integer;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtextextended(p_uuid::text, 0));
+
+    SELECT status, quantity INTO v_status, op_quantity FROM operations WHERE uuid = p_uuid;
+    IF v_status = 'SUCCESS' THEN
+        outcome := 'COMPLETED';
+        RETURN;
+    END IF;
+    op_quantity := p_quantity;
+
+    SELECT coalesce(min(reserved_quantity), 0) INTO v_min_reserved
+    FROM (
+        SELECT reserved_quantity FROM inventory_daily
+        WHERE room_type_id = p_room_type_id AND date >= p_check_in AND date < p_check_out
+        ORDER BY date
+        FOR UPDATE
+    ) AS locked;
+
+    IF v_min_reserved >= p_quantity THEN
+        UPDATE inventory_daily
+        SET reserved_quantity = reserved_quantity - p_quantity, updated_at = now()
+        WHERE room_type_id = p_room_type_id AND date >= p_check_in AND date < p_check_out;
+
+        IF v_status IS NULL THEN
+            INSERT INTO operations (uuid, status, operation_type, room_type_id, check_in, check_out, quantity)
+            VALUES (p_uuid, 'SUCCESS', 'RELEASE', p_room_type_id, p_check_in, p_check_out, p_quantity);
+        ELSE
+            UPDATE operations SET status = 'SUCCESS', quantity = p_quantity, updated_at = now() WHERE uuid = p_uuid;
+        END IF;
+
+        PERFORM pg_notify(
+            'inventory_changed',
+            p_room_type_id || '|' || to_char(p_check_in, 'YYYY-MM-DD') || '|' || to_char(p_check_out, 'YYYY-MM-DD')
+        );
+        outcome := 'SUCCESS';
+        RETURN;
+    END IF;
+
+    IF v_status IS NULL THEN
+        INSERT INTO operations (uuid, status, operation_type, room_type_id, check_in, check_out, quantity)
+        VALUES (p_uuid, 'FAILED', 'RELEASE', p_room_type_id, p_check_in, p_check_out, p_quantity);
+    END IF;
+    outcome := 'FAILED';
+END;
+$$;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('operations', sa.Column('quantity', sa.Integer(), server_default='1', nullable=False))
+    op.execute("DROP FUNCTION IF EXISTS inventory_release(uuid, varchar, date, date)")
+    op.execute("DROP FUNCTION IF EXISTS inventory_reserve(uuid, varchar, date, date)")
+    op.execute(INVENTORY_RESERVE)
+    op.execute(INVENTORY_RELEASE)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP FUNCTION IF EXISTS inventory_release(uuid, varchar, date, date, integer)")
+    op.execute("DROP FUNCTION IF EXISTS inventory_reserve(uuid, varchar, date, date, integer)")
+    op.execute(INVENTORY_RESERVE_V1)
+    op.execute(INVENTORY_RELEASE_V1)
+    op.drop_column('operations', 'quantity')
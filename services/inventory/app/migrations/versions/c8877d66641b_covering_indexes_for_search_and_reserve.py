@@ -0,0 +1,48 @@
+"""Covering indexes for search and reserve
+
+Revision ID: c8877d66641b
+Revises: 8b96a6c40a8f
+Create Date: 2026-10-18 16:02:44.915307
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8877d66641b'
+down_revision: Union[str, Sequence[str], None] = '8b96a6c40a8f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Same key as unique_room_type_id (still the ON CONFLICT arbiter), plus
+    # reserved_quantity so range scans for search and reserve are index-only.
+    op.create_index(
+        'ix_inventory_daily_room_type_id_date', 'inventory_daily', ['room_type_id', 'date'],
+        unique=True, postgresql_include=['reserved_quantity'],
+    )
+    op.drop_constraint('unique_room_type_id', 'inventory_daily', type_='unique')
+
+    op.create_index('ix_room_types_name', 'room_types', ['name'])
+    op.create_index('ix_room_types_capacity_adults', 'room_types', ['capacity_adults'])
+    op.create_index('ix_room_types_price', 'room_types', ['price'])
+
+    # operations lost its primary key when operation_id was replaced by uuid.
+    op.create_primary_key('operations_pkey', 'operations', ['uuid'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('operations_pkey', 'operations', type_='primary')
+
+    op.drop_index('ix_room_types_price', table_name='room_types')
+    op.drop_index('ix_room_types_capacity_adults', table_name='room_types')
+    op.drop_index('ix_room_types_name', table_name='room_types')
+
+    op.create_unique_constraint('unique_room_type_id', 'inventory_daily', ['room_type_id', 'date'])
+    op.drop_index('ix_inventory_daily_room_type_id_date', table_name='inventory_daily')
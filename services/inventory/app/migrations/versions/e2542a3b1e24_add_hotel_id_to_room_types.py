@@ -0,0 +1,31 @@
+"""Add hotel_id to room_types
+
+Revision ID: e2542a3b1e24
+Revises: 7e324fe0d89c
+Create Date: 2026-10-18 18:35:12.640271
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2542a3b1e24'
+down_revision: Union[str, Sequence[str], None] = '7e324fe0d89c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing room types belong to the single hotel the service served so far.
+    op.add_column('room_types', sa.Column('hotel_id', sa.String(), server_default='default', nullable=False))
+    op.create_index('ix_room_types_hotel_id', 'room_types', ['hotel_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_room_types_hotel_id', table_name='room_types')
+    op.drop_column('room_types', 'hotel_id')
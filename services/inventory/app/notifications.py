@@ -0,0 +1,117 @@
+import asyncio
+from datetime import date
+from typing import Callable
+
+import asyncpg
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+
+from app.config import settings
+
+
+INVENTORY_CHANNEL = "inventory_changed"
+ROOM_TYPES_CHANNEL = "room_types_changed"
+
+SESSION_CHANGES_KEY = "inventory_changes"
+
+
+def inventory_payload(room_type_id: str, check_in: date, check_out: date) -> str:
+    return f"{room_type_id}|{check_in.isoformat()}|{check_out.isoformat()}"
+
+
+def parse_inventory_payload(payload: str) -> tuple[str, date, date]:
+    room_type_id, check_in, check_out = payload.rsplit("|", 2)
+    return room_type_id, date.fromisoformat(check_in), date.fromisoformat(check_out)
+
+
+def record_inventory_change(session, room_type_id: str, check_in: date, check_out: date):
+    # Kept on the session so that the writer can hand the change to its own
+    # subscribers right after commit (ChangeListener.publish_committed).
+    session.info.setdefault(SESSION_CHANGES_KEY, []).append(inventory_payload(room_type_id, check_in, check_out))
+
+
+async def notify_inventory_changed(session, room_type_id: str, check_in: date, check_out: date):
+    # Delivered by Postgres only when the surrounding transaction commits.
+    record_inventory_change(session, room_type_id, check_in, check_out)
+    await session.execute(
+        select(func.pg_notify(INVENTORY_CHANNEL, inventory_payload(room_type_id, check_in, check_out)))
+    )
+
+
+class ChangeListener:
+    """Dedicated LISTEN connections fanning NOTIFY payloads out to in-process subscribers.
+
+    One connection per shard. A subscriber receives ``None`` instead of a
+    payload when a connection is lost and again when it is (re)established,
+    because notifications sent while it was down are lost; ``connected`` is
+    true only while every shard is being listened to.
+    """
+
+    def __init__(self, heartbeat_seconds: float = 5.0, reconnect_seconds: float = 2.0):
+        self.heartbeat_seconds = heartbeat_seconds
+        self.reconnect_seconds = reconnect_seconds
+        self._connected: set[str] = set()
+        self._subscribers: dict[str, list[Callable[[str | None], None]]] = {}
+
+    @property
+    def connected(self) -> bool:
+        return len(self._connected) == len(settings.SHARD_DATABASE_URLS)
+
+    def subscribe(self, channel: str, callback: Callable[[str | None], None]):
+        self._subscribers.setdefault(channel, []).append(callback)
+
+    def publish(self, channel: str, payload: str = ""):
+        """Deliver a change this process has just committed to its subscribers.
+
+        The NOTIFY only comes back after a round trip through Postgres, and
+        until then this worker's own caches would still serve the old rows.
+        The echo is applied once more when it arrives.
+        """
+        for callback in self._subscribers.get(channel, []):
+            callback(payload)
+
+    def publish_committed(self, session):
+        for payload in session.info.pop(SESSION_CHANGES_KEY, []):
+            self.publish(INVENTORY_CHANNEL, payload)
+
+    def _reset(self):
+        for callbacks in self._subscribers.values():
+            for callback in callbacks:
+                callback(None)
+
+    def _dispatch(self, connection, pid, channel, payload):
+        self.publish(channel, payload)
+
+    async def _listen(self, shard: str, url: str):
+        dsn = make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                for channel in self._subscribers:
+                    await connection.add_listener(channel, self._dispatch)
+                self._connected.add(shard)
+                self._reset()
+                while True:
+                    await asyncio.sleep(self.heartbeat_seconds)
+                    await connection.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"[change_listener] {shard} error: {exc}")
+            finally:
+                lost = shard in self._connected
+                self._connected.discard(shard)
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            # Once per lost connection, not per failed reconnect attempt;
+            # subscribers reload on the reset sent when it is back.
+            if lost:
+                self._reset()
+            await asyncio.sleep(self.reconnect_seconds)
+
+    async def run(self):
+        await asyncio.gather(*(self._listen(shard, url) for shard, url in settings.SHARD_DATABASE_URLS.items()))
+
+
+change_listener = ChangeListener()
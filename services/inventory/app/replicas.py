@@ -0,0 +1,129 @@
+import asyncio
+import itertools
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.database import engine
+from app.metrics import metrics
+
+
+replica_lag_seconds = metrics.gauge("replica_lag_seconds", "Replay lag last measured on each replica.")
+replica_healthy = metrics.gauge(
+    "replica_healthy", "1 if the replica is reachable, streaming WAL and within REPLICA_MAX_LAG_SECONDS."
+)
+replica_fallbacks = metrics.counter("replica_fallbacks_total", "Replica reads retried on the primary after an error.")
+
+
+# Lag is measured against the primary: a replica whose replay position has
+# reached the primary's WAL position sampled just before is not lagging;
+# otherwise its lag is the age of the last replayed transaction. A replica
+# whose WAL receiver is not streaming (disconnected or stalled) has replayed
+# everything it received and would look fresh forever, so it gets no reads.
+# Reading pg_stat_wal_receiver.status needs pg_monitor (or
+# pg_read_all_stats) for the replica user. A server that is not in recovery
+# is not lagging at all.
+PRIMARY_LSN_QUERY = text("SELECT pg_current_wal_lsn()::text")
+REPLICA_STATE_QUERY = text("""
+    SELECT
+        pg_is_in_recovery() AS in_recovery,
+        coalesce((SELECT status = 'streaming' FROM pg_stat_wal_receiver), false) AS streaming,
+        coalesce(pg_last_wal_replay_lsn() >= CAST(CAST(:primary_lsn AS text) AS pg_lsn), false) AS caught_up,
+        extract(epoch FROM now() - pg_last_xact_replay_timestamp()) AS replay_age
+""")
+
+
+class Replica:
+    def __init__(self, url: str):
+        url = make_url(url)
+        self.name = f"{url.host}:{url.port or 5432}"
+        self.engine = create_async_engine(url, pool_pre_ping=True)
+        self.session_maker = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.healthy = False
+
+
+class ReplicaPool:
+    """Read-only replicas that ``RoomDAO`` read paths may use instead of the primary.
+
+    ``run`` polls every replica's replay lag; only replicas that answered the
+    last check within ``max_lag_seconds`` are handed out by ``pick``, round
+    robin. A replica that fails a query is taken out until the next
+    successful check. With no healthy replica ``pick`` returns None and the
+    caller reads from the primary.
+    """
+
+    def __init__(self, urls: list[str], max_lag_seconds: float, check_interval_seconds: float):
+        self.replicas = [Replica(url) for url in urls]
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval_seconds = check_interval_seconds
+        self._round_robin = itertools.count()
+
+    def pick(self) -> Replica | None:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._round_robin) % len(healthy)]
+
+    def mark_down(self, replica: Replica, exc: Exception):
+        print(f"[replica_pool] {replica.name} failed, reading from the primary: {exc}")
+        replica.healthy = False
+        replica_healthy.set(0, replica=replica.name)
+        replica_fallbacks.inc(replica=replica.name)
+
+    async def _lag(self, replica: Replica, primary_lsn: str) -> float:
+        async with replica.engine.connect() as conn:
+            state = (await conn.execute(REPLICA_STATE_QUERY, {"primary_lsn": primary_lsn})).one()
+        if not state.in_recovery or state.caught_up:
+            return 0.0
+        if not state.streaming:
+            raise RuntimeError("WAL receiver is not streaming")
+        if state.replay_age is None:
+            raise RuntimeError("nothing replayed yet")
+        return float(state.replay_age)
+
+    async def check(self):
+        timeout = max(self.check_interval_seconds, 1.0)
+        try:
+            async with engine.connect() as conn:
+                primary_lsn = await asyncio.wait_for(conn.scalar(PRIMARY_LSN_QUERY), timeout=timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            # Without the primary's position the staleness bound cannot be checked.
+            primary_lsn, primary_error = None, exc
+
+        for replica in self.replicas:
+            try:
+                if primary_lsn is None:
+                    raise RuntimeError(f"primary WAL position unavailable: {primary_error}")
+                lag = await asyncio.wait_for(self._lag(replica, primary_lsn), timeout=timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                if replica.healthy:
+                    print(f"[replica_pool] {replica.name} taken out: {exc}")
+                replica.healthy = False
+            else:
+                replica_lag_seconds.set(lag, replica=replica.name)
+                replica.healthy = lag <= self.max_lag_seconds
+            replica_healthy.set(int(replica.healthy), replica=replica.name)
+
+    async def run(self):
+        while True:
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"[replica_pool] error: {exc}")
+            await asyncio.sleep(self.check_interval_seconds)
+
+
+replica_pool = ReplicaPool(
+    settings.REPLICA_DATABASE_URLS,
+    settings.REPLICA_MAX_LAG_SECONDS,
+    settings.REPLICA_CHECK_INTERVAL_SECONDS,
+)
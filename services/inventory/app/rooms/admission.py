@@ -0,0 +1,124 @@
+import asyncio
+import math
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Iterable
+
+from app.config import settings
+from app.exceptions import OperationOverloadedException
+from app.metrics import metrics
+
+
+admission_queue_depth = metrics.gauge("admission_queue_depth", "Write requests waiting for a slot, per room type.")
+admission_admitted = metrics.counter("admission_admitted_total", "Write requests admitted, per room type.")
+admission_shed = metrics.counter("admission_shed_total", "Write requests rejected with 429, per room type and reason.")
+
+
+class _Limiter:
+    def __init__(self, concurrency: int, service_seconds: float):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.service_seconds = service_seconds
+
+    def observe(self, seconds: float, alpha: float = 0.2):
+        self.service_seconds = alpha * seconds + (1 - alpha) * self.service_seconds
+
+
+class AdmissionController:
+    """Bounded per-room-type concurrency for reserve/release with fast shedding.
+
+    At most ``concurrency`` writes per room type run at once and at most
+    ``max_queue`` wait. A request is rejected up front when the queue is full
+    or the estimated wait (queued requests ahead times the EWMA of recent
+    service times, divided by ``concurrency``) exceeds ``max_wait_ms``, and
+    after ``max_wait_ms`` of waiting otherwise. A batch takes one slot per
+    distinct room type it touches, within a single ``max_wait_ms`` budget.
+    """
+
+    def __init__(self, concurrency: int, max_queue: int, max_wait_ms: int):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait_ms / 1000
+        self._limiters: dict[str, _Limiter] = {}
+
+    def _estimated_wait(self, limiter: _Limiter) -> float:
+        ahead = limiter.active + limiter.waiting - self.concurrency + 1
+        return max(ahead, 0) / self.concurrency * limiter.service_seconds
+
+    def _shed(self, key: str, reason: str, estimated_wait: float):
+        admission_shed.inc(room_type_id=key, reason=reason)
+        raise OperationOverloadedException(max(1, math.ceil(estimated_wait)))
+
+    @staticmethod
+    async def _acquire(semaphore: asyncio.Semaphore, timeout: float) -> bool:
+        # The permit is awaited in its own task so that a timeout or a
+        # cancellation landing just as it is granted cannot leave it taken:
+        # a granted permit is either returned to the caller or released here.
+        acquire = asyncio.ensure_future(semaphore.acquire())
+        acquired = False
+        try:
+            await asyncio.wait({acquire}, timeout=max(timeout, 0))
+            acquired = acquire.done() and not acquire.cancelled() and acquire.exception() is None
+            return acquired
+        finally:
+            if not acquired:
+                if not acquire.done():
+                    # Semaphore.acquire passes a permit granted during cancellation on to the next waiter.
+                    acquire.cancel()
+                elif not acquire.cancelled() and acquire.exception() is None:
+                    semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self, key: str, deadline: float | None = None):
+        if self.concurrency <= 0:
+            yield
+            return
+
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = self._limiters[key] = _Limiter(self.concurrency, self.max_wait / 10)
+
+        estimated_wait = self._estimated_wait(limiter)
+        if limiter.waiting >= self.max_queue:
+            self._shed(key, "queue", estimated_wait)
+        if estimated_wait > self.max_wait:
+            self._shed(key, "wait", estimated_wait)
+
+        if deadline is None:
+            deadline = time.monotonic() + self.max_wait
+        limiter.waiting += 1
+        admission_queue_depth.set(limiter.waiting, room_type_id=key)
+        try:
+            acquired = await self._acquire(limiter.semaphore, deadline - time.monotonic())
+        finally:
+            limiter.waiting -= 1
+            admission_queue_depth.set(limiter.waiting, room_type_id=key)
+        if not acquired:
+            self._shed(key, "timeout", self._estimated_wait(limiter))
+
+        admission_admitted.inc(room_type_id=key)
+        limiter.active += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            limiter.active -= 1
+            limiter.semaphore.release()
+            limiter.observe(time.monotonic() - started)
+
+    @asynccontextmanager
+    async def slots(self, keys: Iterable[str]):
+        """One slot per distinct key, taken in sorted order so that overlapping batches cannot deadlock."""
+        deadline = time.monotonic() + self.max_wait
+        async with AsyncExitStack() as stack:
+            for key in sorted(set(keys)):
+                await stack.enter_async_context(self.slot(key, deadline))
+            yield
+
+
+admission = AdmissionController(
+    settings.ADMISSION_CONCURRENCY,
+    settings.ADMISSION_MAX_QUEUE,
+    settings.ADMISSION_MAX_WAIT_MS,
+)
@@ -0,0 +1,194 @@
+import asyncio
+from array import array
+from collections import deque
+from datetime import date, timedelta
+
+from sqlalchemy import select, and_
+
+from app.config import settings
+from app.notifications import change_listener, parse_inventory_payload
+from app.rooms.ledger import daily_reserved
+from app.rooms.models import RoomTypes
+from app.rooms.schemas import SRoomsSearchParams
+from app.shards import shard_router
+
+
+def sliding_window_max(values, width: int) -> list[int]:
+    """Max of every ``width``-long window of ``values`` in one pass (monotonic deque)."""
+    result = []
+    window = deque()
+    for i, value in enumerate(values):
+        while window and values[window[-1]] <= value:
+            window.pop()
+        window.append(i)
+        if window[0] <= i - width:
+            window.popleft()
+        if i >= width - 1:
+            result.append(values[window[0]])
+    return result
+
+
+def matches_filters(room: dict, params: SRoomsSearchParams) -> bool:
+    """In-memory equivalent of ``RoomDAO._filter_room_types`` for one room type row."""
+    if params.hotel_id is not None and room["hotel_id"] != params.hotel_id:
+        return False
+    if params.room_type_id is not None and room["room_type_id"] != params.room_type_id:
+        return False
+    if params.name is not None and room["name"] != params.name:
+        return False
+    if params.adults is not None and room["capacity_adults"] < params.adults:
+        return False
+    if params.min_price is not None and not params.min_price <= room["price"] <= params.max_price:
+        return False
+    return True
+
+
+class AvailabilityIndex:
+    """Per-worker matrix of reserved_quantity by (room_type_id, day offset).
+
+    Rows are kept as ``array('l')`` so a date-range search is a C-level
+    ``max()`` over a slice instead of a GROUP BY in Postgres. The index is
+    refreshed from ``inventory_changed`` notifications; any room type with an
+    unapplied change is reported as stale and the caller falls back to SQL.
+    While the change listener is down the index serves nothing and does not
+    reload: the reset sent on reconnect triggers the next full load.
+    """
+
+    def __init__(self, horizon_days: int, reload_seconds: int):
+        self.horizon_days = horizon_days
+        self.reload_seconds = reload_seconds
+        self.base_date: date | None = None
+        self.room_types: dict[str, dict] = {}
+        self.reserved: dict[str, array] = {}
+        self.dirty: set[str] = set()
+        self._pending: set[str] = set()
+        self.ready = False
+        self._reload_all = True
+        self._wakeup = asyncio.Event()
+
+    def invalidate(self, payload: str | None):
+        if payload is None:
+            self.ready = False
+            self._reload_all = True
+        else:
+            room_type_id, _, _ = parse_inventory_payload(payload)
+            self.dirty.add(room_type_id)
+            self._pending.add(room_type_id)
+        self._wakeup.set()
+
+    def _offsets(self, check_in: date, check_out: date) -> tuple[int, int] | None:
+        if self.base_date is None:
+            return None
+        start = (check_in - self.base_date).days
+        end = (check_out - self.base_date).days
+        if start < 0 or end > self.horizon_days:
+            return None
+        return start, max(start, end)
+
+    def search(self, params: SRoomsSearchParams) -> list[dict] | None:
+        if not self.ready or not change_listener.connected:
+            return None
+        offsets = self._offsets(params.check_in, params.check_out)
+        if offsets is None:
+            return None
+        start, end = offsets
+
+        rooms = []
+        for room in self.room_types.values():
+            if not matches_filters(room, params):
+                continue
+            if room["room_type_id"] in self.dirty:
+                return None
+
+            available = room["total_quantity"] - max(self.reserved[room["room_type_id"]][start:end], default=0)
+            if available > 0:
+                rooms.append({**room, "available_quantity": available})
+        return rooms
+
+    async def _load(self, room_type_ids: set[str] | None = None):
+        base_date = date.today() if room_type_ids is None else self.base_date
+        horizon_end = base_date + timedelta(days=self.horizon_days)
+
+        daily = daily_reserved()
+        room_types_query = select(RoomTypes.__table__.columns)
+        daily_query = select(
+            daily.c.room_type_id,
+            daily.c.date,
+            daily.c.reserved_quantity,
+        ).where(
+            and_(
+                daily.c.date >= base_date,
+                daily.c.date < horizon_end,
+            )
+        )
+        if room_type_ids is not None:
+            room_types_query = room_types_query.where(RoomTypes.room_type_id.in_(room_type_ids))
+            daily_query = daily_query.where(daily.c.room_type_id.in_(room_type_ids))
+
+        async def load_shard(shard):
+            async with shard.session_maker() as session:
+                return (
+                    (await session.execute(room_types_query)).mappings().all(),
+                    (await session.execute(daily_query)).all(),
+                )
+
+        loaded = await shard_router.fan_out(None, load_shard)
+        room_types = [room for shard_rooms, _ in loaded for room in shard_rooms]
+        daily = [row for _, shard_daily in loaded for row in shard_daily]
+
+        reserved = {room["room_type_id"]: array("l", [0]) * self.horizon_days for room in room_types}
+        for room_type_id, day, reserved_quantity in daily:
+            reserved[room_type_id][(day - base_date).days] = reserved_quantity
+
+        if room_type_ids is None:
+            self.base_date = base_date
+            self.room_types = {room["room_type_id"]: dict(room) for room in room_types}
+            self.reserved = reserved
+        else:
+            for room_type_id in room_type_ids:
+                self.room_types.pop(room_type_id, None)
+                self.reserved.pop(room_type_id, None)
+            self.room_types.update({room["room_type_id"]: dict(room) for room in room_types})
+            self.reserved.update(reserved)
+
+    async def run(self):
+        while True:
+            try:
+                if (self._reload_all or self.base_date != date.today()) and not change_listener.connected:
+                    # A snapshot taken now would miss other workers' writes.
+                    self.ready = False
+                    self._reload_all = True
+                    self._pending.clear()
+                elif self._reload_all or self.base_date != date.today():
+                    self._reload_all = False
+                    self._pending.clear()
+                    await self._load()
+                    self.dirty = set(self._pending)
+                    # A reset during the load (listener lost or reconnected) asks for another one.
+                    self.ready = not self._reload_all and change_listener.connected
+                elif self._pending:
+                    room_type_ids, self._pending = self._pending, set()
+                    await self._load(room_type_ids)
+                    self.dirty -= room_type_ids - self._pending
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"[availability_index] error: {exc}")
+                self.ready = False
+                self._reload_all = True
+                await asyncio.sleep(5)
+                continue
+
+            self._wakeup.clear()
+            if self._pending or (self._reload_all and change_listener.connected):
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.reload_seconds)
+            except asyncio.TimeoutError:
+                self._reload_all = True
+
+
+availability_index = AvailabilityIndex(
+    settings.AVAILABILITY_INDEX_HORIZON_DAYS,
+    settings.AVAILABILITY_INDEX_RELOAD_SECONDS,
+)
@@ -0,0 +1,95 @@
+import asyncio
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+
+from app.config import settings
+from app.rooms.repository import RoomDAO
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    body: bytes
+    etag: str
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    rooms: list[dict]
+    all: CatalogEntry
+    by_id: dict[str, CatalogEntry]
+    hotels: dict[str, str]
+
+
+def _entry(rooms: list[dict]) -> CatalogEntry:
+    body = json.dumps(rooms, separators=(",", ":")).encode()
+    return CatalogEntry(body=body, etag=f'"{hashlib.sha256(body).hexdigest()}"')
+
+
+class RoomCatalog:
+    """Process-local cache of ``room_types`` with pre-serialized bodies and strong ETags.
+
+    Entries expire after ``ttl_seconds`` and are dropped on every
+    ``room_types_changed`` notification (or listener reconnect). A load that
+    races with an invalidation is served once but not kept.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._snapshot: _Snapshot | None = None
+        self._loaded_at = 0.0
+        self._version = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self, payload: str | None = None):
+        self._version += 1
+        self._snapshot = None
+
+    def _fresh(self) -> bool:
+        return self._snapshot is not None and time.monotonic() - self._loaded_at < self.ttl_seconds
+
+    async def _load(self) -> "_Snapshot":
+        if self._fresh():
+            return self._snapshot
+        async with self._lock:
+            if self._fresh():
+                return self._snapshot
+            version = self._version
+            rooms = [dict(room) for room in await RoomDAO.find_all(primary=True)]
+            snapshot = _Snapshot(
+                rooms=rooms,
+                all=_entry(rooms),
+                by_id={room["room_type_id"]: _entry([room]) for room in rooms},
+                hotels={room["room_type_id"]: room["hotel_id"] for room in rooms},
+            )
+            if version == self._version and self.ttl_seconds > 0:
+                self._snapshot = snapshot
+                self._loaded_at = time.monotonic()
+            return snapshot
+
+    async def room_types(self) -> list[dict]:
+        return (await self._load()).rooms
+
+    async def rooms(self) -> CatalogEntry:
+        return (await self._load()).all
+
+    async def room(self, room_type_id: str) -> CatalogEntry | None:
+        return (await self._load()).by_id.get(room_type_id)
+
+    async def hotels_of(self, room_type_ids: set[str]) -> dict[str, str]:
+        """room_type_id -> hotel_id for routing writes to their shard.
+
+        Served from the cached snapshot when it is fresh; ids it does not know
+        (new room types, or no cache) are looked up on every shard. Unknown
+        room types are left out.
+        """
+        known = self._snapshot.hotels if self._fresh() else {}
+        hotels = {room_type_id: known[room_type_id] for room_type_id in room_type_ids if room_type_id in known}
+        missing = room_type_ids - hotels.keys()
+        if missing:
+            hotels.update(await RoomDAO.find_hotels(missing))
+        return hotels
+
+
+room_catalog = RoomCatalog(settings.CATALOG_CACHE_TTL_SECONDS)
@@ -0,0 +1,86 @@
+import asyncio
+
+from app.config import settings
+from app.exceptions import OperationAddFailedException
+from app.metrics import metrics
+from app.rooms.admission import admission
+from app.rooms.repository import RoomDAO
+from app.rooms.schemas import SRoomsReservationParams, SInventoryOperationResult
+
+
+coalesced_batches = metrics.counter("reserve_coalesced_batches_total", "Reserve groups committed by the coalescer.")
+coalesced_requests = metrics.counter("reserve_coalesced_requests_total", "Reserve requests resolved through the coalescer.")
+
+
+class ReserveCoalescer:
+    """Per-worker group commit for ``/rooms/reserve``.
+
+    Requests for the same (hotel_id, room_type_id, check_in, check_out) that arrive
+    within ``window_ms`` of the first one are resolved together by
+    ``RoomDAO.add_reservation_group``: one transaction, one range lock, grants
+    in arrival order until capacity runs out. A group is flushed early when it
+    reaches ``max_batch``. Admission control takes one slot per group when it
+    is committed, so requests joining an open group are never shed on their own.
+    """
+
+    def __init__(self, window_ms: int, max_batch: int):
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self._groups: dict[tuple, list[tuple[SRoomsReservationParams, asyncio.Future]]] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def reserve(self, params: SRoomsReservationParams) -> SInventoryOperationResult:
+        if self.window_ms <= 0:
+            async with admission.slot(params.room_type_id):
+                return await RoomDAO.add_reservation(params)
+
+        loop = asyncio.get_running_loop()
+        key = (params.hotel_id, params.room_type_id, params.check_in, params.check_out)
+        future = loop.create_future()
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = []
+            loop.call_later(self.window_ms / 1000, self._flush, key, group)
+        group.append((params, future))
+        if len(group) >= self.max_batch:
+            self._flush(key, group)
+
+        result = await future
+        if result.status == "failure":
+            raise OperationAddFailedException
+        return result
+
+    def _flush(self, key: tuple, group: list):
+        if self._groups.get(key) is not group:
+            return
+        del self._groups[key]
+        task = asyncio.create_task(self._commit(group))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _commit(self, group: list):
+        coalesced_batches.inc()
+        coalesced_requests.inc(len(group))
+        try:
+            # A shed group fails every request in it with 429.
+            async with admission.slot(group[0][0].room_type_id):
+                results = await RoomDAO.add_reservation_group([params for params, _ in group])
+        except Exception as exc:
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(exc)
+        else:
+            for (_, future), result in zip(group, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        finally:
+            for _, future in group:
+                if not future.done():
+                    future.cancel()
+
+
+reserve_coalescer = ReserveCoalescer(settings.RESERVE_COALESCE_WINDOW_MS, settings.RESERVE_COALESCE_MAX_BATCH)
@@ -0,0 +1,408 @@
+import argparse
+import asyncio
+import csv
+import re
+from typing import AsyncIterable, AsyncIterator
+
+import asyncpg
+from sqlalchemy import text
+
+from app.config import settings
+from app.exceptions import ImportException, ImportLedgerModeException
+from app.notifications import INVENTORY_CHANNEL, ROOM_TYPES_CHANNEL, change_listener
+from app.rooms.schemas import SImportError, SImportReport
+from app.shards import shard_router
+
+
+MAX_REPORTED_ERRORS = 1000
+FILE_CHUNK_BYTES = 1 << 20
+IMPORT_WORK_MEM = "256MB"
+
+_COPY_LINE = re.compile(r"\bline (\d+)\b")
+
+# CSV header -> required. Column order in the file is free.
+ROOM_TYPE_COLUMNS = {
+    "room_type_id": True,
+    "name": True,
+    "capacity_adults": True,
+    "price": True,
+    "total_quantity": True,
+}
+INVENTORY_COLUMNS = {
+    "room_type_id": True,
+    "date": True,
+    "reserved_quantity": True,
+    "blocked_quantity": False,
+}
+
+# Everything is staged as text so COPY never rejects a value; validation below
+# reports bad values per line instead. line starts at 2 because line 1 is the header.
+CREATE_STAGING = [
+    """
+    CREATE TEMP TABLE import_room_types (
+        line bigint GENERATED ALWAYS AS IDENTITY (START WITH 2),
+        room_type_id text, name text, capacity_adults text, price text, total_quantity text
+    ) ON COMMIT DROP
+    """,
+    """
+    CREATE TEMP TABLE import_inventory (
+        line bigint GENERATED ALWAYS AS IDENTITY (START WITH 2),
+        room_type_id text, date text, reserved_quantity text, blocked_quantity text
+    ) ON COMMIT DROP
+    """,
+]
+
+
+def _not_count(column: str, minimum: int = 0) -> str:
+    # True unless the value is an integer >= minimum that fits into int4.
+    return (
+        f"CASE WHEN {column} ~ '^\\s*\\d{{1,9}}\\s*$' THEN {column}::int < {minimum} ELSE true END"
+    )
+
+
+def _not_date(column: str) -> str:
+    # Postgres 15 has no pg_input_is_valid, so YYYY-MM-DD is checked by hand;
+    # only days 29-31 need the length of their month.
+    value = f"trim({column})"
+    return f"""CASE
+        WHEN {column} !~ '^\\s*\\d{{4}}-(0[1-9]|1[0-2])-(0[1-9]|[12]\\d|3[01])\\s*$' THEN true
+        WHEN substr({value}, 1, 4) = '0000' THEN true
+        WHEN substr({value}, 9, 2) < '29' THEN false
+        ELSE substr({value}, 9, 2)::int > extract(day FROM
+            make_date(substr({value}, 1, 4)::int, substr({value}, 6, 2)::int, 1) + interval '1 month - 1 day')
+    END"""
+
+
+def _row_errors(table: str, checks: dict[str, str]) -> str:
+    # All per-value checks of a staging table in a single scan: one
+    # message per failed check, lines without errors yield nothing.
+    messages = ",\n".join(f"CASE WHEN {check} THEN '{message}' END" for message, check in checks.items())
+    return f"SELECT line, message FROM {table}, unnest(ARRAY[{messages}]) AS message WHERE message IS NOT NULL"
+
+
+VALIDATE_ROOM_TYPES = f"""
+    SELECT line, message FROM (
+        {_row_errors("import_room_types", {
+            "room_type_id is empty": "coalesce(trim(room_type_id), '') = ''",
+            "name is empty": "coalesce(trim(name), '') = ''",
+            "capacity_adults must be a positive integer": _not_count("capacity_adults", 1),
+            "price must be a non-negative integer": _not_count("price"),
+            "total_quantity must be a non-negative integer": _not_count("total_quantity"),
+        })}
+        UNION ALL
+        SELECT line, 'duplicate room_type_id ' || room_type_id FROM (
+            SELECT line, trim(room_type_id) AS room_type_id,
+                   row_number() OVER (PARTITION BY trim(room_type_id) ORDER BY line) AS n
+            FROM import_room_types
+        ) AS numbered WHERE n > 1
+        UNION ALL
+        SELECT staged.line, 'room_type_id ' || room_types.room_type_id || ' belongs to hotel ' || room_types.hotel_id
+        FROM import_room_types AS staged
+        JOIN room_types ON room_types.room_type_id = trim(staged.room_type_id)
+        WHERE room_types.hotel_id <> :hotel_id
+    ) AS errors
+    ORDER BY line
+    LIMIT :limit
+"""
+
+STAGED_ROOM_TYPE_IDS = "SELECT min(line), trim(room_type_id) FROM import_room_types GROUP BY trim(room_type_id)"
+
+# Run on every other shard with the staged ids: room_type_id is unique only per
+# database, so the importer checks the rest of the shards itself.
+FIND_ROOM_TYPES = "SELECT room_type_id, hotel_id FROM room_types WHERE room_type_id = ANY(:room_type_ids)"
+
+# reserved_quantity is what /rooms/release gives back, so blocked rooms cannot
+# be stored there; blocked_quantity is only accepted when empty or 0.
+VALIDATE_INVENTORY = f"""
+    SELECT line, message FROM (
+        {_row_errors("import_inventory", {
+            "date must be YYYY-MM-DD": _not_date("date"),
+            "reserved_quantity must be a non-negative integer": _not_count("reserved_quantity"),
+            "blocked_quantity must be empty or 0, blocked rooms cannot be imported":
+                "coalesce(trim(blocked_quantity), '') !~ '^0*$'",
+        })}
+        UNION ALL
+        SELECT line, 'room_type_id ' || coalesce(trim(room_type_id), '') || ' is not a room type of this hotel'
+        FROM import_inventory AS staged
+        WHERE NOT EXISTS (
+            SELECT FROM room_types
+            WHERE room_types.room_type_id = trim(staged.room_type_id) AND room_types.hotel_id = :hotel_id
+        )
+        AND NOT EXISTS (SELECT FROM import_room_types WHERE trim(import_room_types.room_type_id) = trim(staged.room_type_id))
+        UNION ALL
+        SELECT line, 'duplicate row for ' || room_type_id || ' on ' || date FROM (
+            SELECT line, trim(room_type_id) AS room_type_id, trim(date) AS date,
+                   row_number() OVER (PARTITION BY trim(room_type_id), trim(date) ORDER BY line) AS n
+            FROM import_inventory
+        ) AS numbered WHERE n > 1
+    ) AS errors
+    ORDER BY line
+    LIMIT :limit
+"""
+
+MERGE_ROOM_TYPES = """
+    INSERT INTO room_types (room_type_id, hotel_id, name, capacity_adults, price, total_quantity)
+    SELECT trim(room_type_id), :hotel_id, trim(name), capacity_adults::int, price::int, total_quantity::int
+    FROM import_room_types
+    ON CONFLICT (room_type_id) DO UPDATE SET
+        name = excluded.name,
+        capacity_adults = excluded.capacity_adults,
+        price = excluded.price,
+        total_quantity = excluded.total_quantity
+"""
+
+# Validated rows, typed once for the statements that merge them.
+CREATE_IMPORTED_INVENTORY = """
+    CREATE TEMP TABLE imported_inventory ON COMMIT DROP AS
+    SELECT trim(room_type_id)::varchar AS room_type_id, trim(date)::date AS date,
+           reserved_quantity::int AS reserved_quantity
+    FROM import_inventory
+"""
+
+# Existing rows are updated by one join instead of a per-row ON CONFLICT
+# probe, and rows that already hold the imported value are not rewritten.
+UPDATE_INVENTORY = """
+    UPDATE inventory_daily SET reserved_quantity = imported.reserved_quantity, updated_at = now()
+    FROM imported_inventory AS imported
+    WHERE inventory_daily.room_type_id = imported.room_type_id
+    AND inventory_daily.date = imported.date
+    AND inventory_daily.reserved_quantity <> imported.reserved_quantity
+"""
+
+# ON CONFLICT only covers rows created concurrently, e.g. by the materializer.
+INSERT_INVENTORY = """
+    INSERT INTO inventory_daily (room_type_id, date, reserved_quantity)
+    SELECT room_type_id, date, reserved_quantity FROM imported_inventory AS imported
+    WHERE NOT EXISTS (
+        SELECT FROM inventory_daily
+        WHERE inventory_daily.room_type_id = imported.room_type_id AND inventory_daily.date = imported.date
+    )
+    ORDER BY room_type_id, date
+    ON CONFLICT (room_type_id, date) DO UPDATE SET
+        reserved_quantity = excluded.reserved_quantity,
+        updated_at = now()
+"""
+
+# Checked after merging so that new totals and new reserved quantities are
+# compared with each other and with the rows already in the calendar.
+CHECK_OVERBOOKED = """
+    SELECT inventory_daily.room_type_id, inventory_daily.date, inventory_daily.reserved_quantity,
+           room_types.total_quantity
+    FROM room_types
+    JOIN inventory_daily ON inventory_daily.room_type_id = room_types.room_type_id
+    WHERE room_types.room_type_id IN (
+        SELECT trim(room_type_id) FROM import_room_types
+        UNION
+        SELECT trim(room_type_id) FROM import_inventory
+    )
+    AND inventory_daily.date >= current_date
+    AND inventory_daily.reserved_quantity > room_types.total_quantity
+    ORDER BY inventory_daily.room_type_id, inventory_daily.date
+    LIMIT :limit
+"""
+
+NOTIFY_INVENTORY = f"""
+    SELECT payload, pg_notify('{INVENTORY_CHANNEL}', payload) FROM (
+        SELECT room_type_id || '|' || to_char(min(date), 'YYYY-MM-DD') || '|' || to_char(max(date) + 1, 'YYYY-MM-DD')
+            AS payload
+        FROM imported_inventory
+        GROUP BY room_type_id
+    ) AS changes
+"""
+
+
+class _CsvHeaderError(Exception):
+    pass
+
+
+async def _body(source: AsyncIterable[bytes], columns: dict[str, bool], header: list[str]) -> AsyncIterator[bytes]:
+    # Strips the header line off the stream and records its column names, so
+    # COPY gets the data rows with an explicit column list.
+    buffer = b""
+    chunks = source.__aiter__()
+    async for chunk in chunks:
+        buffer += chunk
+        if b"\n" in buffer:
+            break
+    first, _, rest = buffer.partition(b"\n")
+    names = [name.strip() for name in next(csv.reader([first.decode("utf-8-sig").rstrip("\r")]), [])]
+    unknown = [name for name in names if name not in columns]
+    missing = [name for name, required in columns.items() if required and name not in names]
+    if unknown or missing or len(set(names)) != len(names):
+        raise _CsvHeaderError(
+            f"header must name the columns {', '.join(columns)} once each"
+            + (f"; unknown: {', '.join(unknown)}" if unknown else "")
+            + (f"; missing: {', '.join(missing)}" if missing else "")
+        )
+    header.extend(names)
+
+    if rest:
+        yield rest
+    async for chunk in chunks:
+        yield chunk
+
+
+async def _copy(raw, table: str, columns: dict[str, bool], source: AsyncIterable[bytes], file: str) -> list[SImportError]:
+    header: list[str] = []
+    body = _body(source, columns, header)
+    try:
+        first = await body.__anext__()
+    except StopAsyncIteration:
+        return []
+    except _CsvHeaderError as exc:
+        return [SImportError(file=file, line=1, message=str(exc))]
+
+    async def rows():
+        yield first
+        async for chunk in body:
+            yield chunk
+
+    try:
+        await raw.copy_to_table(table, source=rows(), columns=header, format="csv")
+    except asyncpg.PostgresError as exc:
+        # Malformed CSV (quoting, column count). COPY counts lines from the
+        # first data row, the file from the header.
+        context = getattr(exc, "context", None) or ""
+        match = _COPY_LINE.search(context)
+        return [SImportError(file=file, line=int(match[1]) + 1 if match else None, message=str(exc))]
+    return []
+
+
+async def _taken_in_other_shards(conn, hotel_id: str) -> list[SImportError]:
+    own = shard_router.shard(hotel_id)
+    others = [shard for shard in shard_router.shards.values() if shard is not own]
+    if not others:
+        return []
+    lines = {room_type_id: line for line, room_type_id in await conn.execute(text(STAGED_ROOM_TYPE_IDS))}
+
+    async def find(shard):
+        async with shard.engine.connect() as other:
+            return (await other.execute(text(FIND_ROOM_TYPES), {"room_type_ids": list(lines)})).all()
+
+    taken = [row for rows in await asyncio.gather(*(find(shard) for shard in others)) for row in rows]
+    return sorted(
+        (
+            SImportError(file="room_types", line=lines[room_type_id],
+                         message=f"room_type_id {room_type_id} belongs to hotel {other_hotel} in another shard")
+            for room_type_id, other_hotel in taken
+        ),
+        key=lambda error: error.line,
+    )[:MAX_REPORTED_ERRORS]
+
+
+async def import_csv(
+    hotel_id: str,
+    room_types: AsyncIterable[bytes] | None = None,
+    inventory: AsyncIterable[bytes] | None = None,
+) -> SImportReport:
+    """COPY room types and/or per-day inventory of one hotel into staging tables,
+    validate them and merge them into room_types and inventory_daily.
+
+    Everything runs in one transaction on the hotel's shard: either both files
+    are merged or, if any row is invalid, nothing is and the report lists the
+    errors (at most MAX_REPORTED_ERRORS). Room type ids another shard already
+    holds are rejected too; that check takes no lock there, so two concurrent
+    imports of the same new id into different shards are only caught by the
+    startup check.
+    """
+    if settings.RESERVATION_MODE == "ledger":
+        # Counters and pending deltas would still hold the old quantities.
+        raise ImportLedgerModeException()
+
+    report = SImportReport(hotel_id=hotel_id)
+    params = {"hotel_id": hotel_id, "limit": MAX_REPORTED_ERRORS}
+    async with shard_router.shard(hotel_id).engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            # Validation and merge sort and hash whole files.
+            await conn.execute(text(f"SET LOCAL work_mem = '{IMPORT_WORK_MEM}'"))
+            for statement in CREATE_STAGING:
+                await conn.execute(text(statement))
+            raw = (await conn.get_raw_connection()).driver_connection
+
+            if room_types is not None:
+                report.errors += await _copy(raw, "import_room_types", ROOM_TYPE_COLUMNS, room_types, "room_types")
+            if inventory is not None and not report.errors:
+                report.errors += await _copy(raw, "import_inventory", INVENTORY_COLUMNS, inventory, "inventory")
+            if report.errors:
+                await transaction.rollback()
+                return report
+
+            await conn.execute(text("ANALYZE import_room_types, import_inventory"))
+            for file, query in (("room_types", VALIDATE_ROOM_TYPES), ("inventory", VALIDATE_INVENTORY)):
+                for line, message in await conn.execute(text(query), params):
+                    report.errors.append(SImportError(file=file, line=line, message=message))
+            if room_types is not None and not report.errors:
+                report.errors += await _taken_in_other_shards(conn, hotel_id)
+            if report.errors:
+                await transaction.rollback()
+                return report
+
+            report.room_types = (await conn.execute(text(MERGE_ROOM_TYPES), params)).rowcount
+            if inventory is not None:
+                report.inventory_rows = (await conn.execute(text(CREATE_IMPORTED_INVENTORY))).rowcount
+                await conn.execute(text("ANALYZE imported_inventory"))
+                await conn.execute(text(UPDATE_INVENTORY))
+                await conn.execute(text(INSERT_INVENTORY))
+            for room_type_id, day, reserved, total in await conn.execute(text(CHECK_OVERBOOKED), params):
+                report.errors.append(SImportError(
+                    file="inventory" if inventory is not None else "room_types",
+                    message=f"{room_type_id} on {day}: reserved_quantity {reserved} exceeds total_quantity {total}",
+                ))
+            if report.errors:
+                await transaction.rollback()
+                report.room_types = report.inventory_rows = 0
+                return report
+
+            # room_types changes notify through their trigger; inventory rows
+            # notify once per room type over the imported date range.
+            changes = []
+            if inventory is not None:
+                changes = [payload for payload, _ in await conn.execute(text(NOTIFY_INVENTORY))]
+            await transaction.commit()
+        except BaseException:
+            if transaction.is_active:
+                await transaction.rollback()
+            raise
+    # This worker's caches see the import before the NOTIFY echo does.
+    if report.room_types:
+        change_listener.publish(ROOM_TYPES_CHANNEL)
+    for payload in changes:
+        change_listener.publish(INVENTORY_CHANNEL, payload)
+    return report
+
+
+async def read_file(path: str) -> AsyncIterator[bytes]:
+    with open(path, "rb") as file:
+        while chunk := file.read(FILE_CHUNK_BYTES):
+            yield chunk
+
+
+async def import_files(hotel_id: str, room_types_path: str | None, inventory_path: str | None) -> SImportReport:
+    return await import_csv(
+        hotel_id,
+        read_file(room_types_path) if room_types_path else None,
+        read_file(inventory_path) if inventory_path else None,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load room types and per-day inventory of one hotel from CSV.")
+    parser.add_argument("--hotel-id", required=True)
+    parser.add_argument("--room-types", help="CSV with room_type_id,name,capacity_adults,price,total_quantity")
+    parser.add_argument("--inventory", help="CSV with room_type_id,date,reserved_quantity[,blocked_quantity]")
+    args = parser.parse_args()
+    if not args.room_types and not args.inventory:
+        parser.error("nothing to import: pass --room-types and/or --inventory")
+
+    try:
+        report = asyncio.run(import_files(args.hotel_id, args.room_types, args.inventory))
+    except ImportException as exc:
+        print(exc.detail["msg"])
+        raise SystemExit(1)
+    for error in report.errors:
+        print(f"{error.file}:{error.line or '-'}: {error.message}")
+    if report.errors:
+        print(f"Import rejected with {len(report.errors)} errors, nothing was changed.")
+        raise SystemExit(1)
+    print(f"Imported {report.room_types} room types and {report.inventory_rows} inventory rows for {args.hotel_id}.")
@@ -0,0 +1,284 @@
+import argparse
+import asyncio
+import random
+from datetime import date, timedelta
+from itertools import groupby
+
+from sqlalchemy import Date, Integer, cast, delete, func, insert, literal, select, true, union_all, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config import settings
+from app.database import engine
+from app.shards import shard_router
+from app.rooms.models import InventoryDaily, InventoryLedger, InventoryCounters
+
+
+LEDGER_COMPACTOR_LOCK_ID = 0x1A7E_0002
+
+
+def daily_reserved():
+    """(room_type_id, date, reserved_quantity) as seen by the read paths.
+
+    Outside ledger mode this is ``inventory_daily`` itself. In ledger mode it
+    is the snapshot plus the deltas the compactor has not folded yet; both are
+    read in one statement, so a concurrent compaction is never seen half-done.
+    """
+    if settings.RESERVATION_MODE != "ledger":
+        return InventoryDaily.__table__
+    rows = union_all(
+        select(InventoryDaily.room_type_id, InventoryDaily.date, InventoryDaily.reserved_quantity),
+        select(InventoryLedger.room_type_id, InventoryLedger.date, InventoryLedger.delta),
+    ).subquery("daily_rows")
+    return (
+        select(
+            rows.c.room_type_id,
+            rows.c.date,
+            cast(func.sum(rows.c.reserved_quantity), Integer).label("reserved_quantity"),
+        )
+        .group_by(rows.c.room_type_id, rows.c.date)
+        .subquery("daily_reserved")
+    )
+
+
+def _days(check_in: date, check_out: date):
+    return (
+        func.generate_series(check_in, check_out - timedelta(days=1), timedelta(days=1))
+        .table_valued("day")
+        .render_derived(name="days")
+    )
+
+
+def _has_room(delta: int):
+    if delta > 0:
+        return InventoryCounters.capacity - InventoryCounters.reserved >= delta
+    return InventoryCounters.reserved >= -delta
+
+
+async def _apply_to_free_stripes(session, room_type_id: str, check_in: date, check_out: date, delta: int) -> bool:
+    # Fast path: for every night take one stripe that can absorb the whole
+    # delta, skipping stripes locked by concurrent writers instead of waiting.
+    days = _days(check_in, check_out)
+    offset = random.randrange(settings.LEDGER_STRIPES)
+    stripe = (
+        select(InventoryCounters.stripe)
+        .where(
+            InventoryCounters.room_type_id == room_type_id,
+            InventoryCounters.date == cast(days.c.day, Date),
+            _has_room(delta),
+        )
+        .order_by((InventoryCounters.stripe + 1024 - offset) % 1024)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .lateral("stripe")
+    )
+    picks = (
+        select(cast(days.c.day, Date).label("date"), stripe.c.stripe)
+        .select_from(days)
+        .join(stripe, true())
+        .cte("picks")
+    )
+    result = await session.execute(
+        update(InventoryCounters)
+        .where(
+            InventoryCounters.room_type_id == room_type_id,
+            InventoryCounters.date == picks.c.date,
+            InventoryCounters.stripe == picks.c.stripe,
+            _has_room(delta),
+        )
+        .values(reserved=InventoryCounters.reserved + delta)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == (check_out - check_in).days
+
+
+async def _insert_counter_rows(session, room_type_id: str, check_in: date, check_out: date, total_quantity: int):
+    # total_quantity is split over at most LEDGER_STRIPES stripes and the
+    # current reservations are poured into them in stripe order; any excess
+    # (overbooked data) stays on the last stripe. Concurrent initializers compute
+    # the same rows, and existing rows always win.
+    daily = daily_reserved()
+    reserved_by_day = dict((await session.execute(
+        select(daily.c.date, daily.c.reserved_quantity).where(
+            daily.c.room_type_id == room_type_id,
+            daily.c.date >= check_in,
+            daily.c.date < check_out,
+        )
+    )).all())
+
+    stripes = min(settings.LEDGER_STRIPES, total_quantity)
+    rows = []
+    for offset in range((check_out - check_in).days):
+        day = check_in + timedelta(days=offset)
+        left = max(reserved_by_day.get(day, 0), 0)
+        for stripe in range(stripes):
+            capacity = total_quantity // stripes + (1 if stripe < total_quantity % stripes else 0)
+            reserved = left if stripe == stripes - 1 else min(capacity, left)
+            left -= reserved
+            rows.append({
+                "room_type_id": room_type_id,
+                "date": day,
+                "stripe": stripe,
+                "capacity": capacity,
+                "reserved": reserved,
+            })
+    if rows:
+        await session.execute(pg_insert(InventoryCounters).values(rows).on_conflict_do_nothing())
+
+
+async def _apply_across_stripes(session, room_type_id: str, check_in: date, check_out: date, delta: int,
+                                total_quantity: int) -> bool:
+    # Slow path: lock every stripe of the range (in date, stripe order) and
+    # spread the delta over as many stripes as needed.
+    nights = (check_out - check_in).days
+    query = (
+        select(InventoryCounters.date, InventoryCounters.stripe, InventoryCounters.capacity, InventoryCounters.reserved)
+        .where(
+            InventoryCounters.room_type_id == room_type_id,
+            InventoryCounters.date >= check_in,
+            InventoryCounters.date < check_out,
+        )
+        .order_by(InventoryCounters.date, InventoryCounters.stripe)
+        .with_for_update()
+    )
+    rows = (await session.execute(query)).all()
+    if len({row.date for row in rows}) < nights:
+        await _insert_counter_rows(session, room_type_id, check_in, check_out, total_quantity)
+        rows = (await session.execute(query)).all()
+        if len({row.date for row in rows}) < nights:
+            return False
+
+    changes = []
+    for day, day_rows in groupby(rows, key=lambda row: row.date):
+        left = abs(delta)
+        for row in day_rows:
+            room = row.capacity - row.reserved if delta > 0 else row.reserved
+            take = min(max(room, 0), left)
+            if take > 0:
+                changes.append({
+                    "room_type_id": room_type_id,
+                    "date": day,
+                    "stripe": row.stripe,
+                    "reserved": row.reserved + (take if delta > 0 else -take),
+                })
+                left -= take
+        if left > 0:
+            return False
+
+    await session.execute(update(InventoryCounters), changes)
+    return True
+
+
+async def apply_ledger_delta(session, room_type_id: str, check_in: date, check_out: date, delta: int,
+                             total_quantity: int) -> bool:
+    """Reserve (delta > 0) or release (delta < 0) ``abs(delta)`` rooms for every night of the range.
+
+    Availability is enforced on ``inventory_counters``; on success one delta
+    row per night is appended to ``inventory_ledger``. Returns False, with
+    nothing changed, when some night has no room (or nothing to release).
+    """
+    savepoint = await session.begin_nested()
+    if await _apply_to_free_stripes(session, room_type_id, check_in, check_out, delta):
+        await savepoint.commit()
+    else:
+        await savepoint.rollback()
+        if not await _apply_across_stripes(session, room_type_id, check_in, check_out, delta, total_quantity):
+            return False
+
+    days = _days(check_in, check_out)
+    await session.execute(
+        insert(InventoryLedger).from_select(
+            ["room_type_id", "date", "delta"],
+            select(literal(room_type_id), cast(days.c.day, Date), literal(delta)).select_from(days),
+        )
+    )
+    return True
+
+
+def fold_ledger_rows(batch_size: int):
+    # Deletes up to batch_size ledger rows and adds their sums to
+    # inventory_daily in the same statement.
+    folded = (
+        delete(InventoryLedger)
+        .where(InventoryLedger.id.in_(
+            select(InventoryLedger.id)
+            .order_by(InventoryLedger.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ))
+        .returning(InventoryLedger.room_type_id, InventoryLedger.date, InventoryLedger.delta)
+        .cte("folded")
+    )
+    totals = (
+        select(folded.c.room_type_id, folded.c.date, func.sum(folded.c.delta))
+        .group_by(folded.c.room_type_id, folded.c.date)
+    )
+    upsert = pg_insert(InventoryDaily.__table__).from_select(["room_type_id", "date", "reserved_quantity"], totals)
+    return upsert.on_conflict_do_update(
+        index_elements=["room_type_id", "date"],
+        set_={
+            "reserved_quantity": InventoryDaily.__table__.c.reserved_quantity + upsert.excluded.reserved_quantity,
+            "updated_at": func.now(),
+        },
+    )
+
+
+async def compact_ledger(batch_size: int, max_batches: int = 100, bind: AsyncEngine = engine) -> int | None:
+    """Fold pending ledger deltas into inventory_daily and drop counters of past nights.
+
+    Returns the number of inventory_daily rows updated, or None if another
+    process holds the compactor lock.
+    """
+    updated = 0
+    async with bind.connect() as conn:
+        locked = await conn.scalar(select(func.pg_try_advisory_lock(LEDGER_COMPACTOR_LOCK_ID)))
+        await conn.commit()
+        if not locked:
+            return None
+        try:
+            for _ in range(max_batches):
+                result = await conn.execute(fold_ledger_rows(batch_size))
+                await conn.commit()
+                if result.rowcount == 0:
+                    break
+                updated += result.rowcount
+            # Nights that have passed take no more reservations; their counters
+            # are seeded again should a write still reach one.
+            await conn.execute(delete(InventoryCounters).where(InventoryCounters.date < func.current_date()))
+            await conn.commit()
+        finally:
+            await conn.rollback()
+            await conn.execute(select(func.pg_advisory_unlock(LEDGER_COMPACTOR_LOCK_ID)))
+            await conn.commit()
+    return updated
+
+
+async def compact_ledger_all_shards(batch_size: int, max_batches: int = 100) -> dict[str, int | None]:
+    return {
+        shard.name: await compact_ledger(batch_size, max_batches, shard.engine)
+        for shard in shard_router.shards.values()
+    }
+
+
+async def ledger_compactor_worker(interval_seconds: float, batch_size: int):
+    while True:
+        try:
+            await compact_ledger_all_shards(batch_size)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            print(f"[ledger_compactor_worker] error: {exc}")
+        await asyncio.sleep(interval_seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fold pending inventory_ledger deltas into inventory_daily.")
+    parser.add_argument("--batch-size", type=int, default=settings.LEDGER_COMPACT_BATCH_SIZE)
+    parser.add_argument("--max-batches", type=int, default=100)
+    args = parser.parse_args()
+
+    for shard, updated in asyncio.run(compact_ledger_all_shards(args.batch_size, args.max_batches)).items():
+        if updated is None:
+            print(f"[{shard}] Another compactor is running, nothing done.")
+        else:
+            print(f"[{shard}] Updated {updated} inventory_daily rows from the ledger.")
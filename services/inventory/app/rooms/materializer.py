@@ -0,0 +1,96 @@
+import argparse
+import asyncio
+from datetime import date, timedelta
+
+from sqlalchemy import Date, cast, func, literal, select, true
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config import settings
+from app.database import engine
+from app.shards import shard_router
+from app.rooms.models import RoomTypes, InventoryDaily
+
+
+MATERIALIZER_LOCK_ID = 0x1A7E_0001
+
+
+def insert_calendar_rows(date_from: date, date_to: date, room_type_id: str | None = None):
+    # Zero rows for every day in [date_from, date_to); existing rows are left untouched.
+    days = (
+        func.generate_series(date_from, date_to - timedelta(days=1), timedelta(days=1))
+        .table_valued("day")
+        .render_derived(name="days")
+    )
+    rows = (
+        select(RoomTypes.room_type_id, cast(days.c.day, Date), literal(0))
+        .select_from(RoomTypes)
+        .join(days, true())
+    )
+    if room_type_id is not None:
+        rows = rows.where(RoomTypes.room_type_id == room_type_id)
+    return (
+        pg_insert(InventoryDaily.__table__)
+        .from_select(["room_type_id", "date", "reserved_quantity"], rows)
+        .on_conflict_do_nothing(index_elements=["room_type_id", "date"])
+    )
+
+
+async def materialize_calendar(horizon_days: int, chunk_days: int = 31, bind: AsyncEngine = engine) -> int | None:
+    """Insert missing inventory_daily rows for [today, today + horizon_days).
+
+    Returns the number of inserted rows, or None if another process holds the
+    materializer lock.
+    """
+    today = date.today()
+    inserted = 0
+    async with bind.connect() as conn:
+        locked = await conn.scalar(select(func.pg_try_advisory_lock(MATERIALIZER_LOCK_ID)))
+        await conn.commit()
+        if not locked:
+            return None
+        try:
+            for offset in range(0, horizon_days, chunk_days):
+                date_from = today + timedelta(days=offset)
+                date_to = today + timedelta(days=min(offset + chunk_days, horizon_days))
+                result = await conn.execute(insert_calendar_rows(date_from, date_to))
+                await conn.commit()
+                inserted += result.rowcount
+        finally:
+            await conn.rollback()
+            await conn.execute(select(func.pg_advisory_unlock(MATERIALIZER_LOCK_ID)))
+            await conn.commit()
+    return inserted
+
+
+async def materialize_calendar_all_shards(horizon_days: int, chunk_days: int = 31) -> dict[str, int | None]:
+    return {
+        shard.name: await materialize_calendar(horizon_days, chunk_days, shard.engine)
+        for shard in shard_router.shards.values()
+    }
+
+
+async def materialize_calendar_worker(horizon_days: int, interval_seconds: int):
+    while True:
+        try:
+            for shard, inserted in (await materialize_calendar_all_shards(horizon_days)).items():
+                if inserted:
+                    print(f"[materialize_calendar_worker] inserted {inserted} calendar rows into shard {shard}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            print(f"[materialize_calendar_worker] error: {exc}")
+        await asyncio.sleep(interval_seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-create zero inventory_daily rows for a rolling horizon.")
+    parser.add_argument("--horizon-days", type=int, default=settings.CALENDAR_HORIZON_DAYS)
+    parser.add_argument("--chunk-days", type=int, default=31)
+    args = parser.parse_args()
+
+    for shard, inserted in asyncio.run(materialize_calendar_all_shards(args.horizon_days, args.chunk_days)).items():
+        if inserted is None:
+            print(f"[{shard}] Another materializer is running, nothing done.")
+        else:
+            print(f"[{shard}] Inserted {inserted} calendar rows for the next {args.horizon_days} days.")
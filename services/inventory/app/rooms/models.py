@@ -1,5 +1,5 @@
 from app.database import Base
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, DateTime, func, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, String, ForeignKey, Date, DateTime, func, Index
 from sqlalchemy.dialects.postgresql import UUID
 
 
@@ -7,23 +7,35 @@ class RoomTypes(Base):
     __tablename__ = "room_types"
 
     room_type_id = Column(String, primary_key=True)
+    hotel_id = Column(String, nullable=False, server_default="default")
     name = Column(String, nullable=False)
     capacity_adults = Column(Integer, nullable=False)
     price = Column(Integer, nullable=False)
     total_quantity = Column(Integer, nullable=False)
 
+    __table_args__ = (
+        Index('ix_room_types_hotel_id', 'hotel_id'),
+        Index('ix_room_types_name', 'name'),
+        Index('ix_room_types_capacity_adults', 'capacity_adults'),
+        Index('ix_room_types_price', 'price'),
+    )
+
 
 class InventoryDaily(Base):
     __tablename__ = "inventory_daily"
 
     id = Column(Integer, primary_key=True)
     room_type_id = Column(ForeignKey("room_types.room_type_id"))
-    date = Column(Date, nullable=False)
+    date = Column(Date, primary_key=True)
     reserved_quantity = Column(Integer, nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
     __table_args__ = (
-        UniqueConstraint('room_type_id', 'date', name='unique_room_type_id'),
+        Index(
+            'ix_inventory_daily_room_type_id_date', 'room_type_id', 'date',
+            unique=True, postgresql_include=['reserved_quantity'],
+        ),
+        {'postgresql_partition_by': 'RANGE (date)'},
     )
 
 
@@ -36,5 +48,44 @@ class Operations(Base):
     room_type_id = Column(ForeignKey("room_types.room_type_id"))
     check_in = Column(Date, nullable=False)
     check_out = Column(Date, nullable=False)
+    quantity = Column(Integer, nullable=False, server_default="1")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), primary_key=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    # The primary key has to contain the partition key, so it cannot enforce
+    # uuid uniqueness; an insert trigger claims the uuid in operations_uuid.
+    __table_args__ = {'postgresql_partition_by': 'RANGE (created_at)'}
+
+
+class OperationsUuid(Base):
+    __tablename__ = "operations_uuid"
+
+    # One key per operation, filled by the operations insert trigger and kept
+    # after the partition holding the row is retired. created_at points a
+    # lookup at that partition.
+    uuid = Column(UUID(as_uuid=True), primary_key=True, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class InventoryLedger(Base):
+    __tablename__ = "inventory_ledger"
+
+    id = Column(BigInteger, primary_key=True)
+    room_type_id = Column(ForeignKey("room_types.room_type_id"), nullable=False)
+    date = Column(Date, nullable=False)
+    delta = Column(Integer, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
\ No newline at end of file
+
+    __table_args__ = (
+        Index('ix_inventory_ledger_room_type_id_date', 'room_type_id', 'date', postgresql_include=['delta']),
+    )
+
+
+class InventoryCounters(Base):
+    __tablename__ = "inventory_counters"
+
+    room_type_id = Column(ForeignKey("room_types.room_type_id"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    stripe = Column(SmallInteger, primary_key=True)
+    capacity = Column(Integer, nullable=False)
+    reserved = Column(Integer, nullable=False)
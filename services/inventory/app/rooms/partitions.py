@@ -0,0 +1,163 @@
+import argparse
+import asyncio
+import math
+import re
+from datetime import date
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config import settings
+from app.database import engine
+from app.shards import shard_router
+
+
+PARTITION_MAINTENANCE_LOCK_ID = 0x1A7E_0003
+
+# Partitioned table -> range partition key. Partitions are monthly and named
+# <table>_pYYYYMM; rows outside every partition land in <table>_default.
+PARTITIONED_TABLES = {
+    "inventory_daily": "date",
+    "operations": "created_at",
+}
+
+_PARTITION_NAME = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def add_months(month: date, months: int) -> date:
+    year, month_index = divmod(month.year * 12 + month.month - 1 + months, 12)
+    return date(year, month_index + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+async def existing_partitions(conn, table: str) -> dict[date, str]:
+    names = await conn.scalars(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "WHERE parent.relname = :table"
+    ), {"table": table})
+    partitions = {}
+    for name in names:
+        match = _PARTITION_NAME.search(name)
+        if match is not None:
+            partitions[date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+async def create_partition(conn, table: str, month: date) -> str:
+    # CREATE TABLE ... PARTITION OF fails if the default partition already holds
+    # rows for the range, so those rows are moved into the new table first.
+    column = PARTITIONED_TABLES[table]
+    name = partition_name(table, month)
+    bounds = {"start": month, "end": add_months(month, 1)}
+    await conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    await conn.execute(text(
+        f"WITH moved AS (DELETE FROM {table}_default WHERE {column} >= :start AND {column} < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), bounds)
+    await conn.execute(text(
+        f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+    ))
+    return name
+
+
+async def retire_partition(conn, table: str, name: str, archive_schema: str | None):
+    await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+    if archive_schema:
+        await conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}"))
+        await conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {archive_schema}"))
+    else:
+        await conn.execute(text(f"DROP TABLE {name}"))
+
+
+def partition_window(table: str) -> tuple[int, int]:
+    """(months kept before the current one, months created after it) for a table."""
+    if table == "inventory_daily":
+        # The materializer writes CALENDAR_HORIZON_DAYS ahead.
+        return settings.INVENTORY_DAILY_RETENTION_MONTHS, math.ceil(settings.CALENDAR_HORIZON_DAYS / 28)
+    return settings.OPERATIONS_RETENTION_MONTHS, settings.OPERATIONS_PARTITION_MONTHS_AHEAD
+
+
+async def maintain_partitions(
+    archive_schema: str | None, bind: AsyncEngine = engine
+) -> dict[str, tuple[list[str], list[str]]] | None:
+    """Create missing monthly partitions ahead of time and retire expired ones.
+
+    Expired partitions are detached and moved to ``archive_schema``, or dropped
+    if it is empty. Returns ``{table: (created, retired)}``, or None if another
+    process holds the maintenance lock.
+    """
+    this_month = date.today().replace(day=1)
+    changes = {}
+    async with bind.connect() as conn:
+        locked = await conn.scalar(select(func.pg_try_advisory_lock(PARTITION_MAINTENANCE_LOCK_ID)))
+        await conn.commit()
+        if not locked:
+            return None
+        try:
+            for table in PARTITIONED_TABLES:
+                retention_months, months_ahead = partition_window(table)
+                first_kept = add_months(this_month, -retention_months)
+                partitions = await existing_partitions(conn, table)
+
+                created = []
+                for offset in range(months_ahead + 1):
+                    month = add_months(this_month, offset)
+                    if month not in partitions:
+                        created.append(await create_partition(conn, table, month))
+                        await conn.commit()
+
+                retired = []
+                for month, name in sorted(partitions.items()):
+                    if month < first_kept:
+                        await retire_partition(conn, table, name, archive_schema)
+                        await conn.commit()
+                        retired.append(name)
+                changes[table] = (created, retired)
+        finally:
+            await conn.rollback()
+            await conn.execute(select(func.pg_advisory_unlock(PARTITION_MAINTENANCE_LOCK_ID)))
+            await conn.commit()
+    return changes
+
+
+async def maintain_partitions_all_shards(archive_schema: str | None) -> dict[str, dict | None]:
+    return {
+        shard.name: await maintain_partitions(archive_schema, shard.engine)
+        for shard in shard_router.shards.values()
+    }
+
+
+async def partition_maintenance_worker(interval_seconds: int):
+    while True:
+        try:
+            for shard, changes in (await maintain_partitions_all_shards(settings.PARTITION_ARCHIVE_SCHEMA)).items():
+                for table, (created, retired) in (changes or {}).items():
+                    if created or retired:
+                        print(f"[partition_maintenance_worker] {shard}.{table}: created {created}, retired {retired}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            print(f"[partition_maintenance_worker] error: {exc}")
+        await asyncio.sleep(interval_seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Create upcoming monthly partitions and detach expired ones for inventory_daily and operations."
+    )
+    parser.add_argument("--archive-schema", default=settings.PARTITION_ARCHIVE_SCHEMA,
+                        help="schema for detached partitions")
+    parser.add_argument("--drop", action="store_true", help="drop expired partitions instead of archiving them")
+    args = parser.parse_args()
+
+    for shard, changes in asyncio.run(maintain_partitions_all_shards(None if args.drop else args.archive_schema)).items():
+        if changes is None:
+            print(f"[{shard}] Another partition maintenance run is in progress, nothing done.")
+        else:
+            for table, (created, retired) in changes.items():
+                print(f"[{shard}] {table}: created {len(created)} partitions, retired {len(retired)}.")
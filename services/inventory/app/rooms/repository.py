@@ -1,311 +1,803 @@
-from fastapi.openapi.models import Operation
-from datetime import timedelta
-from sqlalchemy import select, and_, func, update, insert
-from sqlalchemy.dialects.postgresql import insert as pg_insert
+import asyncio
+from collections import Counter
+from datetime import date, timedelta
 
-from app.database import async_session_maker
-from app.rooms.models import RoomTypes, InventoryDaily, Operations
-from app.exceptions import RoomNotFoundException, OperationAlreadyCompletedException, OperationAddFailedException, OperationDelFailedException
-from app.rooms.schemas import SRoomsSearchParams, SRoomsReservationParams, SInventoryOperationResult
+from sqlalchemy import select, and_, or_, func, update
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+from app.config import settings
+from app.notifications import change_listener, notify_inventory_changed, record_inventory_change
+from app.replicas import replica_pool
+from app.rooms.availability import availability_index, sliding_window_max
+from app.rooms.ledger import daily_reserved, apply_ledger_delta
+from app.rooms.materializer import insert_calendar_rows
+from app.rooms.models import RoomTypes, InventoryDaily, Operations, OperationsUuid
+from app.exceptions import RoomNotFoundException, OperationAddFailedException, OperationDelFailedException, \
+    OperationBatchFailedException, OperationBatchCrossShardException, OperationExpiredException, \
+    RoomsValidationCalendarException
+from app.shards import DEFAULT_SHARD, Shard, shard_router
+from app.rooms.schemas import SRoomsSearchParams, SRoomsReservationParams, SInventoryOperationResult, SRoomCalendar, \
+    SRoomsFlexibleSearchParams, SRoomsAlternativesParams
+
+
+STREAM_YIELD_PER = 1000
+FOREIGN_KEY_VIOLATION = "23503"
 
 
 class RoomDAO:
 
+    @staticmethod
+    async def _read_shard(shard: Shard, query, primary: bool = False):
+        # Read-only queries on the default shard go to a healthy replica when
+        # one is configured and are retried once on the primary if it fails.
+        # primary=True is for callers that cache the result until the next
+        # NOTIFY, which a lagging replica may not reflect yet.
+        replica = None if primary or shard.name != DEFAULT_SHARD else replica_pool.pick()
+        if replica is not None:
+            try:
+                async with replica.session_maker() as session:
+                    return (await session.execute(query)).mappings().all()
+            except (DBAPIError, OSError) as exc:
+                replica_pool.mark_down(replica, exc)
+        async with shard.session_maker() as session:
+            return (await session.execute(query)).mappings().all()
+
     @classmethod
-    async def find_all(cls):
-        async with async_session_maker() as session:
-            query = select(RoomTypes.__table__.columns)
-            rooms = await session.execute(query)
-            return rooms.mappings().all()
+    async def _read(cls, query, hotel_id: str | None = None, primary: bool = False):
+        # The hotel's shard, or every shard concurrently with the rows concatenated.
+        results = await shard_router.fan_out(hotel_id, lambda shard: cls._read_shard(shard, query, primary))
+        return [row for rows in results for row in rows]
 
+    @classmethod
+    async def find_all(cls, primary: bool = False):
+        query = select(RoomTypes.__table__.columns)
+        return await cls._read(query, primary=primary)
 
     @classmethod
-    async def find_by_room_type_id(cls, type_id: str):
-        async with async_session_maker() as session:
-            query = select(RoomTypes.__table__.columns).filter_by(room_type_id=type_id)
-            rooms = await session.execute(query)
-            rooms = rooms.mappings().all()
-            if len(rooms) == 0:
-                raise RoomNotFoundException
-            return rooms
+    async def find_hotels(cls, room_type_ids: set[str]) -> dict[str, str]:
+        # room_type_id -> hotel_id, looked up on every shard; unknown ids are left out.
+        query = select(RoomTypes.room_type_id, RoomTypes.hotel_id).where(RoomTypes.room_type_id.in_(room_type_ids))
+        return {row["room_type_id"]: row["hotel_id"] for row in await cls._read(query, primary=True)}
 
+    @classmethod
+    async def find_duplicate_ids(cls) -> list[str]:
+        # room_type_id is the primary key within a shard, so a repeat means two shards hold it.
+        counts = Counter(row["room_type_id"] for row in await cls._read(select(RoomTypes.room_type_id), primary=True))
+        return sorted(room_type_id for room_type_id, n in counts.items() if n > 1)
 
     @classmethod
-    async def search(cls, params: SRoomsSearchParams):
-        async with async_session_maker() as session:
-
-            all_rooms = select(RoomTypes.__table__.columns)
-
-            if params.room_type_id is not None:
-                all_rooms = all_rooms.where(RoomTypes.room_type_id == params.room_type_id)
-            if params.name is not None:
-                all_rooms = all_rooms.where(RoomTypes.name == params.name)
-            if params.adults is not None:
-                all_rooms = all_rooms.where(RoomTypes.capacity_adults >= params.adults)
-            if params.min_price is not None:
-                all_rooms = all_rooms.where(
-                    and_(
-                        RoomTypes.price >= params.min_price,
-                        RoomTypes.price <= params.max_price
-                    )
+    async def calendar(cls, room_type_id: str, date_from: date, date_to: date, hotel_id: str | None = None):
+        if not date_from < date_to <= date_from + timedelta(days=366):
+            raise RoomsValidationCalendarException
+        daily = daily_reserved()
+
+        query = (
+            select(RoomTypes.total_quantity, daily.c.date, daily.c.reserved_quantity)
+            .select_from(RoomTypes)
+            .outerjoin(
+                daily,
+                and_(
+                    daily.c.room_type_id == RoomTypes.room_type_id,
+                    daily.c.date >= date_from,
+                    daily.c.date < date_to,
+                )
+            )
+            .where(RoomTypes.room_type_id == room_type_id)
+        )
+        rows = await cls._read(query, hotel_id)
+        if len(rows) == 0:
+            raise RoomNotFoundException
+
+        total_quantity = rows[0]["total_quantity"]
+        reserved = {row["date"]: row["reserved_quantity"] for row in rows if row["date"] is not None}
+
+        # Days without an inventory_daily row are fully available, as in search.
+        available_quantity, run_length = [], []
+        day = date_from
+        while day < date_to:
+            available = total_quantity - reserved.get(day, 0)
+            if available_quantity and available_quantity[-1] == available:
+                run_length[-1] += 1
+            else:
+                available_quantity.append(available)
+                run_length.append(1)
+            day += timedelta(days=1)
+
+        return SRoomCalendar(
+            room_type_id=room_type_id,
+            date_from=date_from,
+            date_to=date_to,
+            total_quantity=total_quantity,
+            available_quantity=available_quantity,
+            run_length=run_length,
+        )
+
+    @staticmethod
+    def _filter_room_types(query, params: SRoomsSearchParams | SRoomsFlexibleSearchParams):
+        if params.hotel_id is not None:
+            query = query.where(RoomTypes.hotel_id == params.hotel_id)
+        if params.room_type_id is not None:
+            query = query.where(RoomTypes.room_type_id == params.room_type_id)
+        if params.name is not None:
+            query = query.where(RoomTypes.name == params.name)
+        if params.adults is not None:
+            query = query.where(RoomTypes.capacity_adults >= params.adults)
+        if params.min_price is not None:
+            query = query.where(
+                and_(
+                    RoomTypes.price >= params.min_price,
+                    RoomTypes.price <= params.max_price
                 )
+            )
+        return query
 
-            if params.check_in is not None:
-                all_rooms = all_rooms.cte("all_rooms")
+    @classmethod
+    async def search_flexible(cls, params: SRoomsFlexibleSearchParams):
+        span = (params.date_to - params.date_from).days
+        daily = daily_reserved()
+
+        query = cls._filter_room_types(
+            select(RoomTypes.__table__.columns, daily.c.date, daily.c.reserved_quantity)
+            .select_from(RoomTypes)
+            .outerjoin(
+                daily,
+                and_(
+                    daily.c.room_type_id == RoomTypes.room_type_id,
+                    daily.c.date >= params.date_from,
+                    daily.c.date < params.date_to,
+                )
+            ),
+            params,
+        ).order_by(RoomTypes.room_type_id)
+        rows = await cls._read(query, params.hotel_id)
+
+        rooms, reserved = {}, {}
+        for row in rows:
+            room_type_id = row["room_type_id"]
+            if room_type_id not in rooms:
+                rooms[room_type_id] = {column.name: row[column.name] for column in RoomTypes.__table__.columns}
+                reserved[room_type_id] = [0] * span
+            if row["date"] is not None:
+                reserved[room_type_id][(row["date"] - params.date_from).days] = row["reserved_quantity"]
+
+        result = []
+        for room_type_id, room in rooms.items():
+            check_in, available_quantity = [], []
+            window_max = sliding_window_max(reserved[room_type_id], params.nights)
+            for offset, max_reserved in enumerate(window_max):
+                available = room["total_quantity"] - max_reserved
+                if available > 0:
+                    check_in.append(params.date_from + timedelta(days=offset))
+                    available_quantity.append(available)
+            if check_in:
+                result.append({**room, "check_in": check_in, "available_quantity": available_quantity})
+        return result
 
-                booked_rooms = select(InventoryDaily.__table__.columns).where(
-                    and_(
-                        InventoryDaily.room_type_id.in_(select(all_rooms.c.room_type_id)),
-                        InventoryDaily.date >= params.check_in,
-                        InventoryDaily.date < params.check_out
-                    )
-                ).cte("booked_rooms")
-
-                max_reserved = select(
-                    booked_rooms.c.room_type_id,
-                    func.max(booked_rooms.c.reserved_quantity).label('max_reserved_quantity')
-                ).group_by(booked_rooms.c.room_type_id).cte("max_reserved")
-
-                query = (
-                    select(
-                        all_rooms,
-                        (
-                                all_rooms.c.total_quantity
-                                - func.coalesce(max_reserved.c.max_reserved_quantity, 0)
-                        ).label("available_quantity"),
-                    )
-                    .select_from(all_rooms)
-                    .join(
-                        max_reserved,
-                        max_reserved.c.room_type_id == all_rooms.c.room_type_id,
-                        isouter=True,
-                    )
-                    .where(
-                        all_rooms.c.total_quantity
-                        - func.coalesce(max_reserved.c.max_reserved_quantity, 0) > 0
+    @classmethod
+    async def alternatives(cls, params: SRoomsAlternativesParams):
+        nights = (params.check_out - params.check_in).days
+        daily = daily_reserved()
+        window_from = max(params.check_in - timedelta(days=params.max_shift_days), date.today())
+        window_to = params.check_out + timedelta(days=params.max_shift_days)
+        requested_capacity = (
+            select(RoomTypes.capacity_adults)
+            .where(RoomTypes.room_type_id == params.room_type_id)
+            .scalar_subquery()
+        )
+        requested_hotel = (
+            select(RoomTypes.hotel_id)
+            .where(RoomTypes.room_type_id == params.room_type_id)
+            .scalar_subquery()
+        )
+
+        # The requested room type is loaded over the shifted window, the
+        # others only over the original stay.
+        query = (
+            select(RoomTypes.__table__.columns, daily.c.date, daily.c.reserved_quantity)
+            .select_from(RoomTypes)
+            .outerjoin(
+                daily,
+                and_(
+                    daily.c.room_type_id == RoomTypes.room_type_id,
+                    or_(
+                        and_(
+                            RoomTypes.room_type_id == params.room_type_id,
+                            daily.c.date >= window_from,
+                            daily.c.date < window_to,
+                        ),
+                        and_(
+                            daily.c.date >= params.check_in,
+                            daily.c.date < params.check_out,
+                        ),
                     )
                 )
+            )
+            .where(
+                or_(
+                    RoomTypes.room_type_id == params.room_type_id,
+                    and_(
+                        RoomTypes.hotel_id == requested_hotel,
+                        RoomTypes.capacity_adults >= requested_capacity,
+                    ),
+                )
+            )
+        )
+        rows = await cls._read(query, params.hotel_id)
+
+        rooms, reserved = {}, {}
+        for row in rows:
+            room_type_id = row["room_type_id"]
+            if room_type_id not in rooms:
+                rooms[room_type_id] = {column.name: row[column.name] for column in RoomTypes.__table__.columns}
+                reserved[room_type_id] = {}
+            if row["date"] is not None:
+                reserved[room_type_id][row["date"]] = row["reserved_quantity"]
+
+        requested = rooms.pop(params.room_type_id, None)
+        if requested is None:
+            raise RoomNotFoundException
+
+        room_types = []
+        for room_type_id, room in rooms.items():
+            available = room["total_quantity"] - max(reserved[room_type_id].values(), default=0)
+            if available >= params.quantity:
+                room_types.append({**room, "available_quantity": available})
+        room_types.sort(key=lambda room: (abs(room["price"] - requested["price"]), room["price"], room["room_type_id"]))
+
+        shifted_stays = []
+        requested_reserved = reserved[params.room_type_id]
+        daily = [
+            requested_reserved.get(window_from + timedelta(days=offset), 0)
+            for offset in range((window_to - window_from).days)
+        ]
+        for offset, max_reserved in enumerate(sliding_window_max(daily, nights)):
+            check_in = window_from + timedelta(days=offset)
+            shift_days = (check_in - params.check_in).days
+            available = requested["total_quantity"] - max_reserved
+            if shift_days != 0 and available >= params.quantity:
+                shifted_stays.append({
+                    "check_in": check_in,
+                    "check_out": check_in + timedelta(days=nights),
+                    "shift_days": shift_days,
+                    "available_quantity": available,
+                })
+        shifted_stays.sort(key=lambda stay: (abs(stay["shift_days"]), stay["shift_days"]))
+
+        return {"room_types": room_types[:params.limit], "shifted_stays": shifted_stays[:params.limit]}
 
-                rooms = await session.execute(query)
-            else:
-                query = select(
+    @classmethod
+    def _search_query(cls, params: SRoomsSearchParams):
+        all_rooms = cls._filter_room_types(select(RoomTypes.__table__.columns), params)
+
+        if params.check_in is None:
+            return cls._filter_room_types(
+                select(
                     RoomTypes.__table__.columns,
                     RoomTypes.total_quantity.label("available_quantity")
-                )
-                rooms = await session.execute(query)
-                # rooms = await session.execute(all_rooms)
+                ),
+                params,
+            )
+
+        all_rooms = all_rooms.cte("all_rooms")
+        daily = daily_reserved()
+
+        booked_rooms = select(daily.c.room_type_id, daily.c.reserved_quantity).where(
+            and_(
+                daily.c.room_type_id.in_(select(all_rooms.c.room_type_id)),
+                daily.c.date >= params.check_in,
+                daily.c.date < params.check_out
+            )
+        ).cte("booked_rooms")
+
+        max_reserved = select(
+            booked_rooms.c.room_type_id,
+            func.max(booked_rooms.c.reserved_quantity).label('max_reserved_quantity')
+        ).group_by(booked_rooms.c.room_type_id).cte("max_reserved")
+
+        return (
+            select(
+                all_rooms,
+                (
+                        all_rooms.c.total_quantity
+                        - func.coalesce(max_reserved.c.max_reserved_quantity, 0)
+                ).label("available_quantity"),
+            )
+            .select_from(all_rooms)
+            .join(
+                max_reserved,
+                max_reserved.c.room_type_id == all_rooms.c.room_type_id,
+                isouter=True,
+            )
+            .where(
+                all_rooms.c.total_quantity
+                - func.coalesce(max_reserved.c.max_reserved_quantity, 0) > 0
+            )
+        )
 
-            rooms = rooms.mappings().all()
-            return rooms
+    @classmethod
+    async def search(cls, params: SRoomsSearchParams, primary: bool = False):
+        if params.check_in is not None:
+            rooms = availability_index.search(params)
+            if rooms is not None:
+                return rooms
+
+        return await cls._read(cls._search_query(params), params.hotel_id, primary)
+
+    @staticmethod
+    async def _stream_shard(shard: Shard, query):
+        # Server-side cursor: rows arrive in partitions of STREAM_YIELD_PER,
+        # so memory stays flat regardless of the catalog size.
+        query = query.execution_options(yield_per=STREAM_YIELD_PER)
+        replica = replica_pool.pick() if shard.name == DEFAULT_SHARD else None
+        if replica is not None:
+            # Only a replica that fails before the first partition can be
+            # replaced; after that the client already has part of the body.
+            started = False
+            try:
+                async with replica.session_maker() as session:
+                    result = await session.stream(query)
+                    async for rows in result.mappings().partitions():
+                        started = True
+                        yield rows
+                return
+            except (DBAPIError, OSError) as exc:
+                if started:
+                    raise
+                replica_pool.mark_down(replica, exc)
+
+        async with shard.session_maker() as session:
+            result = await session.stream(query)
+            async for rows in result.mappings().partitions():
+                yield rows
 
     @classmethod
-    async def add_reservation(cls, params: SRoomsReservationParams):
-        async with async_session_maker() as session:
-            async with session.begin():
-                uuid_search = select(Operations.uuid).filter_by(uuid=params.uuid)
-                search_result = await session.scalar(uuid_search)
+    async def _stream(cls, query, hotel_id: str | None = None):
+        # Shards are streamed one after another so only one cursor is open at a time.
+        for shard in shard_router.targets(hotel_id):
+            async for rows in cls._stream_shard(shard, query):
+                yield rows
 
-                status = None
-                if search_result is not None:
-                    operation = select(Operations.status).where(
-                        Operations.uuid == params.uuid
-                    )
-                    status = (await session.execute(operation)).scalar_one_or_none()
-
-                    if status == "SUCCESS":
-                        return SInventoryOperationResult(
-                            status = "success",
-                            uuid = params.uuid,
-                            operation = 'RESERVE',
-                            room_type_id = params.room_type_id,
-                            check_in = params.check_in,
-                            check_out = params.check_out,
-                            massage = "operation was already completed",
-                        )
+    @classmethod
+    async def stream_all(cls):
+        async for rows in cls._stream(select(RoomTypes.__table__.columns)):
+            yield rows
 
-                total_quantity_query = select(RoomTypes.total_quantity).where(
-                    RoomTypes.room_type_id == params.room_type_id
-                )
-                total_quantity = (await session.execute(total_quantity_query)).scalar_one_or_none()
-                if total_quantity is None:
-                    raise RoomNotFoundException()
-
-                values = []
-                d = params.check_in
-                while d <= params.check_out:
-                    values.append({
-                        "room_type_id": params.room_type_id,
-                        "date": d,
-                        "reserved_quantity": 0,
-                    })
-                    d += timedelta(days=1)
-
-                if values:
-                    rows_add = pg_insert(InventoryDaily.__table__).values(values)
-                    rows_add = rows_add.on_conflict_do_nothing(
-                        index_elements=["room_type_id", "date"]
-                    )
-                    await session.execute(rows_add)
-                    await session.flush()
+    @classmethod
+    async def stream_search(cls, params: SRoomsSearchParams):
+        if params.check_in is not None:
+            rooms = availability_index.search(params)
+            if rooms is not None:
+                yield rooms
+                return
 
-                booked_rooms_query = (
-                    select(InventoryDaily.reserved_quantity)
-                    .where(
-                        and_(
-                            InventoryDaily.room_type_id == params.room_type_id,
-                            InventoryDaily.date >= params.check_in,
-                            InventoryDaily.date < params.check_out,
-                        )
-                    )
-                    .with_for_update()
-                )
+        async for rows in cls._stream(cls._search_query(params), params.hotel_id):
+            yield rows
 
-                booked_rows = await session.execute(booked_rooms_query)
-                reserved_quantities = booked_rows.scalars().all()
-
-                max_reserved_quantity = max(reserved_quantities) if reserved_quantities else 0
-                available_rooms = total_quantity - max_reserved_quantity
-
-                if available_rooms > 0:
-                    reserve = (
-                        update(InventoryDaily).where(
-                            and_(
-                                InventoryDaily.room_type_id == params.room_type_id,
-                                InventoryDaily.date >= params.check_in,
-                                InventoryDaily.date < params.check_out
-                            )
-                        ).values(reserved_quantity=InventoryDaily.reserved_quantity + 1)
-                    )
+    @classmethod
+    async def add_reservation(cls, params: SRoomsReservationParams):
+        async with shard_router.session_maker(params.hotel_id)() as session:
+            async with session.begin():
+                result = await cls._reserve(session, params)
+            change_listener.publish_committed(session)
+        if result.status == "failure":
+            raise OperationAddFailedException
+        return result
 
-                    if status == "FAILED":
-                        operations_update = (
-                                update(Operations).where(
-                                    Operations.uuid == params.uuid
-                                ).values(status="SUCCESS")
-                        )
-                        await session.execute(operations_update)
-                    elif search_result is None:
-                        new_operation = Operations(
-                            uuid=params.uuid,
-                            status="SUCCESS",
-                            operation_type="RESERVE",
-                            room_type_id=params.room_type_id,
-                            check_in=params.check_in,
-                            check_out=params.check_out,
-                        )
-                        session.add(new_operation)
-
-                    await session.execute(reserve)
-                    await session.commit()
-                    return SInventoryOperationResult(
-                        status="success",
-                        uuid=params.uuid,
-                        operation='RESERVE',
-                        room_type_id=params.room_type_id,
-                        check_in=params.check_in,
-                        check_out=params.check_out,
-                        massage="operation was successfully completed",
-                    )
+    @classmethod
+    async def add_reservation_group(cls, items: list[SRoomsReservationParams]):
+        # All items share hotel_id, room_type_id, check_in and check_out; see ReserveCoalescer.
+        async with shard_router.session_maker(items[0].hotel_id)() as session:
+            async with session.begin():
+                if settings.RESERVATION_MODE == "session":
+                    results = await cls._reserve_group_in_session(session, items)
                 else:
-                    if status == "FAILED":
-                        raise OperationAddFailedException
-                    elif search_result is None:
-                        new_operation = Operations(
-                            uuid=params.uuid,
-                            status="FAILED",
-                            operation_type="RESERVE",
-                            room_type_id=params.room_type_id,
-                            check_in=params.check_in,
-                            check_out=params.check_out,
-                        )
-                        session.add(new_operation)
-                        await session.commit()
-                        raise OperationAddFailedException
-
+                    # The first call locks the range; the others reuse the transaction's locks.
+                    results = []
+                    for params in items:
+                        try:
+                            results.append(await cls._reserve(session, params))
+                        except OperationExpiredException as exc:
+                            results.append(exc)
+            change_listener.publish_committed(session)
+        # An item is a result, or the exception its own request should raise.
+        return results
 
     @classmethod
     async def del_reservation(cls, params: SRoomsReservationParams):
-        async with async_session_maker() as session:
+        async with shard_router.session_maker(params.hotel_id)() as session:
             async with session.begin():
-                uuid_search = select(Operations.uuid).filter_by(uuid=params.uuid)
-                search_result = await session.scalar(uuid_search)
+                result = await cls._release(session, params)
+            change_listener.publish_committed(session)
+        if result.status == "failure":
+            raise OperationDelFailedException
+        return result
 
-                status = None
-                if search_result is not None:
-                    operation = select(Operations.status).where(
-                        Operations.uuid == params.uuid
-                    )
-                    status = (await session.execute(operation)).scalar_one_or_none()
-
-                    if status == "SUCCESS":
-                        return SInventoryOperationResult(
-                            status="success",
-                            uuid=params.uuid,
-                            operation='RESERVE',
-                            room_type_id=params.room_type_id,
-                            check_in=params.check_in,
-                            check_out=params.check_out,
-                            massage="operation was already completed",
+    @classmethod
+    async def add_reservations(cls, items: list[SRoomsReservationParams], atomic: bool):
+        return await cls._run_batch(items, cls._reserve, "RESERVE", atomic)
+
+    @classmethod
+    async def del_reservations(cls, items: list[SRoomsReservationParams], atomic: bool):
+        return await cls._run_batch(items, cls._release, "RELEASE", atomic)
+
+    @classmethod
+    async def _run_batch(cls, items: list[SRoomsReservationParams], apply, operation: str, atomic: bool):
+        # One transaction per shard, run concurrently. There is no distributed
+        # commit, so an all_or_nothing batch must stay within one shard.
+        by_shard: dict[str, list[int]] = {}
+        for i, params in enumerate(items):
+            by_shard.setdefault(shard_router.shard(params.hotel_id).name, []).append(i)
+        if atomic and len(by_shard) > 1:
+            raise OperationBatchCrossShardException()
+
+        results: list[SInventoryOperationResult | None] = [None] * len(items)
+        await asyncio.gather(*(
+            cls._run_batch_in_shard(shard_router.shards[name], items, indexes, results, apply, operation, atomic)
+            for name, indexes in by_shard.items()
+        ))
+        return results
+
+    @classmethod
+    async def _run_batch_in_shard(cls, shard: Shard, items: list[SRoomsReservationParams], indexes: list[int],
+                                  results: list, apply, operation: str, atomic: bool):
+        # Items are applied in (room_type_id, check_in) order so that every batch
+        # takes inventory_daily row locks in the same global order and cannot deadlock.
+        order = sorted(
+            indexes,
+            key=lambda i: (items[i].room_type_id, items[i].check_in, items[i].check_out),
+        )
+
+        failed = []
+        async with shard.session_maker() as session:
+            async with session.begin():
+                for i in order:
+                    params = items[i]
+                    try:
+                        # A savepoint per item, also in all_or_nothing mode: a statement
+                        # the database rejects only undoes its own item, so every item
+                        # is still evaluated and all failures can be reported.
+                        async with session.begin_nested():
+                            results[i] = await apply(session, params)
+                    except RoomNotFoundException:
+                        results[i] = cls._operation_result(params, operation, "failure", "room type not found")
+                    except OperationExpiredException:
+                        results[i] = cls._operation_result(
+                            params, operation, "failure", "operation expired, retry with a new uuid"
                         )
+                    except IntegrityError as exc:
+                        # E.g. the FAILED operations row of an unknown room type hits its
+                        # foreign key. Only this item's savepoint is rolled back.
+                        if getattr(exc.orig, "sqlstate", None) == FOREIGN_KEY_VIOLATION:
+                            massage = "room type not found"
+                        else:
+                            massage = "operation failed, conflicting data"
+                        results[i] = cls._operation_result(params, operation, "failure", massage)
+
+                    if results[i].status == "failure":
+                        failed.append(i)
+
+                # Raising rolls back the whole transaction, successful items included.
+                if atomic and failed:
+                    raise OperationBatchFailedException([items[i].uuid for i in sorted(failed)])
+            change_listener.publish_committed(session)
+
+    @classmethod
+    async def _reserve(cls, session, params: SRoomsReservationParams) -> SInventoryOperationResult:
+        if settings.RESERVATION_MODE == "function":
+            return await cls._call_operation_function(session, "inventory_reserve", "RESERVE", params)
+        if settings.RESERVATION_MODE == "ledger":
+            return await cls._apply_in_ledger(session, params, "RESERVE")
+        return await cls._reserve_in_session(session, params)
 
-                total_quantity = select(RoomTypes.total_quantity).where(
-                    RoomTypes.room_type_id == params.room_type_id
+    @classmethod
+    async def _release(cls, session, params: SRoomsReservationParams) -> SInventoryOperationResult:
+        if settings.RESERVATION_MODE == "function":
+            return await cls._call_operation_function(session, "inventory_release", "RELEASE", params)
+        if settings.RESERVATION_MODE == "ledger":
+            return await cls._apply_in_ledger(session, params, "RELEASE")
+        return await cls._release_in_session(session, params)
+
+    @staticmethod
+    def _operation_result(params: SRoomsReservationParams, operation: str, status: str, massage: str,
+                          quantity: int | None = None):
+        return SInventoryOperationResult(
+            status=status,
+            uuid=params.uuid,
+            operation=operation,
+            room_type_id=params.room_type_id,
+            check_in=params.check_in,
+            check_out=params.check_out,
+            quantity=params.quantity if quantity is None else quantity,
+            massage=massage,
+        )
+
+    @classmethod
+    async def _call_operation_function(cls, session, function_name: str, operation: str, params: SRoomsReservationParams):
+        # Idempotency check, availability check, update and operation logging
+        # run server-side in one statement, so row locks are held for a single round trip.
+        call = getattr(func, function_name)(
+            params.uuid, params.room_type_id, params.check_in, params.check_out, params.quantity
+        ).table_valued("outcome", "op_quantity")
+        outcome, quantity = (await session.execute(select(call.c.outcome, call.c.op_quantity))).one()
+        if outcome == "NOT_FOUND":
+            raise RoomNotFoundException()
+        if outcome == "EXPIRED":
+            raise OperationExpiredException()
+        if outcome == "COMPLETED":
+            return cls._operation_result(params, operation, "success", "operation was already completed", quantity)
+        if outcome == "SUCCESS":
+            # The function sends the NOTIFY itself.
+            record_inventory_change(session, params.room_type_id, params.check_in, params.check_out)
+            return cls._operation_result(params, operation, "success", "operation was successfully completed")
+        if operation == "RESERVE":
+            return cls._operation_result(params, operation, "failure", "operation failed, no available rooms")
+        return cls._operation_result(params, operation, "failure", "operation failed, no rooms to release")
+
+    @staticmethod
+    async def _lock_operations(session, uuids):
+        # The same per-uuid lock as inventory_reserve/_release, so concurrent
+        # retries of one uuid are applied one after another.
+        for uuid in sorted(set(uuids), key=str):
+            await session.execute(select(func.pg_advisory_xact_lock(func.hashtextextended(str(uuid), 0))))
+
+    @staticmethod
+    def _operations_query(keys: dict):
+        # created_at of the keys prunes the lookup to the partitions holding them.
+        return select(Operations.uuid, Operations.created_at, Operations.status, Operations.quantity).where(
+            Operations.uuid.in_(keys.keys()),
+            Operations.created_at.in_(set(keys.values())),
+        )
+
+    @classmethod
+    async def _find_operations(cls, session, uuids) -> dict:
+        # operations_uuid keeps every recorded uuid with the created_at of its
+        # operation. A key without a row was retired with its partition and
+        # maps to None; unknown uuids are left out.
+        keys = dict((await session.execute(
+            select(OperationsUuid.uuid, OperationsUuid.created_at).where(OperationsUuid.uuid.in_(set(uuids)))
+        )).all())
+        if not keys:
+            return {}
+        found = {row.uuid: row for row in await session.execute(cls._operations_query(keys))}
+        return {uuid: found.get(uuid) for uuid in keys}
+
+    @classmethod
+    async def _find_operation(cls, session, params: SRoomsReservationParams):
+        found = await cls._find_operations(session, [params.uuid])
+        if params.uuid in found and found[params.uuid] is None:
+            raise OperationExpiredException()
+        return found.get(params.uuid)
+
+    @staticmethod
+    def _locked_range_query(params: SRoomsReservationParams):
+        return (
+            select(InventoryDaily.reserved_quantity)
+            .where(
+                and_(
+                    InventoryDaily.room_type_id == params.room_type_id,
+                    InventoryDaily.date >= params.check_in,
+                    InventoryDaily.date < params.check_out,
                 )
+            )
+            .order_by(InventoryDaily.date)
+            .with_for_update()
+        )
 
-                booked_rooms = select(InventoryDaily.__table__.columns).where(
+    @classmethod
+    async def _reserve_in_session(cls, session, params: SRoomsReservationParams) -> SInventoryOperationResult:
+        await cls._lock_operations(session, [params.uuid])
+        operation = await cls._find_operation(session, params)
+        status = operation.status if operation is not None else None
+
+        if status == "SUCCESS":
+            return cls._operation_result(params, "RESERVE", "success", "operation was already completed", operation.quantity)
+
+        total_quantity_query = select(RoomTypes.total_quantity).where(
+            RoomTypes.room_type_id == params.room_type_id
+        )
+        total_quantity = (await session.execute(total_quantity_query)).scalar_one_or_none()
+        if total_quantity is None:
+            raise RoomNotFoundException()
+
+        booked_rooms_query = cls._locked_range_query(params)
+
+        # Calendar rows are normally pre-created by the materializer, so lock first
+        # and only upsert when some nights of the range are missing.
+        reserved_quantities = (await session.execute(booked_rooms_query)).scalars().all()
+        if len(reserved_quantities) < (params.check_out - params.check_in).days:
+            await session.execute(insert_calendar_rows(params.check_in, params.check_out, params.room_type_id))
+            reserved_quantities = (await session.execute(booked_rooms_query)).scalars().all()
+
+        max_reserved_quantity = max(reserved_quantities) if reserved_quantities else 0
+        available_rooms = total_quantity - max_reserved_quantity
+
+        if available_rooms >= params.quantity:
+            reserve = (
+                update(InventoryDaily).where(
                     and_(
                         InventoryDaily.room_type_id == params.room_type_id,
                         InventoryDaily.date >= params.check_in,
                         InventoryDaily.date < params.check_out
                     )
-                ).cte("booked_rooms")
+                ).values(reserved_quantity=InventoryDaily.reserved_quantity + params.quantity)
+            )
+            await cls._record_operation(session, params, "RESERVE", operation, "SUCCESS")
+            await session.execute(reserve)
+            await notify_inventory_changed(session, params.room_type_id, params.check_in, params.check_out)
+            return cls._operation_result(params, "RESERVE", "success", "operation was successfully completed")
 
-                min_reserved = select(
-                    func.coalesce(func.min(booked_rooms.c.reserved_quantity).label('min_reserved_quantity'), 0)
-                )
+        await cls._record_operation(session, params, "RESERVE", operation, "FAILED")
+        return cls._operation_result(params, "RESERVE", "failure", "operation failed, no available rooms")
 
-                min_reserved_num = (await session.execute(min_reserved)).scalar_one_or_none()
-
-                if min_reserved_num > 0:
-                    release = (
-                        update(InventoryDaily).where(
-                            and_(
-                                InventoryDaily.room_type_id == params.room_type_id,
-                                InventoryDaily.date >= params.check_in,
-                                InventoryDaily.date < params.check_out
-                            )
-                        ).values(reserved_quantity=InventoryDaily.reserved_quantity - 1)
+    @classmethod
+    async def _reserve_group_in_session(cls, session, items: list[SRoomsReservationParams]) -> list[SInventoryOperationResult]:
+        first = items[0]
+        await cls._lock_operations(session, [params.uuid for params in items])
+        found = await cls._find_operations(session, [params.uuid for params in items])
+        expired = {uuid for uuid, operation in found.items() if operation is None}
+        recorded = {
+            uuid: (operation.status, operation.quantity) for uuid, operation in found.items() if operation is not None
+        }
+
+        total_quantity_query = select(RoomTypes.total_quantity).where(
+            RoomTypes.room_type_id == first.room_type_id
+        )
+        total_quantity = (await session.execute(total_quantity_query)).scalar_one_or_none()
+        if total_quantity is None:
+            raise RoomNotFoundException()
+
+        booked_rooms_query = cls._locked_range_query(first)
+        reserved_quantities = (await session.execute(booked_rooms_query)).scalars().all()
+        if len(reserved_quantities) < (first.check_out - first.check_in).days:
+            await session.execute(insert_calendar_rows(first.check_in, first.check_out, first.room_type_id))
+            reserved_quantities = (await session.execute(booked_rooms_query)).scalars().all()
+
+        available_rooms = total_quantity - (max(reserved_quantities) if reserved_quantities else 0)
+
+        # Granting in arrival order against one lock gives the same outcome as
+        # running the requests one after another.
+        results = []
+        granted = 0
+        new_operations: dict = {}
+        changed_operations: dict = {}
+        for params in items:
+            if params.uuid in expired:
+                results.append(OperationExpiredException())
+                continue
+            previous = recorded.get(params.uuid)
+            if previous is not None and previous[0] == "SUCCESS":
+                results.append(cls._operation_result(
+                    params, "RESERVE", "success", "operation was already completed", previous[1]
+                ))
+                continue
+
+            if available_rooms - granted >= params.quantity:
+                granted += params.quantity
+                status = "SUCCESS"
+                results.append(cls._operation_result(params, "RESERVE", "success", "operation was successfully completed"))
+            else:
+                status = "FAILED"
+                results.append(cls._operation_result(params, "RESERVE", "failure", "operation failed, no available rooms"))
+
+            if params.uuid in new_operations:
+                new_operations[params.uuid].status = status
+                new_operations[params.uuid].quantity = params.quantity
+            elif previous is None:
+                new_operations[params.uuid] = Operations(
+                    uuid=params.uuid,
+                    status=status,
+                    operation_type="RESERVE",
+                    room_type_id=params.room_type_id,
+                    check_in=params.check_in,
+                    check_out=params.check_out,
+                    quantity=params.quantity,
+                )
+            elif previous[0] != status:
+                changed_operations[params.uuid] = (status, params.quantity)
+            recorded[params.uuid] = (status, params.quantity)
+
+        session.add_all(new_operations.values())
+        await session.flush()
+        for uuid, (status, quantity) in changed_operations.items():
+            await session.execute(
+                update(Operations)
+                .where(Operations.uuid == uuid, Operations.created_at == found[uuid].created_at)
+                .values(status=status, quantity=quantity)
+            )
+
+        if granted > 0:
+            reserve = (
+                update(InventoryDaily).where(
+                    and_(
+                        InventoryDaily.room_type_id == first.room_type_id,
+                        InventoryDaily.date >= first.check_in,
+                        InventoryDaily.date < first.check_out
                     )
-                    if status == "FAILED":
-                        operations_update = (
-                            update(Operations).where(
-                                Operations.uuid == params.uuid
-                            ).values(status="SUCCESS")
-                        )
-                        await session.execute(operations_update)
-                    elif search_result is None:
-                        new_operation = Operations(uuid=params.uuid, status="SUCCESS", operation_type="RELEASE",
-                                                   room_type_id=params.room_type_id, check_in=params.check_in,
-                                                   check_out=params.check_out)
-                        session.add(new_operation)
-                    await session.execute(release)
-                    await session.commit()
-                    return SInventoryOperationResult(
-                        status="success",
-                        uuid=params.uuid,
-                        operation='RESERVE',
-                        room_type_id=params.room_type_id,
-                        check_in=params.check_in,
-                        check_out=params.check_out,
-                        massage="operation was successfully completed",
+                ).values(reserved_quantity=InventoryDaily.reserved_quantity + granted)
+            )
+            await session.execute(reserve)
+            await notify_inventory_changed(session, first.room_type_id, first.check_in, first.check_out)
+        return results
+
+    @classmethod
+    async def _release_in_session(cls, session, params: SRoomsReservationParams) -> SInventoryOperationResult:
+        await cls._lock_operations(session, [params.uuid])
+        operation = await cls._find_operation(session, params)
+        status = operation.status if operation is not None else None
+
+        if status == "SUCCESS":
+            return cls._operation_result(params, "RELEASE", "success", "operation was already completed", operation.quantity)
+
+        reserved_quantities = (await session.execute(cls._locked_range_query(params))).scalars().all()
+        min_reserved_num = min(reserved_quantities) if reserved_quantities else 0
+
+        if min_reserved_num >= params.quantity:
+            release = (
+                update(InventoryDaily).where(
+                    and_(
+                        InventoryDaily.room_type_id == params.room_type_id,
+                        InventoryDaily.date >= params.check_in,
+                        InventoryDaily.date < params.check_out
                     )
-                else:
-                    if status == "FAILED":
-                        raise OperationDelFailedException
-                    elif search_result is None:
-                        new_operation = Operations(uuid=params.uuid, status="FAILED", operation_type="RELEASE",
-                                                   room_type_id=params.room_type_id, check_in=params.check_in,
-                                                   check_out=params.check_out)
-                        session.add(new_operation)
-                        await session.commit()
-                        raise OperationDelFailedException
+                ).values(reserved_quantity=InventoryDaily.reserved_quantity - params.quantity)
+            )
+            await cls._record_operation(session, params, "RELEASE", operation, "SUCCESS")
+            await session.execute(release)
+            await notify_inventory_changed(session, params.room_type_id, params.check_in, params.check_out)
+            return cls._operation_result(params, "RELEASE", "success", "operation was successfully completed")
+
+        await cls._record_operation(session, params, "RELEASE", operation, "FAILED")
+        return cls._operation_result(params, "RELEASE", "failure", "operation failed, no rooms to release")
+
+    @classmethod
+    async def _apply_in_ledger(cls, session, params: SRoomsReservationParams, operation: str) -> SInventoryOperationResult:
+        await cls._lock_operations(session, [params.uuid])
+        previous = await cls._find_operation(session, params)
+        status = previous.status if previous is not None else None
+
+        if status == "SUCCESS":
+            return cls._operation_result(params, operation, "success", "operation was already completed", previous.quantity)
+
+        total_quantity = (await session.execute(
+            select(RoomTypes.total_quantity).where(RoomTypes.room_type_id == params.room_type_id)
+        )).scalar_one_or_none()
+        if total_quantity is None:
+            if operation == "RESERVE":
+                raise RoomNotFoundException()
+            applied = False
+        else:
+            delta = params.quantity if operation == "RESERVE" else -params.quantity
+            applied = await apply_ledger_delta(
+                session, params.room_type_id, params.check_in, params.check_out, delta, total_quantity
+            )
+
+        if applied:
+            await cls._record_operation(session, params, operation, previous, "SUCCESS")
+            await notify_inventory_changed(session, params.room_type_id, params.check_in, params.check_out)
+            return cls._operation_result(params, operation, "success", "operation was successfully completed")
+
+        await cls._record_operation(session, params, operation, previous, "FAILED")
+        if operation == "RESERVE":
+            return cls._operation_result(params, operation, "failure", "operation failed, no available rooms")
+        return cls._operation_result(params, operation, "failure", "operation failed, no rooms to release")
+
+    @staticmethod
+    async def _record_operation(session, params: SRoomsReservationParams, operation: str, previous, status: str):
+        # previous is the row found by _find_operation, or None for a new uuid.
+        if previous is None:
+            session.add(Operations(
+                uuid=params.uuid,
+                status=status,
+                operation_type=operation,
+                room_type_id=params.room_type_id,
+                check_in=params.check_in,
+                check_out=params.check_out,
+                quantity=params.quantity,
+            ))
+            await session.flush()
+        elif previous.status != status:
+            await session.execute(
+                update(Operations)
+                .where(Operations.uuid == params.uuid, Operations.created_at == previous.created_at)
+                .values(status=status, quantity=params.quantity)
+            )
@@ -1,8 +1,23 @@
-from fastapi import APIRouter
+import json
+from typing import Literal
+
+from datetime import date
+
+from fastapi import APIRouter, Header, Query, Response, status
 from fastapi.params import Depends
+from fastapi.responses import StreamingResponse
+
+from app.exceptions import RoomNotFoundException
+from app.rooms.admission import admission
+from app.rooms.catalog import CatalogEntry, room_catalog
+from app.rooms.coalescer import reserve_coalescer
+from app.rooms.search_cache import search_cache
+from app.shards import shard_router
 
 from app.rooms.repository import RoomDAO
-from app.rooms.schemas import SRooms, SRoomsSearchParams, SRoomsAvailability, SRoomsReservationParams
+from app.rooms.schemas import SRooms, SRoomsSearchParams, SRoomsAvailability, SRoomsReservationParams, \
+    SRoomsReservationBatch, SInventoryOperationResult, SRoomCalendar, SRoomsFlexibleSearchParams, \
+    SRoomsFlexibleAvailability, SRoomsAlternativesParams, SRoomsAlternatives
 
 
 router = APIRouter(
@@ -11,26 +26,120 @@ router = APIRouter(
 )
 
 
-@router.get("")
-async def get_rooms() -> list[SRooms]:
-    return await RoomDAO.find_all()
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Shown in the OpenAPI contract; the handlers return these bodies themselves.
+NDJSON_RESPONSE = {200: {"content": {NDJSON_MEDIA_TYPE: {"schema": {"type": "string"}}}}}
+NOT_MODIFIED_RESPONSE = {304: {"description": "Not Modified: the ETag matches If-None-Match"}}
+
+
+def _wants_ndjson(accept: str | None) -> bool:
+    return accept is not None and NDJSON_MEDIA_TYPE in accept
+
+
+async def _ndjson(partitions):
+    async for rows in partitions:
+        yield "".join(json.dumps(dict(row)) + "\n" for row in rows)
+
+
+def _catalog_response(entry: CatalogEntry, if_none_match: str | None) -> Response:
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if "*" in tags or entry.etag in tags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+async def _with_hotels(items: list[SRoomsReservationParams]) -> list[SRoomsReservationParams]:
+    # A write without hotel_id goes to the shard of its room type's hotel. Unknown
+    # room types keep hotel_id None and fail as "not found" on the default shard.
+    missing = {params.room_type_id for params in items if params.hotel_id is None}
+    if not missing or not shard_router.sharded:
+        return items
+    hotels = await room_catalog.hotels_of(missing)
+    return [
+        params.copy(update={"hotel_id": hotels[params.room_type_id]})
+        if params.hotel_id is None and params.room_type_id in hotels else params
+        for params in items
+    ]
 
 
-@router.get("/search")
-async def search(params: SRoomsSearchParams = Depends()) -> list[SRoomsAvailability]:
-    return await RoomDAO.search(params)
+@router.get("", responses={**NDJSON_RESPONSE, **NOT_MODIFIED_RESPONSE})
+async def get_rooms(
+    accept: str | None = Header(None),
+    if_none_match: str | None = Header(None),
+) -> list[SRooms]:
+    if _wants_ndjson(accept):
+        return StreamingResponse(_ndjson(RoomDAO.stream_all()), media_type=NDJSON_MEDIA_TYPE)
+    return _catalog_response(await room_catalog.rooms(), if_none_match)
+
+
+@router.get("/search", responses=NDJSON_RESPONSE)
+async def search(
+    params: SRoomsSearchParams = Depends(),
+    accept: str | None = Header(None),
+) -> list[SRoomsAvailability]:
+    if _wants_ndjson(accept):
+        return StreamingResponse(_ndjson(RoomDAO.stream_search(params)), media_type=NDJSON_MEDIA_TYPE)
+    return await search_cache.search(params)
+
+
+@router.get("/search/flexible")
+async def search_flexible(params: SRoomsFlexibleSearchParams = Depends()) -> list[SRoomsFlexibleAvailability]:
+    return await RoomDAO.search_flexible(params)
+
+
+@router.get("/alternatives")
+async def alternatives(params: SRoomsAlternativesParams = Depends()) -> SRoomsAlternatives:
+    return await RoomDAO.alternatives(params)
 
 
 @router.post("/reserve")
 async def reserve(params: SRoomsReservationParams):
-    return await RoomDAO.add_reservation(params)
+    # Admission happens in the coalescer, once per committed group.
+    [params] = await _with_hotels([params])
+    return await reserve_coalescer.reserve(params)
 
 
 @router.post("/release")
 async def release(params: SRoomsReservationParams):
-    return await RoomDAO.del_reservation(params)
+    async with admission.slot(params.room_type_id):
+        [params] = await _with_hotels([params])
+        return await RoomDAO.del_reservation(params)
+
+
+@router.post("/reserve/batch")
+async def reserve_batch(
+    params: SRoomsReservationBatch,
+    mode: Literal["all_or_nothing", "best_effort"] = "all_or_nothing",
+) -> list[SInventoryOperationResult]:
+    async with admission.slots(item.room_type_id for item in params):
+        return await RoomDAO.add_reservations(await _with_hotels(params), atomic=mode == "all_or_nothing")
+
+
+@router.post("/release/batch")
+async def release_batch(
+    params: SRoomsReservationBatch,
+    mode: Literal["all_or_nothing", "best_effort"] = "all_or_nothing",
+) -> list[SInventoryOperationResult]:
+    async with admission.slots(item.room_type_id for item in params):
+        return await RoomDAO.del_reservations(await _with_hotels(params), atomic=mode == "all_or_nothing")
+
+
+@router.get("/{room_type_id}/calendar")
+async def get_room_calendar(
+    room_type_id: str,
+    date_from: date = Query(alias="from"),
+    date_to: date = Query(alias="to"),
+    hotel_id: str | None = None,
+) -> SRoomCalendar:
+    return await RoomDAO.calendar(room_type_id, date_from, date_to, hotel_id)
 
 
-@router.get("/{room_type_id}")
-async def get_rooms_by_id(room_type_id: str) -> list[SRooms]:
-    return await RoomDAO.find_by_room_type_id(room_type_id)
\ No newline at end of file
+@router.get("/{room_type_id}", responses=NOT_MODIFIED_RESPONSE)
+async def get_rooms_by_id(room_type_id: str, if_none_match: str | None = Header(None)) -> list[SRooms]:
+    entry = await room_catalog.room(room_type_id)
+    if entry is None:
+        raise RoomNotFoundException
+    return _catalog_response(entry, if_none_match)
\ No newline at end of file
@@ -1,13 +1,15 @@
-from pydantic import BaseModel, root_validator
-from datetime import date
+from pydantic import BaseModel, Field, conlist, root_validator
+from datetime import date, timedelta
 from uuid import UUID
 from typing import Literal
 
-from app.exceptions import RoomsValidationPriceException, RoomsValidationDateException
+from app.exceptions import RoomsValidationPriceException, RoomsValidationDateException, \
+    RoomsValidationFlexibleDateException, RoomsValidationAlternativesException
 
 
 class SRooms(BaseModel):
     room_type_id: str
+    hotel_id: str
     name: str
     capacity_adults: int
     price: int
@@ -22,6 +24,7 @@ class SRoomsAvailability(SRooms):
 
 
 class SRoomsSearchParams(BaseModel):
+    hotel_id: str | None = None
     room_type_id: str | None = None
     name: str | None = None
     adults: int | None = None
@@ -43,11 +46,97 @@ class SRoomsSearchParams(BaseModel):
         return values
 
 
+class SRoomsFlexibleSearchParams(BaseModel):
+    hotel_id: str | None = None
+    room_type_id: str | None = None
+    name: str | None = None
+    adults: int | None = None
+    min_price: int | None = None
+    max_price: int | None = None
+    date_from: date
+    date_to: date
+    nights: int
+
+    @root_validator
+    def check_price_and_window(cls, values):
+        if (values.get('min_price') is None) != (values.get('max_price') is None):
+            raise RoomsValidationPriceException()
+        date_from = values.get('date_from')
+        date_to = values.get('date_to')
+        nights = values.get('nights')
+        if date_from is None or date_to is None or nights is None:
+            return values
+        if nights < 1 or date_from + timedelta(days=nights) > date_to or date_to > date_from + timedelta(days=366):
+            raise RoomsValidationFlexibleDateException()
+        return values
+
+
+class SRoomsFlexibleAvailability(SRooms):
+    # Parallel arrays: a stay of `nights` starting at check_in[i] has
+    # available_quantity[i] rooms free.
+    check_in: list[date]
+    available_quantity: list[int]
+
+
+class SRoomsAlternativesParams(BaseModel):
+    hotel_id: str | None = None
+    room_type_id: str
+    check_in: date
+    check_out: date
+    quantity: int = 1
+    max_shift_days: int = 7
+    limit: int = 5
+
+    @root_validator
+    def check_stay_and_limits(cls, values):
+        check_in = values.get('check_in')
+        check_out = values.get('check_out')
+        if check_in is None or check_out is None:
+            return values
+        if not check_in < check_out <= check_in + timedelta(days=366):
+            raise RoomsValidationAlternativesException()
+        if values.get('quantity', 1) < 1 or values.get('limit', 5) < 1 \
+                or not 0 <= values.get('max_shift_days', 7) <= 30:
+            raise RoomsValidationAlternativesException()
+        return values
+
+
+class SRoomsShiftedStay(BaseModel):
+    check_in: date
+    check_out: date
+    shift_days: int
+    available_quantity: int
+
+
+class SRoomsAlternatives(BaseModel):
+    # Other room types for the same dates, closest price first.
+    room_types: list[SRoomsAvailability]
+    # The requested room type on shifted dates, smallest shift first.
+    shifted_stays: list[SRoomsShiftedStay]
+
+
 class SRoomsReservationParams(BaseModel):
     uuid: UUID
+    # Picks the shard; omitted means the shard of the room type's hotel.
+    hotel_id: str | None = None
     room_type_id: str
     check_in: date
     check_out: date
+    quantity: int = Field(1, gt=0)
+
+
+class SRoomCalendar(BaseModel):
+    room_type_id: str
+    date_from: date
+    date_to: date
+    total_quantity: int
+    # Run-length encoded availability for [date_from, date_to):
+    # available_quantity[i] rooms are free for run_length[i] consecutive days.
+    available_quantity: list[int]
+    run_length: list[int]
+
+
+SRoomsReservationBatch = conlist(SRoomsReservationParams, min_items=1, max_items=1000)
 
 
 class SInventoryOperationResult(BaseModel):
@@ -57,6 +146,21 @@ class SInventoryOperationResult(BaseModel):
     room_type_id: str
     check_in: date
     check_out: date
+    quantity: int = 1
     massage: str | None = None
 
 
+
+
+class SImportError(BaseModel):
+    file: Literal['room_types', 'inventory']
+    # 1-based CSV line (the header is line 1); None for errors found after merging.
+    line: int | None = None
+    message: str
+
+
+class SImportReport(BaseModel):
+    hotel_id: str
+    room_types: int = 0
+    inventory_rows: int = 0
+    errors: list[SImportError] = []
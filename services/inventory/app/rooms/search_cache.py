@@ -0,0 +1,133 @@
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import date
+
+from app.config import settings
+from app.metrics import metrics
+from app.notifications import change_listener, parse_inventory_payload
+from app.rooms.availability import matches_filters
+from app.rooms.catalog import room_catalog
+from app.rooms.repository import RoomDAO
+from app.rooms.schemas import SRoomsSearchParams
+
+
+search_cache_hits = metrics.counter("search_cache_hits_total", "Searches answered from the search cache.")
+search_cache_misses = metrics.counter("search_cache_misses_total", "Searches that went to the index or database.")
+search_cache_evictions = metrics.counter("search_cache_evictions_total", "Entries dropped to stay within SEARCH_CACHE_SIZE.")
+search_cache_invalidations = metrics.counter(
+    "search_cache_invalidations_total", "Entries dropped because inventory or the catalog changed."
+)
+search_cache_rejected_fills = metrics.counter(
+    "search_cache_rejected_fills_total", "Results not cached because a concurrent change may have affected them."
+)
+
+
+@dataclass(frozen=True)
+class _Entry:
+    rooms: list
+    room_type_ids: frozenset[str]
+    check_in: date | None
+    check_out: date | None
+
+
+@dataclass(frozen=True)
+class _Change:
+    # room_type_id None means "everything" (catalog change or lost notifications).
+    room_type_id: str | None
+    check_in: date | None = None
+    check_out: date | None = None
+
+    def affects(self, entry: _Entry) -> bool:
+        if self.room_type_id is None:
+            return True
+        if entry.check_in is None or self.room_type_id not in entry.room_type_ids:
+            return False
+        return entry.check_in < self.check_out and self.check_in < entry.check_out
+
+
+class SearchCache:
+    """Bounded LRU cache of ``RoomDAO.search`` results keyed on the normalized params.
+
+    Each entry remembers which room types its filters match (whether or not
+    they had availability) and its date range, so an ``inventory_changed``
+    notification evicts only entries it could have changed. Every change bumps
+    ``version`` and is kept in a short log; a result computed while a relevant
+    change arrived is returned but not stored. The cache is bypassed while the
+    change listener is disconnected.
+    """
+
+    def __init__(self, maxsize: int, log_size: int = 4096):
+        self.maxsize = maxsize
+        self.version = 0
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._changes: deque[_Change] = deque(maxlen=log_size)
+
+    @staticmethod
+    def key(params: SRoomsSearchParams) -> tuple:
+        return tuple(params.dict().items())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def invalidate(self, payload: str | None):
+        if payload is None:
+            change = _Change(None)
+        else:
+            change = _Change(*parse_inventory_payload(payload))
+        self.version += 1
+        self._changes.append(change)
+
+        stale = [key for key, entry in self._entries.items() if change.affects(entry)]
+        for key in stale:
+            del self._entries[key]
+        search_cache_invalidations.inc(len(stale))
+
+    def invalidate_all(self, payload: str | None = None):
+        self.invalidate(None)
+
+    def _changed_since(self, version: int, entry: _Entry) -> bool:
+        missed = self.version - version
+        if missed == 0:
+            return False
+        if missed > len(self._changes):
+            return True
+        return any(change.affects(entry) for change in list(self._changes)[-missed:])
+
+    async def search(self, params: SRoomsSearchParams):
+        if self.maxsize <= 0 or not change_listener.connected:
+            return await RoomDAO.search(params)
+
+        key = self.key(params)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            search_cache_hits.inc()
+            return entry.rooms
+        search_cache_misses.inc()
+
+        version = self.version
+        rooms = await RoomDAO.search(params, primary=True)
+        room_type_ids = frozenset(
+            room["room_type_id"] for room in await room_catalog.room_types() if matches_filters(room, params)
+        )
+        entry = _Entry(rooms, room_type_ids, params.check_in, params.check_out)
+        if self._changed_since(version, entry):
+            search_cache_rejected_fills.inc()
+            return rooms
+
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            search_cache_evictions.inc()
+        return rooms
+
+
+search_cache = SearchCache(settings.SEARCH_CACHE_SIZE)
+
+metrics.gauge("search_cache_entries", "Entries currently in the search cache.", lambda: len(search_cache))
+metrics.gauge(
+    "search_cache_hit_ratio",
+    "Share of cached-mode searches answered from the cache since start.",
+    lambda: search_cache_hits.total() / max(search_cache_hits.total() + search_cache_misses.total(), 1),
+)
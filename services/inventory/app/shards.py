@@ -0,0 +1,63 @@
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.database import engine, async_session_maker
+
+
+DEFAULT_SHARD = "default"
+
+T = TypeVar("T")
+
+
+class Shard:
+    def __init__(self, name: str, engine: AsyncEngine, session_maker: sessionmaker):
+        self.name = name
+        self.engine = engine
+        self.session_maker = session_maker
+
+
+class ShardRouter:
+    """Maps hotels to databases.
+
+    Every shard carries the full schema. A hotel lives in exactly one shard:
+    the one ``hotel_shards`` names, or the default shard (the ``DB_*``
+    database) otherwise. ``room_type_id`` stays unique across all shards,
+    because caches and notifications are keyed on it alone.
+    """
+
+    def __init__(self, urls: dict[str, str], hotel_shards: dict[str, str]):
+        self.shards = {DEFAULT_SHARD: Shard(DEFAULT_SHARD, engine, async_session_maker)}
+        for name, url in urls.items():
+            if name != DEFAULT_SHARD:
+                shard_engine = create_async_engine(url)
+                self.shards[name] = Shard(
+                    name, shard_engine, sessionmaker(shard_engine, class_=AsyncSession, expire_on_commit=False)
+                )
+        self.hotel_shards = hotel_shards
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.shards) > 1
+
+    def shard(self, hotel_id: str | None) -> Shard:
+        return self.shards[self.hotel_shards.get(hotel_id, DEFAULT_SHARD)]
+
+    def session_maker(self, hotel_id: str | None) -> sessionmaker:
+        return self.shard(hotel_id).session_maker
+
+    def targets(self, hotel_id: str | None) -> list[Shard]:
+        """Shards a query must visit: the hotel's own, or all of them when no hotel is given."""
+        if hotel_id is not None or not self.sharded:
+            return [self.shard(hotel_id)]
+        return list(self.shards.values())
+
+    async def fan_out(self, hotel_id: str | None, work: Callable[[Shard], Awaitable[T]]) -> list[T]:
+        # One coroutine per shard, run concurrently; results come back in shard order.
+        return list(await asyncio.gather(*(work(shard) for shard in self.targets(hotel_id))))
+
+
+shard_router = ShardRouter(settings.SHARD_DATABASE_URLS, settings.HOTEL_SHARD_MAP)
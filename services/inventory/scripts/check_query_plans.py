@@ -0,0 +1,200 @@
+"""EXPLAIN the search and reserve query shapes against a synthetic dataset.
+
+Seeds room types, calendar rows and operations, VACUUMs the tables so the
+visibility map is set, runs ``EXPLAIN (ANALYZE, FORMAT JSON)`` for every
+query shape and deletes the seeded rows again. Exits with status 1 if any
+plan reads room_types, inventory_daily or operations with a Seq Scan, if a
+search reads the inventory_daily range with anything but an Index Only Scan
+on the covering ``(room_type_id, date) INCLUDE (reserved_quantity)`` index,
+or if that scan still fetches more than ``--max-heap-fetch-ratio`` of its rows
+from the heap. Partitions count as their parent table; a Seq Scan over an
+empty partition is ignored, and a query that scans more than one
+inventory_daily or operations partition is reported as not pruned.
+
+The seed is committed (VACUUM cannot see rolled-back rows), so run it against
+a development database:
+
+    python -m scripts.check_query_plans --room-types 2000 --days 365
+"""
+import argparse
+import asyncio
+import json
+import re
+import sys
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from app.database import engine
+from app.rooms.repository import RoomDAO
+from app.rooms.schemas import SRoomsSearchParams, SRoomsReservationParams
+
+
+CHECKED_TABLES = {"room_types", "inventory_daily", "operations"}
+PREFIX = "PLANCHECK_"
+PRUNED_TABLES = ("inventory_daily", "operations")
+PARTITION_SUFFIX = re.compile(r"_(p\d{6}|default)$")
+
+
+# Compared literally: in a LIKE pattern the "_" of PLANCHECK_ matches any character.
+HAS_PREFIX = "left(room_type_id, length(:prefix)) = :prefix"
+
+# Operations and calendar rows first: they reference room_types. Idempotency
+# keys outlive their operations, so they are deleted explicitly.
+DELETE_SEED = [
+    text(f"DELETE FROM operations_uuid WHERE uuid IN (SELECT uuid FROM operations WHERE {HAS_PREFIX})"),
+] + [
+    text(f"DELETE FROM {table} WHERE {HAS_PREFIX}")
+    for table in ("operations", "inventory_daily", "room_types")
+]
+
+SEED_ROOM_TYPES = text("""
+    INSERT INTO room_types (room_type_id, name, capacity_adults, price, total_quantity)
+    SELECT :prefix || i, 'plancheck_' || (i % 500), 1 + i % 8, 1000 + (i * 37) % 50000, 10 + i % 20
+    FROM generate_series(1, :room_types) AS i
+""")
+
+SEED_INVENTORY_DAILY = text("""
+    INSERT INTO inventory_daily (room_type_id, date, reserved_quantity)
+    SELECT :prefix || i, d::date, (i + (d::date - CAST(:date_from AS date))) % 10
+    FROM generate_series(1, :room_types) AS i,
+         generate_series(CAST(:date_from AS date), CAST(:date_from AS date) + CAST(:days AS integer) - 1,
+                         interval '1 day') AS d
+""")
+
+SEED_OPERATIONS = text("""
+    INSERT INTO operations (uuid, status, operation_type, room_type_id, check_in, check_out, quantity)
+    SELECT gen_random_uuid(), 'SUCCESS', 'RESERVE', :prefix || (1 + i % :room_types),
+           CAST(:date_from AS date), CAST(:date_from AS date) + 2, 1
+    FROM generate_series(1, :operations) AS i
+""")
+
+
+def query_shapes(date_from: date) -> dict:
+    """Query shape name -> (query, whether its inventory_daily range must be index-only)."""
+    check_in = date_from + timedelta(days=30)
+    check_out = check_in + timedelta(days=3)
+    room_type_id = f"{PREFIX}42"
+    return {
+        "search by room_type_id": (RoomDAO._search_query(
+            SRoomsSearchParams(room_type_id=room_type_id, check_in=check_in, check_out=check_out)
+        ), True),
+        "search by name": (RoomDAO._search_query(
+            SRoomsSearchParams(name="plancheck_7", check_in=check_in, check_out=check_out)
+        ), True),
+        "search by adults and price": (RoomDAO._search_query(
+            SRoomsSearchParams(adults=8, min_price=10000, max_price=10500, check_in=check_in, check_out=check_out)
+        ), True),
+        # FOR UPDATE has to visit the heap to lock the rows.
+        "reserve range lock": (RoomDAO._locked_range_query(
+            SRoomsReservationParams(uuid=uuid.uuid4(), room_type_id=room_type_id, check_in=check_in, check_out=check_out)
+        ), False),
+        "operation lookup": (RoomDAO._operations_query({uuid.uuid4(): datetime.now(timezone.utc)}), False),
+    }
+
+
+def parent_table(relation: str) -> str:
+    return PARTITION_SUFFIX.sub("", relation)
+
+
+def walk(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from walk(child)
+
+
+async def seed(room_types: int, days: int, operations: int, date_from: date):
+    params = {"prefix": PREFIX, "room_types": room_types, "days": days, "date_from": date_from}
+    async with engine.begin() as conn:
+        for delete in DELETE_SEED:
+            await conn.execute(delete, params)
+        await conn.execute(SEED_ROOM_TYPES, params)
+        await conn.execute(SEED_INVENTORY_DAILY, params)
+        await conn.execute(SEED_OPERATIONS, {**params, "operations": operations})
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM (ANALYZE) room_types, inventory_daily, operations"))
+
+
+async def unseed():
+    async with engine.begin() as conn:
+        for delete in DELETE_SEED:
+            await conn.execute(delete, {"prefix": PREFIX})
+
+
+def range_scan_problems(plan: dict, max_heap_fetch_ratio: float) -> list[str]:
+    problems = []
+    for node in walk(plan):
+        if parent_table(node.get("Relation Name", "")) != "inventory_daily":
+            continue
+        if node["Node Type"] != "Index Only Scan":
+            problems.append(f"{node['Node Type']} on {node['Relation Name']} is not index-only")
+        elif node.get("Heap Fetches", 0) > max_heap_fetch_ratio * node["Actual Rows"] * node["Actual Loops"]:
+            problems.append(
+                f"{node['Heap Fetches']} heap fetches for {node['Actual Rows'] * node['Actual Loops']} rows"
+                f" on {node['Relation Name']}"
+            )
+    return problems
+
+
+async def check(room_types: int, days: int, operations: int, max_heap_fetch_ratio: float) -> bool:
+    date_from = date.today()
+    ok = True
+    await seed(room_types, days, operations, date_from)
+    try:
+        async with engine.connect() as conn:
+            empty = set((await conn.scalars(text(
+                "SELECT relname FROM pg_class WHERE relkind = 'r' AND reltuples <= 0"
+            ))).all())
+
+            for name, (query, index_only) in query_shapes(date_from).items():
+                sql = query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+                rows = (await conn.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}"))).scalar_one()
+                plan = (json.loads(rows) if isinstance(rows, str) else rows)[0]["Plan"]
+                scans = [
+                    f"{node['Node Type']} on {node['Relation Name']}"
+                    + (f" ({node['Heap Fetches']} heap fetches)" if "Heap Fetches" in node else "")
+                    for node in walk(plan)
+                    if "Relation Name" in node
+                ]
+                seq_scans = [
+                    node["Relation Name"]
+                    for node in walk(plan)
+                    if node["Node Type"] == "Seq Scan"
+                    and parent_table(node.get("Relation Name", "")) in CHECKED_TABLES
+                    and node["Relation Name"] not in empty
+                ]
+                scanned: dict[str, set] = {}
+                for node in walk(plan):
+                    parent = parent_table(node.get("Relation Name", ""))
+                    if parent in PRUNED_TABLES:
+                        scanned.setdefault(parent, set()).add(node["Relation Name"])
+                problems = range_scan_problems(plan, max_heap_fetch_ratio) if index_only else []
+                for parent, partitions in scanned.items():
+                    if len(partitions) > 1:
+                        problems.append(f"{len(partitions)} {parent} partitions scanned")
+                failed = bool(seq_scans or problems)
+                status = "FAIL" if failed else "ok"
+                ok = ok and not failed
+                print(f"[{status}] {name}: {', '.join(scans)}")
+                for problem in problems:
+                    print(f"       {problem}")
+            # EXPLAIN ANALYZE ran the reserve lock's FOR UPDATE; release it.
+            await conn.rollback()
+    finally:
+        await unseed()
+        await engine.dispose()
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--room-types", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--operations", type=int, default=200000)
+    parser.add_argument("--max-heap-fetch-ratio", type=float, default=0.01,
+                        help="heap fetches allowed per row of an index-only range scan")
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(check(args.room_types, args.days, args.operations, args.max_heap_fetch_ratio)) else 1)
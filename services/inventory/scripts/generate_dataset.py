@@ -0,0 +1,253 @@
+"""Generate a deterministic synthetic dataset for room_types, inventory_daily and operations.
+
+The same arguments always produce the same rows: every table draws from its
+own random stream seeded with ``--seed``, so changing the number of operations
+does not change the calendar. Occupancy is skewed the way real hotels are: a
+few room types are popular and most are not, summer, the winter holidays and
+Friday/Saturday nights fill up, and popular room types sell out on peak nights.
+Operations pick room types by the same popularity and are spread over the
+months before their check-in, so they land in many operations partitions.
+
+Rows are written with COPY into the DB_* database (missing monthly partitions
+are created first), or as CSV files with ``--csv-dir``:
+
+    python -m scripts.generate_dataset --room-types 2000 --years 2 --operations 2000000
+    python -m scripts.generate_dataset --csv-dir /tmp/dataset --start 2026-01-01
+"""
+import argparse
+import asyncio
+import csv
+import io
+import itertools
+import math
+import random
+import time
+import uuid
+from datetime import date, datetime, time as day_time, timedelta, timezone
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from sqlalchemy import text
+
+from app.database import engine
+from app.rooms.partitions import PARTITIONED_TABLES, add_months, create_partition, existing_partitions
+
+
+BATCH_ROWS = 20000
+
+# name -> (adults, base price, typical stock)
+CATEGORIES = {
+    "econom": (2, 4000, 20),
+    "standard": (3, 10000, 15),
+    "family": (5, 16000, 8),
+    "deluxe": (3, 22000, 6),
+    "suite": (4, 40000, 3),
+}
+
+ROOM_TYPE_COLUMNS = ["room_type_id", "hotel_id", "name", "capacity_adults", "price", "total_quantity"]
+INVENTORY_COLUMNS = ["room_type_id", "date", "reserved_quantity"]
+OPERATION_COLUMNS = [
+    "uuid", "status", "operation_type", "room_type_id", "check_in", "check_out", "quantity", "created_at", "updated_at",
+]
+
+# (operation_type, status) -> share of all operations
+OPERATION_MIX = {
+    ("RESERVE", "SUCCESS"): 0.78,
+    ("RESERVE", "FAILED"): 0.08,
+    ("RELEASE", "SUCCESS"): 0.12,
+    ("RELEASE", "FAILED"): 0.02,
+}
+
+
+def _rng(seed: int, table: str) -> random.Random:
+    return random.Random(f"{seed}:{table}")
+
+
+def generate_room_types(seed: int, prefix: str, room_types: int, hotels: int) -> list[tuple]:
+    rng = _rng(seed, "room_types")
+    hotel_price_levels = [rng.lognormvariate(0, 0.35) for _ in range(hotels)]
+    rows = []
+    for i in range(room_types):
+        hotel = i % hotels
+        name = rng.choices(list(CATEGORIES), weights=[5, 8, 3, 3, 1])[0]
+        adults, price, stock = CATEGORIES[name]
+        rows.append((
+            f"{prefix}{i + 1:06d}",
+            f"{prefix.lower()}hotel_{hotel + 1:04d}",
+            name,
+            max(1, adults + rng.choice((-1, 0, 0, 1))),
+            int(round(price * hotel_price_levels[hotel] * rng.uniform(0.9, 1.1), -2)),
+            max(1, int(stock * rng.lognormvariate(0, 0.5))),
+        ))
+    return rows
+
+
+def popularity(seed: int, room_types: int) -> list[float]:
+    # Share of the calendar a room type fills on an average night: a long tail
+    # of quiet room types and a handful that are nearly always booked.
+    rng = _rng(seed, "popularity")
+    return [min(0.95, 0.15 + 0.8 * rng.betavariate(1.2, 2.5)) for _ in range(room_types)]
+
+
+def demand(day: date) -> float:
+    # Summer peak in mid-July, a second one over the winter holidays, busier weekends.
+    season = 1 + 0.3 * math.cos(2 * math.pi * (day.timetuple().tm_yday - 196) / 365)
+    if (day.month == 12 and day.day >= 20) or (day.month == 1 and day.day <= 7):
+        season += 0.35
+    return season * (1.2, 0.85, 0.85, 0.9, 0.95, 1.15, 1.25)[(day.weekday() + 1) % 7]
+
+
+def generate_inventory(
+    seed: int, room_types: list[tuple], shares: list[float], start: date, days: int
+) -> Iterator[tuple]:
+    rng = _rng(seed, "inventory_daily")
+    factors = [(start + timedelta(days=offset), demand(start + timedelta(days=offset))) for offset in range(days)]
+    for room_type, share in zip(room_types, shares):
+        room_type_id, total = room_type[0], room_type[5]
+        for day, factor in factors:
+            occupancy = share * factor * rng.uniform(0.8, 1.2)
+            reserved = total if occupancy >= 1 else round(rng.gauss(total * occupancy, max(1.0, total * 0.05)))
+            yield room_type_id, day, min(total, max(0, reserved))
+
+
+def generate_operations(
+    seed: int, room_types: list[tuple], shares: list[float], start: date, days: int, operations: int
+) -> Iterator[tuple]:
+    rng = _rng(seed, "operations")
+    room_type_weights = list(itertools.accumulate(shares))
+    mix = list(OPERATION_MIX)
+    mix_weights = list(itertools.accumulate(OPERATION_MIX.values()))
+    while operations > 0:
+        batch = min(operations, BATCH_ROWS)
+        operations -= batch
+        picked = rng.choices(room_types, cum_weights=room_type_weights, k=batch)
+        kinds = rng.choices(mix, cum_weights=mix_weights, k=batch)
+        for room_type, (operation_type, status) in zip(picked, kinds):
+            check_in = start + timedelta(days=rng.randrange(days))
+            nights = min(14, 1 + int(rng.expovariate(0.45)))
+            booked_days_ahead = int(rng.expovariate(1 / 30))
+            created_at = datetime.combine(check_in - timedelta(days=booked_days_ahead), day_time(), timezone.utc) \
+                + timedelta(seconds=rng.randrange(86400))
+            yield (
+                uuid.UUID(int=rng.getrandbits(128), version=4),
+                status,
+                operation_type,
+                room_type[0],
+                check_in,
+                check_in + timedelta(days=nights),
+                1 if rng.random() < 0.85 else rng.randint(2, 4),
+                created_at,
+                created_at + timedelta(seconds=rng.randrange(1, 5)),
+            )
+
+
+def csv_chunks(rows: Iterable[tuple], counter: list[int]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    batch = 0
+    for row in rows:
+        writer.writerow(row)
+        batch += 1
+        if batch == BATCH_ROWS:
+            counter[0] += batch
+            batch = 0
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    counter[0] += batch
+    if batch:
+        yield buffer.getvalue().encode()
+
+
+def write_csv(directory: Path, tables: dict[str, tuple[list[str], Iterable[tuple]]]):
+    directory.mkdir(parents=True, exist_ok=True)
+    for table, (columns, rows) in tables.items():
+        started, counter = time.monotonic(), [0]
+        with open(directory / f"{table}.csv", "wb") as file:
+            file.write((",".join(columns) + "\n").encode())
+            for chunk in csv_chunks(rows, counter):
+                file.write(chunk)
+        print(f"[generate_dataset] {directory / f'{table}.csv'}: {counter[0]} rows in {time.monotonic() - started:.1f}s")
+
+
+async def _aiter(chunks: Iterator[bytes]):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _ensure_partitions(conn, first: date, last: date):
+    # Without them every generated month would land in the default partition.
+    for table in PARTITIONED_TABLES:
+        partitions = await existing_partitions(conn, table)
+        month = first.replace(day=1)
+        while month <= last:
+            if month not in partitions:
+                await create_partition(conn, table, month)
+            month = add_months(month, 1)
+
+
+# Compared literally: in a LIKE pattern the "_" of GEN_ would match any
+# character and --replace would delete other room types too.
+HAS_PREFIX = "left(room_type_id, length(:prefix)) = :prefix"
+
+
+async def write_postgres(
+    tables: dict[str, tuple[list[str], Iterable[tuple]]], first: date, last: date, prefix: str, replace: bool
+):
+    async with engine.connect() as conn:
+        if replace:
+            # Ledger deltas and counters of the old rows would skew the new calendar.
+            # Idempotency keys outlive their operations, so they go first.
+            deleted = await conn.execute(text(
+                f"DELETE FROM operations_uuid WHERE uuid IN (SELECT uuid FROM operations WHERE {HAS_PREFIX})"
+            ), {"prefix": prefix})
+            print(f"[generate_dataset] operations_uuid: deleted {deleted.rowcount} rows")
+            for table in ("inventory_ledger", "inventory_counters", "operations", "inventory_daily", "room_types"):
+                deleted = await conn.execute(text(f"DELETE FROM {table} WHERE {HAS_PREFIX}"), {"prefix": prefix})
+                print(f"[generate_dataset] {table}: deleted {deleted.rowcount} rows")
+        await _ensure_partitions(conn, first, last)
+        await conn.commit()
+
+        raw = (await conn.get_raw_connection()).driver_connection
+        for table, (columns, rows) in tables.items():
+            started, counter = time.monotonic(), [0]
+
+            await raw.copy_to_table(table, source=_aiter(csv_chunks(rows, counter)), columns=columns, format="csv")
+            await conn.commit()
+            print(f"[generate_dataset] {table}: {counter[0]} rows in {time.monotonic() - started:.1f}s")
+        await conn.execute(text("ANALYZE room_types, inventory_daily, operations, operations_uuid"))
+        await conn.commit()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--prefix", default="GEN_", help="prefix of generated room_type_id and hotel_id values")
+    parser.add_argument("--hotels", type=int, default=100)
+    parser.add_argument("--room-types", type=int, default=2000)
+    parser.add_argument("--years", type=float, default=2, help="length of the calendar in years")
+    parser.add_argument("--start", type=date.fromisoformat, default=None,
+                        help="first calendar day (default: a year before the first day of this month)")
+    parser.add_argument("--operations", type=int, default=1000000)
+    parser.add_argument("--csv-dir", type=Path, help="write CSV files here instead of loading the database")
+    parser.add_argument("--replace", action="store_true", help="delete rows of an earlier run with the same prefix")
+    args = parser.parse_args()
+
+    start = args.start or add_months(date.today().replace(day=1), -12)
+    days = round(args.years * 365)
+    room_type_rows = generate_room_types(args.seed, args.prefix, args.room_types, min(args.hotels, args.room_types))
+    shares = popularity(args.seed, args.room_types)
+    tables = {
+        "room_types": (ROOM_TYPE_COLUMNS, room_type_rows),
+        "inventory_daily": (INVENTORY_COLUMNS, generate_inventory(args.seed, room_type_rows, shares, start, days)),
+        "operations": (OPERATION_COLUMNS, generate_operations(args.seed, room_type_rows, shares, start, days,
+                                                              args.operations)),
+    }
+    if args.csv_dir:
+        write_csv(args.csv_dir, tables)
+    else:
+        # Most operations are created within a few months before their check-in;
+        # older ones go to the default partition.
+        first = add_months(start.replace(day=1), -3)
+        asyncio.run(write_postgres(tables, first, start + timedelta(days=days), args.prefix, args.replace))